@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+"""
+Minimal HTTP load generator, to compare gunicorn setups (e.g. numbers of workers).
+
+It keeps `--concurrency` requests in flight against a URL for `--duration` seconds and reports
+the throughput, the latency percentiles, and (given the PID of the gunicorn master) the memory
+used by the server processes. Only the standard library is used, so it runs anywhere.
+
+Example, against a note's file URL endpoint (copy the session cookie from the browser):
+
+    gunicorn --bind 127.0.0.1:8000 &
+    bin/loadtest.py http://127.0.0.1:8000/notes/<uuid>/file/ -H "Cookie: sessionid=..." --pid $!
+"""
+
+import argparse
+import http.client
+import os
+import statistics
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+def worker(url, headers, deadline, results, lock):
+    """Send requests one after the other over a persistent connection until the deadline"""
+    parts = urlsplit(url)
+    path = parts.path + (f"?{parts.query}" if parts.query else "")
+    connection = None
+    latencies, errors = [], 0
+
+    while time.monotonic() < deadline:
+        if connection is None:
+            connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+        start = time.monotonic()
+        try:
+            connection.request("GET", path, headers=headers)
+            response = connection.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            connection.close()
+            connection = None
+            continue
+        if response.status >= 400:
+            errors += 1
+        else:
+            latencies.append(time.monotonic() - start)
+        if response.will_close:
+            connection.close()
+            connection = None
+
+    if connection is not None:
+        connection.close()
+    with lock:
+        results["latencies"].extend(latencies)
+        results["errors"] += errors
+
+
+def process_tree_rss(pid):
+    """Resident memory (in bytes) of a process and its children, read from /proc (Linux only)"""
+    children = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    # The command name (in parentheses) may contain spaces
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+
+    total, pending = 0, [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/statm") as f:
+                total += int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except OSError:
+            continue
+        pending.extend(children.get(current, []))
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("url", help="URL to request")
+    parser.add_argument("-c", "--concurrency", type=int, default=50, help="Requests in flight (default: 50)")
+    parser.add_argument("-d", "--duration", type=float, default=10, help="Duration in seconds (default: 10)")
+    parser.add_argument(
+        "-H", "--header", action="append", default=[], help="Header to send, e.g. 'Cookie: sessionid=...'"
+    )
+    parser.add_argument("--pid", type=int, help="PID of the gunicorn master, to report its memory usage")
+    args = parser.parse_args()
+
+    headers = dict(header.split(":", 1) for header in args.header)
+    headers = {name.strip(): value.strip() for name, value in headers.items()}
+    results = {"latencies": [], "errors": 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.duration
+    threads = [
+        threading.Thread(target=worker, args=(args.url, headers, deadline, results, lock))
+        for _ in range(args.concurrency)
+    ]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    # Sample the memory usage while the server is under load
+    time.sleep(args.duration / 2)
+    rss = process_tree_rss(args.pid) if args.pid else None
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    latencies = sorted(results["latencies"])
+    print(f"{len(latencies)} requests ({results['errors']} errors) in {elapsed:.1f}s, concurrency {args.concurrency}")
+    if latencies:
+        quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        print(f"Throughput: {len(latencies) / elapsed:.1f} req/s")
+        print(
+            f"Latency: p50 {quantiles[49] * 1000:.1f}ms, p95 {quantiles[94] * 1000:.1f}ms, "
+            f"max {latencies[-1] * 1000:.1f}ms"
+        )
+    if rss is not None:
+        print(f"Server memory (RSS): {rss / (1024 * 1024):.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -19,9 +19,16 @@ python manage.py check --deploy
 echo "Running migrations..."
 python manage.py migrate --no-input
 
-# We run buildwatson whenever new models are added to django-watson.
-echo "Rebuilding the database indices needed by django-watson..."
-python manage.py buildwatson
+# Bring the django-watson search index up to date (only objects changed since they were last
+# indexed, or whose note type changed, are re-indexed). Changes to the search adapters aren't
+# detected: deploy them with a full rebuild, `python manage.py update_search_index --full`
+echo "Updating the django-watson search index..."
+python manage.py update_search_index
+
+# Refresh stored HTML (only notes / books whose markdown or renderer configuration changed are re-rendered)
+echo "Rendering notes and book introductions..."
+python manage.py render_notes
+python manage.py render_book_intros
 
 # Finally, run whatever command was passed (gunicorn)
 exec "$@"
@@ -1,7 +1,15 @@
+import os
+
 import gunicorn
 
-# Tell gunicorn to run my app
-wsgi_app = "milk2meat.wsgi:application"
+# Tell gunicorn to run my app.
+# Set `GUNICORN_ASGI=1` to serve it over ASGI with uvicorn workers (needs the `uvicorn-worker` package),
+# so async views (e.g. the protected file URL endpoints) don't hold a worker while they wait
+if os.getenv("GUNICORN_ASGI", "").lower() in ("1", "true", "yes"):
+    wsgi_app = "milk2meat.asgi:application"
+    worker_class = "uvicorn_worker.UvicornWorker"
+else:
+    wsgi_app = "milk2meat.wsgi:application"
 
 # Replace gunicorn's 'Server' HTTP header to avoid leaking info to malicious actors
 gunicorn.SERVER = ""
@@ -1,9 +1,72 @@
-from unittest.mock import MagicMock, patch
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+from urllib.parse import parse_qs
 
 import pytest
 from django.http import HttpRequest
 
-from milk2meat.auth.turnstile import TurnstileValidationError, validate_turnstile
+from milk2meat.auth.turnstile import (
+    TurnstileUnavailableError,
+    TurnstileValidationError,
+    circuit_breaker,
+    validate_turnstile,
+)
+
+
+class FakeVerifyHandler(BaseHTTPRequestHandler):
+    """Stand-in for Cloudflare's siteverify endpoint, answering with the server's `status` and `result`"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        form = parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode())
+        self.server.received.append({"form": form, "client_address": self.client_address})
+        time.sleep(self.server.delay)
+
+        body = json.dumps(self.server.result).encode()
+        self.send_response(self.server.status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def verify_server(settings):
+    """A local fake verify endpoint, which validation is pointed at"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeVerifyHandler)
+    server.daemon_threads = True
+    server.received = []
+    server.status = 200
+    server.result = {"success": True}
+    server.delay = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    settings.TURNSTILE_SKIP_VALIDATION = False
+    settings.TURNSTILE_SECRET_KEY = "test_secret_key"
+    settings.TURNSTILE_VERIFY_URL = f"http://127.0.0.1:{server.server_port}/siteverify"
+    settings.TURNSTILE_READ_TIMEOUT = 0.5
+    settings.TURNSTILE_BREAKER_THRESHOLD = 2
+    settings.TURNSTILE_BREAKER_COOLDOWN = 30
+    circuit_breaker.reset()
+    yield server
+    circuit_breaker.reset()
+    server.shutdown()
+    server.server_close()
+
+
+def make_request(token="valid_token"):
+    request = HttpRequest()
+    request.POST = {"cf-turnstile-response": token}
+    request.META = {"REMOTE_ADDR": "127.0.0.1"}
+    return request
 
 
 class TestTurnstileValidation:
@@ -55,82 +118,103 @@ class TestTurnstileValidation:
         result = validate_turnstile(request)
         assert result is False
 
-    @patch("milk2meat.auth.turnstile.settings")
-    @patch("milk2meat.auth.turnstile.requests.post")
-    def test_successful_validation(self, mock_post, mock_settings):
+    def test_successful_validation(self, verify_server):
         """Test successful validation with valid token."""
-        # Configure settings
-        mock_settings.TURNSTILE_SKIP_VALIDATION = False
-        mock_settings.TURNSTILE_SECRET_KEY = "test_secret_key"
-        mock_settings.TURNSTILE_VERIFY_URL = "https://verify-test-url.com"
-
-        # Create a mock request with token
-        request = HttpRequest()
-        request.POST = {"cf-turnstile-response": "valid_token"}
-        request.META = {"REMOTE_ADDR": "127.0.0.1"}
-
-        # Mock the response from Cloudflare
-        mock_response = MagicMock()
-        mock_response.json.return_value = {"success": True}
-        mock_post.return_value = mock_response
-
-        # Validation should succeed
-        result = validate_turnstile(request)
-        assert result is True
+        assert validate_turnstile(make_request()) is True
 
         # Check the request to Cloudflare was made correctly
-        mock_post.assert_called_once_with(
-            mock_settings.TURNSTILE_VERIFY_URL,
-            data={
-                "secret": "test_secret_key",
-                "response": "valid_token",
-                "remoteip": "127.0.0.1",
-            },
-            timeout=5,
-        )
+        assert verify_server.received[0]["form"] == {
+            "secret": ["test_secret_key"],
+            "response": ["valid_token"],
+            "remoteip": ["127.0.0.1"],
+        }
 
-    @patch("milk2meat.auth.turnstile.settings")
-    @patch("milk2meat.auth.turnstile.requests.post")
-    def test_failed_validation(self, mock_post, mock_settings):
+    def test_failed_validation(self, verify_server):
         """Test failed validation with invalid token."""
-        # Configure settings
-        mock_settings.TURNSTILE_SKIP_VALIDATION = False
-        mock_settings.TURNSTILE_SECRET_KEY = "test_secret_key"
-        mock_settings.TURNSTILE_VERIFY_URL = "https://verify-test-url.com"
+        verify_server.result = {"success": False, "error-codes": ["invalid-input-response"]}
 
-        # Create a mock request with token
-        request = HttpRequest()
-        request.POST = {"cf-turnstile-response": "invalid_token"}
-        request.META = {"REMOTE_ADDR": "127.0.0.1"}
-
-        # Mock the response from Cloudflare
-        mock_response = MagicMock()
-        mock_response.json.return_value = {"success": False, "error-codes": ["invalid-input-response"]}
-        mock_post.return_value = mock_response
+        assert validate_turnstile(make_request("invalid_token")) is False
 
-        # Validation should fail
-        result = validate_turnstile(request)
-        assert result is False
+    def test_request_error(self, verify_server):
+        """Test handling of error responses."""
+        verify_server.status = 500
 
-    @patch("milk2meat.auth.turnstile.settings")
-    @patch("milk2meat.auth.turnstile.requests.post")
-    def test_request_exception(self, mock_post, mock_settings):
-        """Test handling of request exceptions."""
-        # Configure settings
-        mock_settings.TURNSTILE_SKIP_VALIDATION = False
-        mock_settings.TURNSTILE_SECRET_KEY = "test_secret_key"
-        mock_settings.TURNSTILE_VERIFY_URL = "https://verify-test-url.com"
-
-        # Create a mock request with token
-        request = HttpRequest()
-        request.POST = {"cf-turnstile-response": "valid_token"}
-        request.META = {"REMOTE_ADDR": "127.0.0.1"}
-
-        # Mock a requests.RequestException
-        from requests.exceptions import RequestException
+        with pytest.raises(TurnstileValidationError, match="Turnstile validation request failed"):
+            validate_turnstile(make_request())
 
-        mock_post.side_effect = RequestException("Connection error")
+    def test_slow_response_times_out(self, verify_server):
+        """Test that a slow response fails after the read timeout."""
+        verify_server.delay = 2
 
-        # Should raise TurnstileValidationError
+        start = time.monotonic()
         with pytest.raises(TurnstileValidationError, match="Turnstile validation request failed"):
-            validate_turnstile(request)
+            validate_turnstile(make_request())
+        assert time.monotonic() - start < 1.5
+
+    def test_connection_is_reused(self, verify_server):
+        """Test that validations share a kept-alive connection."""
+        validate_turnstile(make_request())
+        validate_turnstile(make_request())
+
+        assert len(verify_server.received) == 2
+        assert verify_server.received[0]["client_address"] == verify_server.received[1]["client_address"]
+
+    def test_circuit_opens_after_repeated_failures(self, verify_server):
+        """Test that validation fails fast, without calling Cloudflare, after repeated failures."""
+        verify_server.status = 503
+        for _ in range(2):
+            with pytest.raises(TurnstileValidationError):
+                validate_turnstile(make_request())
+
+        verify_server.status = 200
+        with pytest.raises(TurnstileUnavailableError):
+            validate_turnstile(make_request())
+        assert len(verify_server.received) == 2
+
+    def test_circuit_closes_after_successful_trial(self, verify_server):
+        """Test that a request is let through after the cooldown, closing the circuit if it succeeds."""
+        verify_server.status = 503
+        for _ in range(2):
+            with pytest.raises(TurnstileValidationError):
+                validate_turnstile(make_request())
+        verify_server.status = 200
+
+        later = time.monotonic() + 31
+        with patch("milk2meat.auth.turnstile.time.monotonic", return_value=later):
+            assert validate_turnstile(make_request()) is True
+            assert validate_turnstile(make_request()) is True
+        assert len(verify_server.received) == 4
+
+    def test_failed_trial_reopens_circuit(self, verify_server):
+        """Test that the circuit opens again if the trial request after the cooldown fails."""
+        verify_server.status = 503
+        for _ in range(2):
+            with pytest.raises(TurnstileValidationError):
+                validate_turnstile(make_request())
+
+        later = time.monotonic() + 31
+        with patch("milk2meat.auth.turnstile.time.monotonic", return_value=later):
+            with pytest.raises(TurnstileValidationError):
+                validate_turnstile(make_request())
+            with pytest.raises(TurnstileUnavailableError):
+                validate_turnstile(make_request())
+        assert len(verify_server.received) == 3
+
+    def test_unexpected_error_in_trial_reopens_circuit(self, verify_server):
+        """Test that the circuit doesn't stay open for good if the trial request fails unexpectedly."""
+        verify_server.status = 503
+        for _ in range(2):
+            with pytest.raises(TurnstileValidationError):
+                validate_turnstile(make_request())
+        verify_server.status = 200
+
+        later = time.monotonic() + 31
+        with patch("milk2meat.auth.turnstile.time.monotonic", return_value=later):
+            with patch("milk2meat.auth.turnstile.requests.Session.post", side_effect=ValueError("Bad response")):
+                with pytest.raises(ValueError):
+                    validate_turnstile(make_request())
+            with pytest.raises(TurnstileUnavailableError):
+                validate_turnstile(make_request())
+
+        with patch("milk2meat.auth.turnstile.time.monotonic", return_value=later + 31):
+            assert validate_turnstile(make_request()) is True
@@ -1,11 +1,17 @@
 import logging
+import threading
+import time
 
 import requests
 from django.conf import settings
 from django.http import HttpRequest
+from requests.adapters import HTTPAdapter
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of kept-alive connections to Cloudflare (per process)
+POOL_SIZE = 10
+
 
 class TurnstileValidationError(Exception):
     """Exception raised when Turnstile validation fails."""
@@ -13,6 +19,83 @@ class TurnstileValidationError(Exception):
     pass
 
 
+class TurnstileUnavailableError(TurnstileValidationError):
+    """Exception raised, without calling Cloudflare, while the circuit breaker is open."""
+
+    pass
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for the Turnstile verify endpoint.
+
+    After `TURNSTILE_BREAKER_THRESHOLD` consecutive failed requests the circuit opens, and
+    validations fail fast (rather than each waiting for the timeout) for
+    `TURNSTILE_BREAKER_COOLDOWN` seconds. Then a single trial request is let through: the
+    circuit closes if it succeeds, and opens again if it fails.
+
+    The state is kept per process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def allow_request(self):
+        """Whether a request may be made (reserving the trial request if the cooldown is over)"""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self.trial_running or time.monotonic() - self.opened_at < settings.TURNSTILE_BREAKER_COOLDOWN:
+                return False
+            self.trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.reset()
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.opened_at is not None or self.failures >= settings.TURNSTILE_BREAKER_THRESHOLD:
+                if self.opened_at is None:
+                    logger.warning("Opening the Turnstile circuit breaker after %d failures", self.failures)
+                self.opened_at = time.monotonic()
+
+
+circuit_breaker = CircuitBreaker()
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """
+    Get the HTTP session used to call Cloudflare.
+
+    The session is shared by the whole process, so connections (and their TLS sessions)
+    are kept alive and reused across validations.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                # Failed requests aren't retried: the login would rather fail than wait
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=0)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
 def validate_turnstile(request: HttpRequest) -> bool:
     """
     Validate Cloudflare Turnstile token from request.
@@ -25,6 +108,7 @@ def validate_turnstile(request: HttpRequest) -> bool:
 
     Raises:
         TurnstileValidationError: If validation fails due to configuration or network issues
+        TurnstileUnavailableError: If Cloudflare is failing (the circuit breaker is open)
     """
     # Skip validation in development mode or when explicitly configured to skip
     if settings.TURNSTILE_SKIP_VALIDATION:
@@ -51,11 +135,19 @@ def validate_turnstile(request: HttpRequest) -> bool:
         "remoteip": request.META.get("REMOTE_ADDR", ""),
     }
 
+    if not circuit_breaker.allow_request():
+        raise TurnstileUnavailableError("Turnstile validation is unavailable after repeated failures")
+
     try:
         # Make API request to Cloudflare
-        response = requests.post(settings.TURNSTILE_VERIFY_URL, data=data, timeout=5)
+        response = get_session().post(
+            settings.TURNSTILE_VERIFY_URL,
+            data=data,
+            timeout=(settings.TURNSTILE_CONNECT_TIMEOUT, settings.TURNSTILE_READ_TIMEOUT),
+        )
         response.raise_for_status()
         result = response.json()
+        circuit_breaker.record_success()
 
         if not result.get("success", False):
             error_codes = result.get("error-codes", [])
@@ -72,9 +164,15 @@ def validate_turnstile(request: HttpRequest) -> bool:
         return True
 
     except requests.RequestException as e:
+        circuit_breaker.record_failure()
         logger.error(
             f"Turnstile validation request error: {str(e)}",
             exc_info=True,
             extra={"ip": request.META.get("REMOTE_ADDR"), "path": request.path},
         )
         raise TurnstileValidationError(f"Turnstile validation request failed: {str(e)}") from e
+    except Exception:
+        # Any other error (e.g. an unexpected response) counts as a failure too: a failed trial
+        # request must not stay reserved, which would keep the circuit open for good
+        circuit_breaker.record_failure()
+        raise
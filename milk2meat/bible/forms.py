@@ -25,42 +25,41 @@ class BookEditForm(forms.ModelForm):
             "timeline",
         ]
 
-    def clean_title_and_author(self):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        # Sanitized HTML of the markdown fields, produced once during validation
+        self.rendered_html = {}
+
+    def _clean_markdown_field(self, field_name):
         """Sanitize markdown content"""
-        data = self.cleaned_data.get("title_and_author", "")
+        data = self.cleaned_data.get(field_name, "")
         # We parse (and sanitize) the markdown to ensure it doesn't contain harmful content
-        # But we store the original markdown text for editing
+        # But we store the original markdown text for editing. The HTML is kept so that
+        # the next page view doesn't have to render it again.
         if data:
-            parse_markdown(data)  # This will raise an exception if content can't be sanitized
+            self.rendered_html[field_name] = parse_markdown(data)
         return data
 
+    def clean_title_and_author(self):
+        """Sanitize markdown content"""
+        return self._clean_markdown_field("title_and_author")
+
     def clean_date_and_occasion(self):
         """Sanitize markdown content"""
-        data = self.cleaned_data.get("date_and_occasion", "")
-        if data:
-            parse_markdown(data)
-        return data
+        return self._clean_markdown_field("date_and_occasion")
 
     def clean_characteristics_and_themes(self):
         """Sanitize markdown content"""
-        data = self.cleaned_data.get("characteristics_and_themes", "")
-        if data:
-            parse_markdown(data)
-        return data
+        return self._clean_markdown_field("characteristics_and_themes")
 
     def clean_christ_in_book(self):
         """Sanitize markdown content"""
-        data = self.cleaned_data.get("christ_in_book", "")
-        if data:
-            parse_markdown(data)
-        return data
+        return self._clean_markdown_field("christ_in_book")
 
     def clean_outline(self):
         """Sanitize markdown content"""
-        data = self.cleaned_data.get("outline", "")
-        if data:
-            parse_markdown(data)
-        return data
+        return self._clean_markdown_field("outline")
 
     def clean_timeline(self):
         """Validate timeline JSON data"""
@@ -108,6 +107,9 @@ class BookEditForm(forms.ModelForm):
         # Save the timeline data to the model's JSONField
         book.timeline = self.cleaned_data.get("timeline", {})
 
+        # Hand over the HTML rendered during validation
+        book.set_intro_html(self.rendered_html)
+
         if commit:
             book.save()
 
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from milk2meat.bible.models import Book
+
+
+class Command(BaseCommand):
+    help = "Re-render the stored HTML of Bible book introductions"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Re-render every book, even if its stored HTML is current",
+        )
+
+    def handle(self, *args, **options):
+        books = list(Book.objects.all())
+
+        if options["force"]:
+            # Clearing the hash makes render_intro() treat the stored HTML as stale
+            for book in books:
+                book.intro_hash = ""
+
+        rendered = [book for book in books if book.render_intro()]
+
+        # bulk_update doesn't touch `updated_at` (or the search index), only the rendered HTML
+        Book.objects.bulk_update(rendered, ["intro_html", "intro_hash"])
+
+        self.stdout.write(self.style.SUCCESS(f"Rendered {len(rendered)} of {len(books)} book introductions."))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-17 22:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bible", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="book",
+            name="intro_hash",
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name="book",
+            name="intro_html",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
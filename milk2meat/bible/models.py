@@ -2,6 +2,7 @@ from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
 
 from milk2meat.core.models import BaseModel
+from milk2meat.core.utils.markdown import markdown_hash, parse_markdown, parse_markdown_cached
 
 
 class Testament(models.TextChoices):
@@ -14,6 +15,15 @@ class Book(BaseModel):
     Represents a book of the Bible
     """
 
+    # The markdown fields making up the book introduction
+    INTRO_FIELDS = (
+        "title_and_author",
+        "date_and_occasion",
+        "characteristics_and_themes",
+        "christ_in_book",
+        "outline",
+    )
+
     # ----------------------------------------------------------------------
     # Core
     # ----------------------------------------------------------------------
@@ -48,21 +58,79 @@ class Book(BaseModel):
     timeline = models.JSONField(default=dict, blank=True)
     outline = models.TextField(blank=True)
 
+    # ----------------------------------------------------------------------
+    # Rendered (sanitized) HTML of the intro fields, refreshed on save.
+    # `intro_hash` identifies the markdown and renderer configuration the HTML was produced from.
+    # ----------------------------------------------------------------------
+    intro_html = models.JSONField(default=dict, blank=True, editable=False)
+    intro_hash = models.CharField(max_length=64, blank=True, editable=False)
+
     class Meta:
         ordering = ["number"]
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        if self.render_intro():
+            update_fields = kwargs.get("update_fields")
+            if update_fields is not None and set(update_fields) & set(self.INTRO_FIELDS):
+                kwargs["update_fields"] = {*update_fields, "intro_html", "intro_hash"}
+        super().save(*args, **kwargs)
+
     @property
     def has_introductory_notes(self) -> bool:
         """Check if the book has any introductory notes."""
-        return any(
-            [
-                self.title_and_author,
-                self.date_and_occasion,
-                self.characteristics_and_themes,
-                self.christ_in_book,
-                self.outline,
-            ]
-        )
+        return any(getattr(self, field_name) for field_name in self.INTRO_FIELDS)
+
+    def _compute_intro_hash(self):
+        return markdown_hash("\x00".join(getattr(self, field_name) for field_name in self.INTRO_FIELDS))
+
+    def render_intro(self):
+        """
+        Refresh the stored HTML if the intro fields (or the renderer configuration) have changed.
+
+        Returns:
+            bool: True if the intro was re-rendered, False if the stored HTML was current
+        """
+        intro_hash = self._compute_intro_hash()
+        if intro_hash == self.intro_hash:
+            return False
+
+        self.intro_html = {
+            field_name: parse_markdown(getattr(self, field_name))
+            for field_name in self.INTRO_FIELDS
+            if getattr(self, field_name)
+        }
+        self.intro_hash = intro_hash
+        return True
+
+    def set_intro_html(self, html_by_field):
+        """
+        Store HTML that was already rendered from the current intro fields (e.g. during form
+        validation), so that saving doesn't render them again.
+
+        Args:
+            html_by_field: Mapping of intro field name to the sanitized HTML produced by `parse_markdown`
+        """
+        self.intro_html = {
+            field_name: html_by_field.get(field_name) or parse_markdown(getattr(self, field_name))
+            for field_name in self.INTRO_FIELDS
+            if getattr(self, field_name)
+        }
+        self.intro_hash = self._compute_intro_hash()
+
+    def get_intro_html(self):
+        """
+        Get the sanitized HTML of the (non-empty) intro fields, keyed by field name.
+
+        The stored HTML is served as-is when current; otherwise (e.g. the renderer configuration
+        changed and `render_book_intros` hasn't run yet) the fields are rendered through the cache.
+        """
+        if self.intro_hash == self._compute_intro_hash():
+            return self.intro_html
+        return {
+            field_name: parse_markdown_cached(getattr(self, field_name))
+            for field_name in self.INTRO_FIELDS
+            if getattr(self, field_name)
+        }
@@ -148,3 +148,25 @@ class TestBookEditForm:
 
         sanitized = parse_markdown(form.cleaned_data["title_and_author"])
         assert "<script>" not in sanitized
+
+    def test_rendered_html_is_stored_on_save(self, mocker):
+        """Test that the HTML rendered during validation is stored without rendering again"""
+        book = BookFactory()
+        form_data = {
+            "title_and_author": "# Stored title and author",
+            "outline": "1. Stored outline",
+        }
+
+        form = BookEditForm(data=form_data, instance=book)
+        assert form.is_valid(), f"Form errors: {form.errors}"
+
+        mock_parse = mocker.patch("milk2meat.bible.models.parse_markdown")
+        form.save()
+        mock_parse.assert_not_called()
+
+        book.refresh_from_db()
+        assert book.intro_html == {
+            "title_and_author": "<h1>Stored title and author</h1>",
+            "outline": "<ol>\n<li>Stored outline</li>\n</ol>",
+        }
+        assert book.get_intro_html() == book.intro_html
@@ -73,3 +73,41 @@ class TestBookModel:
         assert book.timeline == timeline_data
         assert len(book.timeline["events"]) == 2
         assert book.timeline["events"][0]["date"] == "4000 B.C."
+
+    def test_intro_html_rendered_on_save(self):
+        """Test that the intro fields are rendered to HTML when the book is saved"""
+        book = BookFactory(title_and_author="# Genesis", date_and_occasion="", christ_in_book="", outline="")
+        book.characteristics_and_themes = "Creation, *Fall*"
+        book.save()
+
+        book.refresh_from_db()
+        assert book.intro_html == {
+            "title_and_author": "<h1>Genesis</h1>",
+            "characteristics_and_themes": "<p>Creation, <em>Fall</em></p>",
+        }
+
+    def test_intro_html_update_fields(self):
+        """Test that saving with update_fields also persists the refreshed HTML"""
+        book = BookFactory(outline="1. Creation")
+        book.outline = "1. Fall"
+        book.save(update_fields=["outline"])
+
+        book.refresh_from_db()
+        assert book.intro_html["outline"] == "<ol>\n<li>Fall</li>\n</ol>"
+
+    def test_get_intro_html_uses_stored_html(self, mocker):
+        """Test that current stored HTML is served without rendering"""
+        book = BookFactory(outline="1. Creation")
+        book.refresh_from_db()
+
+        mock_parse = mocker.patch("milk2meat.bible.models.parse_markdown_cached")
+        assert book.get_intro_html()["outline"] == "<ol>\n<li>Creation</li>\n</ol>"
+        mock_parse.assert_not_called()
+
+    def test_get_intro_html_stale(self):
+        """Test that stale stored HTML is rendered on the fly"""
+        book = BookFactory(outline="1. Creation")
+        Book.objects.filter(pk=book.pk).update(intro_html={"outline": "<p>old</p>"}, intro_hash="")
+        book.refresh_from_db()
+
+        assert book.get_intro_html()["outline"] == "<ol>\n<li>Creation</li>\n</ol>"
@@ -1,6 +1,8 @@
 import json
 
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from milk2meat.bible.factories import BookFactory
@@ -43,6 +45,19 @@ class TestBookListView:
         assert len(response.context["old_testament"]) == 2  # 2 OT books
         assert len(response.context["new_testament"]) == 1  # 1 NT book
 
+    def test_book_list_view_uses_cached_books(self, client):
+        """Test the book list doesn't query the books once they're cached"""
+        user = UserFactory()
+        client.force_login(user)
+        BookFactory(title="Genesis", testament="OT", number=1)
+        url = reverse("bible:book_list")
+        client.get(url)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        assert "Genesis" in response.content.decode()
+        assert not [query for query in queries if "bible_book" in query["sql"]]
+
 
 class TestBookDetailView:
     def test_login_required(self, client):
@@ -88,6 +103,20 @@ class TestBookDetailView:
         assert "timeline_data" in response.context
         assert len(response.context["timeline_data"]) == 1
 
+    def test_book_detail_view_uses_stored_html(self, client, mocker):
+        """Test the book detail view serves the stored intro HTML without rendering markdown"""
+        user = UserFactory()
+        client.force_login(user)
+        book = BookFactory(title_and_author="# Genesis", outline="1. Creation")
+
+        mock_parse = mocker.patch("milk2meat.bible.models.parse_markdown_cached")
+        response = client.get(reverse("bible:book_detail", kwargs={"pk": book.pk}))
+
+        assert response.status_code == 200
+        assert response.context["title_and_author_html"] == "<h1>Genesis</h1>"
+        assert "<ol>\n<li>Creation</li>\n</ol>" in response.content.decode()
+        mock_parse.assert_not_called()
+
 
 class TestBookEditPageView:
     def test_login_required(self, client):
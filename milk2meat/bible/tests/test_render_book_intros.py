@@ -0,0 +1,35 @@
+import pytest
+from django.core.management import call_command
+
+from milk2meat.bible.factories import BookFactory
+from milk2meat.bible.models import Book
+
+pytestmark = pytest.mark.django_db
+
+
+class TestRenderBookIntrosCommand:
+    """Test the render_book_intros management command."""
+
+    def test_command_renders_stale_books(self, capsys):
+        """Test the command re-renders books whose stored HTML is out of date."""
+        BookFactory(outline="1. Up to date")
+        stale = BookFactory(outline="1. Stale")
+        Book.objects.filter(pk=stale.pk).update(intro_html={}, intro_hash="")
+
+        call_command("render_book_intros")
+
+        stale.refresh_from_db()
+        assert stale.intro_html["outline"] == "<ol>\n<li>Stale</li>\n</ol>"
+        assert stale.intro_hash == stale._compute_intro_hash()
+
+        captured = capsys.readouterr()
+        assert "Rendered 1 of 2 book introductions" in captured.out
+
+    def test_command_force(self, capsys):
+        """Test --force re-renders every book."""
+        BookFactory.create_batch(3)
+
+        call_command("render_book_intros", "--force")
+
+        captured = capsys.readouterr()
+        assert "Rendered 3 of 3 book introductions" in captured.out
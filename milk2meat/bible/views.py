@@ -12,21 +12,25 @@ from django.views.generic import DetailView, ListView, TemplateView
 
 from milk2meat.bible.forms import BookEditForm
 from milk2meat.bible.models import Book, Testament
-from milk2meat.core.utils.markdown import parse_markdown
+from milk2meat.core.reference_data import get_books
 
 logger = logging.getLogger(__name__)
 
 
 class BookListView(LoginRequiredMixin, ListView):
     model = Book
-    template_name = "core/book_list.html"
+    template_name = "bible/book_list.html"
     context_object_name = "books"
 
+    def get_queryset(self):
+        # The books rarely change, so they're served from the reference cache
+        return get_books()
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        # Organize books by testament
-        context["old_testament"] = Book.objects.filter(testament=Testament.OT).order_by("number")
-        context["new_testament"] = Book.objects.filter(testament=Testament.NT).order_by("number")
+        # Organize books by testament (the cached books are ordered by number)
+        context["old_testament"] = [book for book in context["books"] if book.testament == Testament.OT]
+        context["new_testament"] = [book for book in context["books"] if book.testament == Testament.NT]
         return context
 
 
@@ -38,18 +42,9 @@ class BookDetailView(LoginRequiredMixin, DetailView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        # Parse and render markdown fields
-        book = self.object
-        if book.title_and_author:
-            context["title_and_author_html"] = mark_safe(parse_markdown(book.title_and_author))
-        if book.date_and_occasion:
-            context["date_and_occasion_html"] = mark_safe(parse_markdown(book.date_and_occasion))
-        if book.characteristics_and_themes:
-            context["characteristics_and_themes_html"] = mark_safe(parse_markdown(book.characteristics_and_themes))
-        if book.christ_in_book:
-            context["christ_in_book_html"] = mark_safe(parse_markdown(book.christ_in_book))
-        if book.outline:
-            context["outline_html"] = mark_safe(parse_markdown(book.outline))
+        # Add the rendered markdown fields (stored on the book, so no markdown work is done here)
+        for field_name, html in self.object.get_intro_html().items():
+            context[f"{field_name}_html"] = mark_safe(html)
 
         # Add timeline data if it exists
         if self.object.timeline:
@@ -1,6 +1,17 @@
 import pytest
+from django.core.cache import cache
 
 
 @pytest.fixture(autouse=True)
 def media_storage(settings, tmpdir):
     settings.MEDIA_ROOT = tmpdir.strpath
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    from milk2meat.core.reference_data import books_cache, note_types_cache
+
+    # The database is rolled back after each test, so the cached data must go too
+    cache.clear()
+    books_cache.clear()
+    note_types_cache.clear()
@@ -12,3 +12,15 @@ class CoreConfig(AppConfig):
         from .search import register_watson_models
 
         register_watson_models()
+
+        # Invalidate the cached reference data (Bible books, note types) when it changes
+        from .reference_data import register_reference_data_invalidation
+
+        register_reference_data_invalidation()
+
+        # Time database queries (see ServerTimingMiddleware)
+        from django.db.backends.signals import connection_created
+
+        from .utils.timing import install_query_timer
+
+        connection_created.connect(install_query_timer, dispatch_uid="install_query_timer")
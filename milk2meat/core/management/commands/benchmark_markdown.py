@@ -0,0 +1,106 @@
+import timeit
+
+import markdown
+import nh3
+from django.core.management.base import BaseCommand
+
+from milk2meat.core.utils.markdown import MARKDOWN_EXTENSIONS, parse_markdown
+
+# A representative chunk of a study note, exercising most of the enabled extensions
+SAMPLE_SECTION = """## The Word became flesh
+
+In the beginning was the Word, and the Word was with God, and the Word was God (John 1:1).
+Note the *three* clauses -- each one says something **different** about the Word.
+
+> "And the Word became flesh and dwelt among us" -- John 1:14
+
+1. Eternity of the Word
+2. Distinction from the Father
+3. Deity of the Word
+
+| Verse | Theme       | Notes                |
+|-------|-------------|----------------------|
+| 1:1   | Deity       | ==key verse==        |
+| 1:14  | Incarnation | see also Phil. 2:5-8 |
+
+- [x] Read the prologue
+- [ ] Compare with Genesis 1
+
+```python
+verses = ["John 1:1", "John 1:14"]
+```
+
+See https://www.esv.org for the ESV text. Press ++ctrl+s++ to save, ~~don't~~ do ^^review^^.
+
+"""
+
+# A short note, e.g. a prayer request or a quick thought
+SMALL_NOTE = """# Prayer list
+
+- Pray for the *youth* camp this weekend
+- Give thanks for answered prayer -- see [Philippians 4:6](https://www.esv.org/Philippians+4:6)
+"""
+
+SIZES = {
+    "small": 0,
+    "medium": 10 * 1024,
+    "large": 100 * 1024,
+}
+
+
+def build_document(size):
+    """Build a markdown document of roughly `size` bytes from the sample section"""
+    if size < len(SAMPLE_SECTION):
+        return SMALL_NOTE
+    return "# Study Notes\n\n" + SAMPLE_SECTION * (size // len(SAMPLE_SECTION))
+
+
+def parse_markdown_per_call(text):
+    """The previous implementation: a new Markdown instance (and nh3 allowlists) on every call"""
+    return nh3.clean(markdown.markdown(text, extensions=MARKDOWN_EXTENSIONS))
+
+
+class Command(BaseCommand):
+    help = "Benchmark parse_markdown against building a Markdown instance per call"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=0,
+            help="Number of calls per measurement (default: scaled to the document size)",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="Number of measurements per variant; the best one is reported (default: 5)",
+        )
+
+    def handle(self, *args, **options):
+        repeat = options["repeat"]
+
+        # Warm up, so that both variants are measured with their imports done
+        parse_markdown(SAMPLE_SECTION)
+        parse_markdown_per_call(SAMPLE_SECTION)
+
+        self.stdout.write(f"{'document':<18}{'per-call engine':>18}{'pooled engine':>18}{'speedup':>10}")
+        for label, size in SIZES.items():
+            text = build_document(size)
+            iterations = options["iterations"] or max(5, 100_000 // len(text))
+
+            assert parse_markdown(text) == parse_markdown_per_call(text), "renderers disagree"
+
+            # Interleave the measurements so that both variants see the same machine conditions
+            before, after = float("inf"), float("inf")
+            for _ in range(repeat):
+                before = min(before, self._time(parse_markdown_per_call, text, iterations))
+                after = min(after, self._time(parse_markdown, text, iterations))
+
+            document = f"{label} ({len(text) // 1024}KB)" if len(text) >= 1024 else f"{label} ({len(text)}B)"
+            self.stdout.write(f"{document:<18}{before:>15.3f} ms{after:>15.3f} ms{before / after:>9.1f}x")
+
+    def _time(self, func, text, iterations):
+        """Average per-call time in milliseconds (with garbage collection enabled, as in production)"""
+        timer = timeit.Timer(lambda: func(text), setup="gc.enable()")
+        return timer.timeit(number=iterations) / iterations * 1000
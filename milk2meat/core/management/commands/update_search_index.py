@@ -0,0 +1,168 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.apps import apps
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand
+from django.db import connection, connections, transaction
+from django.db.models import DateTimeField, Exists, OuterRef, TextField
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+from watson import search as watson
+from watson.models import SearchEntry, get_str_pk, has_int_pk
+
+
+def get_stale_queryset(model, full=False):
+    """
+    Get the objects of a registered model whose search entry is missing or older than the object.
+
+    Args:
+        model: A model registered with django-watson (with an `updated_at` field)
+        full (bool): Consider every object stale, i.e. rebuild the whole index for the model
+    """
+    queryset = model._default_manager.all()
+    if full:
+        return queryset
+
+    # `indexed_at` isn't a SearchEntry field (it's maintained by a trigger, see core migration 0003).
+    # The column isn't qualified, as the subquery's table gets an alias
+    current_entries = (
+        SearchEntry.objects.filter(
+            engine_slug=watson.default_search_engine._engine_slug,
+            content_type=ContentType.objects.get_for_model(model),
+            object_id=Cast(OuterRef("pk"), output_field=TextField()),
+        )
+        .alias(indexed_at=RawSQL("indexed_at", [], output_field=DateTimeField()))
+        .filter(indexed_at__gte=OuterRef("updated_at"))
+    )
+    return queryset.filter(~Exists(current_entries))
+
+
+def index_objects(model_label, pks):
+    """
+    (Re-)index the given objects, replacing their search entries with a single bulk insert.
+
+    This is the unit of work run by the process pool, hence the plain arguments.
+
+    Args:
+        model_label (str): Label of a registered model, e.g. "notes.Note"
+        pks (list): Primary keys of the objects to index
+
+    Returns:
+        int: Number of objects indexed
+    """
+    engine = watson.default_search_engine
+    model = apps.get_model(model_label)
+    adapter = engine.get_adapter(model)
+    content_type = ContentType.objects.get_for_model(model)
+
+    # Fetch the relations used by the stored meta (e.g. `note_type__name`) along with the objects
+    related = {field_name.split("__")[0] for field_name in adapter.store if "__" in field_name}
+    objects = model._default_manager.filter(pk__in=pks).select_related(*related)
+
+    search_entries = []
+    for obj in objects:
+        object_id = get_str_pk(obj, connection)
+        search_entries.append(
+            SearchEntry(
+                engine_slug=engine._engine_slug,
+                content_type=content_type,
+                object_id=object_id,
+                object_id_int=int(obj.pk) if has_int_pk(model) else None,
+                title=adapter.get_title(obj),
+                description=adapter.get_description(obj),
+                content=adapter.get_content(obj),
+                url=adapter.get_url(obj),
+                meta_encoded=adapter.serialize_meta(obj),
+            )
+        )
+
+    with transaction.atomic():
+        SearchEntry.objects.filter(
+            engine_slug=engine._engine_slug,
+            content_type=content_type,
+            object_id__in=[str(pk) for pk in pks],
+        ).delete()
+        SearchEntry.objects.bulk_create(search_entries)
+
+    return len(search_entries)
+
+
+class Command(BaseCommand):
+    help = "Incrementally update the django-watson search index (an alternative to a full buildwatson)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Re-index every object, not just those changed since they were last indexed",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of objects to index per bulk insert (default: 500)",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of worker processes (default: 1, i.e. no pool)",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        workers = options["workers"]
+
+        tasks = []
+        for model in watson.get_registered_models():
+            # Remove the entries of deleted objects
+            watson.default_search_engine.cleanup_model_index(model)
+
+            # Split the stale objects into batches, keeping the objects of an owner (where there is
+            # one) together, so parallel batches mostly touch different owners' entries. Batches
+            # are filled up with the next owners' objects rather than made per owner, as most
+            # owners only have a few stale objects.
+            stale = get_stale_queryset(model, full=options["full"])
+            if any(field.attname == "owner_id" for field in model._meta.fields):
+                stale = stale.order_by("owner_id", "pk")
+            else:
+                stale = stale.order_by("pk")
+            pks = list(stale.values_list("pk", flat=True))
+
+            for start in range(0, len(pks), batch_size):
+                tasks.append((model._meta.label, pks[start : start + batch_size]))
+
+        total = sum(len(pks) for _, pks in tasks)
+        if not total:
+            self.stdout.write(self.style.SUCCESS("Search index is up to date."))
+            return
+
+        self.stdout.write(f"Indexing {total} object(s) in {len(tasks)} batch(es)...")
+        started = time.perf_counter()
+        indexed = 0
+
+        for count in self._run(tasks, workers):
+            indexed += count
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"  {indexed}/{total} indexed ({indexed / elapsed:.0f} objects/s)")
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(f"Indexed {indexed} object(s) in {elapsed:.1f}s ({indexed / elapsed:.0f} objects/s).")
+        )
+
+    def _run(self, tasks, workers):
+        """Run the indexing tasks, yielding the number of objects indexed by each one as it completes"""
+        if workers <= 1:
+            for model_label, pks in tasks:
+                yield index_objects(model_label, pks)
+            return
+
+        # Forked workers must not share the parent's database connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("fork")) as executor:
+            futures = [executor.submit(index_objects, model_label, pks) for model_label, pks in tasks]
+            for future in as_completed(futures):
+                yield future.result()
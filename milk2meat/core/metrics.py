@@ -0,0 +1,168 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (in seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Prefix of the counters in the shared cache
+KEY_PREFIX = "metrics"
+# Cache key of the set of views requests were recorded for
+VIEWS_KEY = f"{KEY_PREFIX}:views"
+
+# Counters (in the request metrics) that aren't broken down by view: name, label
+GLOBAL_COUNTERS = {
+    "cache_hit": ("cache_requests_total", 'result="hit"'),
+    "cache_miss": ("cache_requests_total", 'result="miss"'),
+    "form_upload_bytes": ("upload_bytes_total", 'method="form"'),
+    "direct_upload_bytes": ("upload_bytes_total", 'method="direct"'),
+    "signed_url": ("signed_urls_total", 'kind="download"'),
+    "upload_url": ("signed_urls_total", 'kind="upload"'),
+}
+
+METRICS = {
+    "request_duration_seconds": ("histogram", "Request latency, by URL name"),
+    "db_queries_total": ("counter", "Database queries, by URL name"),
+    "cache_requests_total": ("counter", "Cache lookups, by result (hit or miss)"),
+    "upload_bytes_total": ("counter", "Bytes of note files uploaded, by upload method"),
+    "signed_urls_total": ("counter", "Signed storage URLs generated, by kind"),
+}
+
+
+class MetricsRecorder:
+    """
+    Record request metrics, aggregated across processes.
+
+    Each process adds up the metrics of its requests in memory, and adds them to counters in
+    the shared cache (Redis in production, where increments are atomic and batched) at most every
+    `METRICS_FLUSH_INTERVAL` seconds. So the numbers exported by `render` combine all the
+    gunicorn workers, whichever one serves the `/metrics` request. (The metrics of a worker
+    since its last flush are lost when it's restarted.)
+
+    Latency sums are stored in microseconds, as the counters are integers.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = defaultdict(int)
+        self._views = set()
+        self._last_flush = time.monotonic()
+
+    def record_request(self, view, duration, request_metrics):
+        """
+        Record a request.
+
+        Args:
+            view (str): URL name of the view, e.g. "notes:note_list"
+            duration (float): Time taken, in seconds
+            request_metrics (RequestMetrics): The request's metrics (see ServerTimingMiddleware)
+        """
+        with self._lock:
+            self._views.add(view)
+            self._pending[f"latency:{view}:{bisect_left(LATENCY_BUCKETS, duration)}"] += 1
+            self._pending[f"latency_sum:{view}"] += round(duration * 1_000_000)
+            self._pending[f"queries:{view}"] += request_metrics.counts["db"]
+            for name in GLOBAL_COUNTERS:
+                self._pending[name] += request_metrics.counts[name]
+            due = time.monotonic() - self._last_flush >= settings.METRICS_FLUSH_INTERVAL
+
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Add this process's metrics to the counters in the shared cache"""
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(int)
+            views = set(self._views)
+            self._last_flush = time.monotonic()
+
+        try:
+            self._increment_many({f"{KEY_PREFIX}:{name}": amount for name, amount in pending.items() if amount})
+
+            # Another process may add views at the same time, but each process keeps adding
+            # the views it knows of, so none is missing for long
+            known = cache.get(VIEWS_KEY, set())
+            if not views <= known:
+                cache.set(VIEWS_KEY, known | views, None)
+        except Exception:
+            # Metrics are best effort: requests shouldn't fail because the cache is unavailable
+            logger.warning("Error flushing metrics", exc_info=True)
+
+    def render(self):
+        """
+        Render the aggregated metrics in the Prometheus text format.
+
+        Returns:
+            str: The metrics
+        """
+        self.flush()
+        views = sorted(cache.get(VIEWS_KEY, set()))
+        keys = [f"{KEY_PREFIX}:{name}" for name in GLOBAL_COUNTERS]
+        for view in views:
+            keys += [f"{KEY_PREFIX}:latency:{view}:{i}" for i in range(len(LATENCY_BUCKETS) + 1)]
+            keys += [f"{KEY_PREFIX}:latency_sum:{view}", f"{KEY_PREFIX}:queries:{view}"]
+        values = cache.get_many(keys)
+
+        def value(name):
+            return values.get(f"{KEY_PREFIX}:{name}", 0)
+
+        samples = defaultdict(list)
+        for view in views:
+            label = f'view="{_escape(view)}"'
+            count = 0
+            for i, bound in enumerate([*LATENCY_BUCKETS, "+Inf"]):
+                count += value(f"latency:{view}:{i}")
+                samples["request_duration_seconds"].append(f'_bucket{{{label},le="{bound}"}} {count}')
+            samples["request_duration_seconds"].append(f"_sum{{{label}}} {value(f'latency_sum:{view}') / 1_000_000}")
+            samples["request_duration_seconds"].append(f"_count{{{label}}} {count}")
+            samples["db_queries_total"].append(f"{{{label}}} {value(f'queries:{view}')}")
+        for name, (metric, label) in GLOBAL_COUNTERS.items():
+            samples[metric].append(f"{{{label}}} {value(name)}")
+
+        lines = []
+        for metric, (kind, description) in METRICS.items():
+            name = f"milk2meat_{metric}"
+            lines += [f"# HELP {name} {description}", f"# TYPE {name} {kind}"]
+            lines += [name + sample for sample in samples[metric]]
+        return "\n".join(lines) + "\n"
+
+    def _increment_many(self, amounts):
+        """
+        Add the given amounts to the counters in the shared cache.
+
+        With Redis (django-redis), this takes a single round trip: the INCRBY commands are sent in
+        a pipeline, and create the missing counters. Flushes run in the requests of the process,
+        so they shouldn't wait on the cache once per counter.
+        """
+        get_client = getattr(getattr(cache, "client", None), "get_client", None)
+        if get_client is None:
+            for key, amount in amounts.items():
+                self._increment(key, amount)
+            return
+
+        pipeline = get_client(write=True).pipeline(transaction=False)
+        for key, amount in amounts.items():
+            pipeline.incrby(cache.client.make_key(key), amount)
+        pipeline.execute()
+
+    def _increment(self, key, amount):
+        try:
+            cache.incr(key, amount)
+        except ValueError:
+            # The counter doesn't exist yet (unless another process just created it)
+            if not cache.add(key, amount, None):
+                cache.incr(key, amount)
+
+
+def _escape(label_value):
+    return label_value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+recorder = MetricsRecorder()
@@ -0,0 +1,99 @@
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+
+from milk2meat.core.metrics import recorder
+from milk2meat.core.utils.timing import collect_metrics
+
+logger = logging.getLogger("milk2meat.performance")
+
+# Kinds of work reported (see `milk2meat.core.utils.timing`), with their descriptions
+TIMED_METRICS = {
+    "db": "Database",
+    "search": "Search index",
+    "markdown": "Markdown",
+    "storage": "Storage",
+}
+
+
+class ServerTimingMiddleware:
+    """
+    Measure where the time handling each request goes.
+
+    The total time, database queries (and the search index queries among them), markdown
+    rendering, storage calls and cache hits/misses are logged to the `milk2meat.performance`
+    logger as structured fields, and added to the aggregated metrics exported at `/metrics`
+    (see `MetricsRecorder`).
+
+    They're also reported in the `Server-Timing` header (shown in the browser's developer
+    tools), but only in development and to staff (see `SERVER_TIMING_FOR_STAFF`), as they
+    reveal the app's internals.
+
+    It should come first in MIDDLEWARE, so that the total covers the other middleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        start = time.perf_counter()
+        with collect_metrics() as metrics:
+            response = self.get_response(request)
+        self.report(request, response, metrics, time.perf_counter() - start, getattr(request, "user", None))
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        with collect_metrics() as metrics:
+            response = await self.get_response(request)
+        # Recording the metrics may use the cache (possibly the database cache)
+        await sync_to_async(self.report)(
+            request, response, metrics, time.perf_counter() - start, getattr(request, "user", None)
+        )
+        return response
+
+    def report(self, request, response, metrics, total, user):
+        """Add the Server-Timing header to the response, and log the metrics"""
+        entries = [f"total;dur={total * 1000:.1f}"]
+        fields = {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "duration_ms": round(total * 1000, 1),
+        }
+
+        for name, description in TIMED_METRICS.items():
+            if metrics.counts[name]:
+                duration = metrics.durations[name] * 1000
+                entries.append(f'{name};dur={duration:.1f};desc="{description} ({metrics.counts[name]})"')
+            fields[f"{name}_count"] = metrics.counts[name]
+            fields[f"{name}_ms"] = round(metrics.durations[name] * 1000, 1)
+
+        hits, misses = metrics.counts["cache_hit"], metrics.counts["cache_miss"]
+        if hits or misses:
+            entries.append(f'cache;desc="Cache ({hits} hits, {misses} misses)"')
+        fields["cache_hits"] = hits
+        fields["cache_misses"] = misses
+
+        if self.show_server_timing(user):
+            response["Server-Timing"] = ", ".join(entries)
+        view = request.resolver_match.view_name if request.resolver_match else "unresolved"
+        recorder.record_request(view, total, metrics)
+        logger.info("%s %s %s %.1fms", request.method, request.path, response.status_code, total * 1000, extra=fields)
+
+    def show_server_timing(self, user):
+        """Whether to add the Server-Timing header to the response to the user (if any)"""
+        if settings.DEBUG:
+            return True
+        return settings.SERVER_TIMING_FOR_STAFF and user is not None and user.is_staff
@@ -0,0 +1,48 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Add an indexed `owner_id` column to django-watson's search entries, so that global search
+    can be scoped to a user's own entries. Like watson's own `search_tsv` column, it is
+    maintained by a trigger (from the `owner_id` stored in the entry meta by NoteSearchAdapter).
+    """
+
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("core", "0001_initial"),
+        ("notes", "0003_note_search_vector"),
+        ("watson", "0002_alter_searchentry_object_id"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+            ALTER TABLE watson_searchentry ADD COLUMN owner_id bigint NULL;
+            CREATE INDEX watson_searchentry_owner_id ON watson_searchentry (owner_id);
+
+            CREATE OR REPLACE FUNCTION watson_searchentry_owner_trigger_handler() RETURNS trigger AS $$
+            BEGIN
+                new.owner_id := (new.meta_encoded::jsonb ->> 'owner_id')::bigint;
+                RETURN new;
+            END
+            $$ LANGUAGE plpgsql;
+
+            CREATE TRIGGER watson_searchentry_owner_trigger BEFORE INSERT OR UPDATE OF meta_encoded
+            ON watson_searchentry FOR EACH ROW EXECUTE PROCEDURE watson_searchentry_owner_trigger_handler();
+
+            UPDATE watson_searchentry
+            SET owner_id = notes_note.owner_id
+            FROM notes_note, django_content_type
+            WHERE django_content_type.id = watson_searchentry.content_type_id
+                AND django_content_type.app_label = 'notes'
+                AND django_content_type.model = 'note'
+                AND watson_searchentry.object_id = notes_note.id::text;
+            """,
+            reverse_sql="""
+            DROP TRIGGER watson_searchentry_owner_trigger ON watson_searchentry;
+            DROP FUNCTION watson_searchentry_owner_trigger_handler();
+            ALTER TABLE watson_searchentry DROP COLUMN owner_id;
+            """,
+        ),
+    ]
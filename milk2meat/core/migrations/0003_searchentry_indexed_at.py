@@ -0,0 +1,39 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    """
+    Record when each search entry was last written, so the index can be refreshed incrementally
+    (see the `update_search_index` command). The timestamp is set by the same trigger as `owner_id`.
+    """
+
+    dependencies = [
+        ("core", "0002_searchentry_owner"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="""
+            ALTER TABLE watson_searchentry ADD COLUMN indexed_at timestamp with time zone NULL;
+
+            CREATE OR REPLACE FUNCTION watson_searchentry_owner_trigger_handler() RETURNS trigger AS $$
+            BEGIN
+                new.owner_id := (new.meta_encoded::jsonb ->> 'owner_id')::bigint;
+                -- clock_timestamp() rather than now(), which is the (earlier) start of the transaction
+                new.indexed_at := clock_timestamp();
+                RETURN new;
+            END
+            $$ LANGUAGE plpgsql;
+            """,
+            reverse_sql="""
+            CREATE OR REPLACE FUNCTION watson_searchentry_owner_trigger_handler() RETURNS trigger AS $$
+            BEGIN
+                new.owner_id := (new.meta_encoded::jsonb ->> 'owner_id')::bigint;
+                RETURN new;
+            END
+            $$ LANGUAGE plpgsql;
+
+            ALTER TABLE watson_searchentry DROP COLUMN indexed_at;
+            """,
+        ),
+    ]
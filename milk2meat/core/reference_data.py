@@ -0,0 +1,34 @@
+from django.db.models.signals import post_delete, post_save
+
+from milk2meat.bible.models import Book
+from milk2meat.core.utils.cache import ReferenceCache
+from milk2meat.notes.models import NoteType
+
+books_cache = ReferenceCache("books", lambda: list(Book.objects.all()))
+note_types_cache = ReferenceCache("note_types", lambda: list(NoteType.objects.all()))
+
+
+def get_books():
+    """Get all the Bible books (ordered by number), from the reference cache"""
+    return books_cache.get()
+
+
+def get_note_types():
+    """Get all the note types, from the reference cache"""
+    return note_types_cache.get()
+
+
+def _invalidate_books(sender, **kwargs):
+    books_cache.invalidate()
+
+
+def _invalidate_note_types(sender, **kwargs):
+    note_types_cache.invalidate()
+
+
+def register_reference_data_invalidation():
+    """Invalidate the cached reference data whenever it changes"""
+    post_save.connect(_invalidate_books, sender=Book, dispatch_uid="invalidate_books")
+    post_delete.connect(_invalidate_books, sender=Book, dispatch_uid="invalidate_books")
+    post_save.connect(_invalidate_note_types, sender=NoteType, dispatch_uid="invalidate_note_types")
+    post_delete.connect(_invalidate_note_types, sender=NoteType, dispatch_uid="invalidate_note_types")
@@ -1,15 +1,35 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.db.models import BigIntegerField, Q
+from django.db.models.expressions import RawSQL
 from watson import search as watson
 
 from milk2meat.bible.models import Book
 from milk2meat.notes.models import Note
 
 
+class NoteSearchAdapter(watson.SearchAdapter):
+    """
+    Search adapter for notes, which records the note owner in the entry meta.
+
+    A database trigger (see core migration 0002) copies it into the indexed
+    `watson_searchentry.owner_id` column, so searches can be scoped to a user's
+    entries without a subquery over their notes.
+    """
+
+    def get_meta(self, obj):
+        meta = super().get_meta(obj)
+        meta["owner_id"] = obj.owner_id
+        return meta
+
+
 def register_watson_models():
     """Register models with django-watson for full-text search"""
 
     # Register Note model with relevant fields
     watson.register(
         Note,
+        NoteSearchAdapter,
         fields=("title", "content"),
         store=("note_type__name", "updated_at"),
     )
@@ -27,3 +47,52 @@ def register_watson_models():
         ),
         store=("testament", "chapters"),
     )
+
+
+def mark_search_entries_stale(queryset):
+    """
+    Mark the search entries of the given objects as stale, so the next `update_search_index` run
+    re-indexes them.
+
+    Use this for changes to what the objects are indexed with that don't bump their `updated_at`,
+    e.g. a renamed note type (stored in the entries of its notes).
+
+    Returns:
+        int: The number of entries marked
+    """
+    # `indexed_at` isn't a SearchEntry field (it's maintained by a trigger, see core migration 0003)
+    pks_sql, pks_params = queryset.values("pk").query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""UPDATE watson_searchentry SET indexed_at = NULL
+                WHERE engine_slug = %s
+                    AND content_type_id = %s
+                    AND object_id IN (SELECT objects.pk::text FROM ({pks_sql}) AS objects(pk))""",
+            [
+                watson.default_search_engine._engine_slug,
+                ContentType.objects.get_for_model(queryset.model).pk,
+                *pks_params,
+            ],
+        )
+        return cursor.rowcount
+
+
+def search_for_user(query, user):
+    """
+    Search the user's own notes and the (shared) Bible books.
+
+    Args:
+        query (str): Search text
+        user: The user whose notes should be searched
+
+    Returns:
+        QuerySet: Ranked `SearchEntry` results
+    """
+    book_content_type = ContentType.objects.get_for_model(Book)
+    return (
+        watson.search(query, models=(Note, Book))
+        # `owner_id` isn't a SearchEntry field (it's maintained by a trigger, see core migration 0002)
+        .alias(owner_id=RawSQL("watson_searchentry.owner_id", [], output_field=BigIntegerField())).filter(
+            Q(owner_id=user.pk) | Q(content_type_id=book_content_type.pk)
+        )
+    )
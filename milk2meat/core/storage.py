@@ -1,11 +1,43 @@
+import hashlib
 import logging
+import time
 
+from botocore.exceptions import ClientError
 from django.conf import settings
+from django.core.cache import cache
 from storages.backends.s3boto3 import S3Boto3Storage
+from storages.utils import clean_name
+
+from milk2meat.core.utils.timing import get_current_metrics, record_cache_lookup, record_count, timed
 
 logger = logging.getLogger(__name__)
 
 
+def signed_url_window():
+    """
+    Get the current signed URL window (see `PrivateS3Storage.url`).
+
+    Returns:
+        tuple: The number of the window, and the (whole, at least 1) number of seconds until it ends
+    """
+    length = getattr(settings, "AWS_SIGNED_URL_WINDOW_SECONDS", 60 * 60)
+    now = time.time()
+    window = int(now // length)
+    return window, max(int((window + 1) * length - now), 1)
+
+
+def _start_api_call(context, **kwargs):
+    context["timing_start"] = time.perf_counter()
+
+
+def _end_api_call(context, **kwargs):
+    """Record the time spent in an S3 API call (see ServerTimingMiddleware)"""
+    start = context.pop("timing_start", None)
+    metrics = get_current_metrics()
+    if start is not None and metrics is not None:
+        metrics.add("storage", time.perf_counter() - start)
+
+
 class PrivateS3Storage(S3Boto3Storage):
     """
     Custom S3 storage for Cloudflare R2 with private files and signed URLs.
@@ -19,10 +51,23 @@ class PrivateS3Storage(S3Boto3Storage):
         self.signature_version = getattr(settings, "AWS_S3_SIGNATURE_VERSION", "s3v4")
         super().__init__(**kwargs)
 
+    def _create_session(self):
+        session = super()._create_session()
+        # Time the API calls made by the storage
+        session.events.register("before-parameter-build.s3", _start_api_call)
+        session.events.register("after-call.s3", _end_api_call)
+        session.events.register("after-call-error.s3", _end_api_call)
+        return session
+
+    @timed("storage")
     def url(self, name, parameters=None, expire=None):
         """
         Generate a signed URL with expiration for private files.
 
+        Signed URLs are cached for fixed time windows (AWS_SIGNED_URL_WINDOW_SECONDS), so the
+        same URL is returned throughout a window, and browsers can cache the file. Each URL
+        is valid until `expire` seconds after the end of its window.
+
         Args:
             name: Name of the file
             parameters: Additional parameters for the URL
@@ -34,13 +79,187 @@ class PrivateS3Storage(S3Boto3Storage):
         if expire is None:
             expire = getattr(settings, "AWS_SIGNED_URL_EXPIRE_SECONDS", 300)
 
+        window, remaining = signed_url_window()
+        cache_key = f"signed-url:{hashlib.sha256(name.encode()).hexdigest()}:{expire}:{window}"
+        url = cache.get(cache_key)
+        record_cache_lookup(url is not None)
+        if url is not None:
+            return url
+
         # Generate the signed URL with expiration
         try:
-            return super().url(name, parameters={"ResponseContentDisposition": "inline"}, expire=expire)
+            url = super().url(name, parameters={"ResponseContentDisposition": "inline"}, expire=remaining + expire)
         except Exception as e:
             logger.error(f"Error generating signed URL for {name}: {str(e)}")
             raise
 
+        cache.set(cache_key, url, remaining)
+        record_count("signed_url")
+        return url
+
+    @timed("storage")
+    def get_upload_url(self, name, content_type, size, expire=None):
+        """
+        Generate a signed URL for uploading a file straight to the bucket (with a PUT request).
+
+        The content type and length are part of the signature, so the upload has to match
+        them. (R2 doesn't support POST policies, which would allow a range of sizes.)
+
+        Args:
+            name: Name of the file to upload
+            content_type: MIME type of the file
+            size: Size of the file in bytes
+            expire: Expiration time in seconds
+
+        Returns:
+            tuple: The signed URL, and the headers the upload request must send
+        """
+        if expire is None:
+            expire = getattr(settings, "AWS_SIGNED_URL_EXPIRE_SECONDS", 300)
+
+        client = self.connection.meta.client
+        params = {**self.get_object_parameters(name), "ContentType": content_type, "ContentLength": size}
+        url = client.generate_presigned_url(
+            "put_object",
+            Params={"Bucket": self.bucket_name, "Key": self._normalize_name(clean_name(name)), **params},
+            ExpiresIn=expire,
+            HttpMethod="PUT",
+        )
+
+        # Browsers set the Content-Length header themselves
+        members = client.meta.service_model.operation_model("PutObject").input_shape.members
+        headers = {
+            members[param].serialization["name"]: str(value)
+            for param, value in params.items()
+            if param != "ContentLength" and members[param].serialization.get("location") == "header"
+        }
+        record_count("upload_url")
+        return url, headers
+
+    def create_multipart_upload(self, name, content_type):
+        """
+        Start a multipart upload, whose parts are uploaded with URLs from get_upload_part_url.
+
+        Args:
+            name: Name of the file to upload
+            content_type: MIME type of the file
+
+        Returns:
+            str: The ID of the upload
+        """
+        params = {**self.get_object_parameters(name), "ContentType": content_type}
+        response = self.connection.meta.client.create_multipart_upload(
+            Bucket=self.bucket_name, Key=self._normalize_name(clean_name(name)), **params
+        )
+        return response["UploadId"]
+
+    @timed("storage")
+    def get_upload_part_url(self, name, upload_id, part_number, size, expire=None):
+        """
+        Generate a signed URL for uploading a part of a multipart upload (with a PUT request).
+
+        Like get_upload_url, the signature covers the content length, so the part must have
+        exactly the given size.
+
+        Args:
+            name: Name of the file being uploaded
+            upload_id: The ID of the upload
+            part_number: Number of the part, from 1
+            size: Size of the part in bytes
+            expire: Expiration time in seconds
+
+        Returns:
+            str: The signed URL
+        """
+        if expire is None:
+            expire = getattr(settings, "AWS_SIGNED_URL_EXPIRE_SECONDS", 300)
+
+        url = self.connection.meta.client.generate_presigned_url(
+            "upload_part",
+            Params={
+                "Bucket": self.bucket_name,
+                "Key": self._normalize_name(clean_name(name)),
+                "UploadId": upload_id,
+                "PartNumber": part_number,
+                "ContentLength": size,
+            },
+            ExpiresIn=expire,
+            HttpMethod="PUT",
+        )
+        record_count("upload_url")
+        return url
+
+    def list_upload_parts(self, name, upload_id):
+        """
+        List the parts uploaded so far in a multipart upload.
+
+        Returns:
+            list: The parts, as dicts with their "number", "size" and "etag"
+
+        Raises:
+            FileNotFoundError: If the upload doesn't exist (e.g. it was completed or aborted)
+        """
+        paginator = self.connection.meta.client.get_paginator("list_parts")
+        pages = paginator.paginate(
+            Bucket=self.bucket_name, Key=self._normalize_name(clean_name(name)), UploadId=upload_id
+        )
+        try:
+            return [
+                {"number": part["PartNumber"], "size": part["Size"], "etag": part["ETag"]}
+                for page in pages
+                for part in page.get("Parts", [])
+            ]
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "NoSuchUpload":
+                raise FileNotFoundError(f"No such upload: {upload_id}") from e
+            raise
+
+    def complete_multipart_upload(self, name, upload_id, parts):
+        """
+        Assemble the uploaded parts of a multipart upload into the file.
+
+        Args:
+            name: Name of the file being uploaded
+            upload_id: The ID of the upload
+            parts: The parts to assemble, as returned by list_upload_parts
+
+        Raises:
+            FileNotFoundError: If the upload or one of the parts (with its ETag) doesn't exist
+        """
+        try:
+            self.connection.meta.client.complete_multipart_upload(
+                Bucket=self.bucket_name,
+                Key=self._normalize_name(clean_name(name)),
+                UploadId=upload_id,
+                MultipartUpload={"Parts": [{"PartNumber": part["number"], "ETag": part["etag"]} for part in parts]},
+            )
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("NoSuchUpload", "InvalidPart"):
+                raise FileNotFoundError(f"No such upload or part: {upload_id}") from e
+            raise
+
+    def abort_multipart_upload(self, name, upload_id):
+        """Abort a multipart upload, deleting the parts uploaded so far"""
+        self.connection.meta.client.abort_multipart_upload(
+            Bucket=self.bucket_name, Key=self._normalize_name(clean_name(name)), UploadId=upload_id
+        )
+
+    def read_start(self, name, length):
+        """
+        Read the first bytes of a file (with a ranged GET), e.g. to detect its type.
+
+        Args:
+            name: Name of the file
+            length: Maximum number of bytes to read
+
+        Returns:
+            bytes: Up to `length` bytes from the start of the file
+        """
+        response = self.connection.meta.client.get_object(
+            Bucket=self.bucket_name, Key=self._normalize_name(clean_name(name)), Range=f"bytes=0-{length - 1}"
+        )
+        return response["Body"].read()
+
 
 def user_can_access_file(file_path, user):
     """
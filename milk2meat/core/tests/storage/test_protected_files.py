@@ -2,10 +2,14 @@ import json
 from unittest import mock
 
 import pytest
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from milk2meat.notes.factories import NoteFactory, NoteTypeFactory
+from milk2meat.notes.models import Note
 from milk2meat.users.factories import UserFactory
 
 pytestmark = pytest.mark.django_db
@@ -147,3 +151,82 @@ class TestServeProtectedFileView:
             data = json.loads(response.content)
             assert "error" in data
             assert "permission" in data["error"].lower()
+
+    def test_url_is_cached(self, client):
+        """Test that repeat requests neither query the note nor generate a URL"""
+        user = UserFactory()
+        client.force_login(user)
+        test_file = SimpleUploadedFile("test.pdf", b"%PDF-1.4\nTest PDF", content_type="application/pdf")
+        note = NoteFactory(owner=user, upload=test_file)
+        url = reverse("notes:serve_protected_file", kwargs={"note_id": note.pk})
+
+        with mock.patch("milk2meat.notes.models.Note.get_secure_file_url", return_value="https://example.com/signed"):
+            response = client.get(url)
+            with CaptureQueriesContext(connection) as queries:
+                repeat_response = client.get(url)
+
+            assert Note.get_secure_file_url.call_count == 1
+
+        assert repeat_response.json() == response.json() == {"url": "https://example.com/signed"}
+        assert not [query for query in queries.captured_queries if "notes_note" in query["sql"]]
+        # The browser can cache the response until the end of the signed URL window
+        assert repeat_response["Cache-Control"].startswith("private, max-age=")
+
+    def test_cached_url_is_only_served_to_the_owner(self, client):
+        """Test that a cached URL isn't served to other users"""
+        user = UserFactory()
+        test_file = SimpleUploadedFile("test.pdf", b"%PDF-1.4\nTest PDF", content_type="application/pdf")
+        note = NoteFactory(owner=user, upload=test_file)
+        url = reverse("notes:serve_protected_file", kwargs={"note_id": note.pk})
+        client.force_login(user)
+        client.get(url)
+
+        client.force_login(UserFactory())
+        response = client.get(url)
+
+        assert response.status_code == 404
+
+    def test_cached_url_is_forgotten_when_the_note_changes(self, client, django_capture_on_commit_callbacks):
+        """Test that the cached URL is dropped once the note is saved (e.g. its file was replaced)"""
+        user = UserFactory()
+        client.force_login(user)
+        test_file = SimpleUploadedFile("test.pdf", b"%PDF-1.4\nTest PDF", content_type="application/pdf")
+        note = NoteFactory(owner=user, upload=test_file)
+        url = reverse("notes:serve_protected_file", kwargs={"note_id": note.pk})
+        client.get(url)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            note.upload = None
+            note.save()
+            # Until the commit, other requests still see the file, so the URL stays cached
+            assert cache.get(Note.file_url_cache_key(note.pk)) is not None
+        response = client.get(url)
+
+        assert response.status_code == 404
+
+
+class TestOpenProtectedFileView:
+    """Test the open_protected_file view"""
+
+    def test_redirects_to_file(self, client):
+        """Test that the view redirects to the file's URL"""
+        user = UserFactory()
+        client.force_login(user)
+        test_file = SimpleUploadedFile("test.pdf", b"%PDF-1.4\nTest PDF", content_type="application/pdf")
+        note = NoteFactory(owner=user, upload=test_file)
+
+        response = client.get(reverse("notes:open_protected_file", kwargs={"note_id": note.pk}))
+
+        assert response.status_code == 302
+        assert response.url == note.upload.url
+        assert response["Cache-Control"].startswith("private, max-age=")
+
+    def test_cannot_open_other_users_file(self, client):
+        """Test that a user cannot open another user's files"""
+        client.force_login(UserFactory())
+        test_file = SimpleUploadedFile("test.pdf", b"%PDF-1.4\nTest PDF", content_type="application/pdf")
+        note = NoteFactory(upload=test_file)
+
+        response = client.get(reverse("notes:open_protected_file", kwargs={"note_id": note.pk}))
+
+        assert response.status_code == 404
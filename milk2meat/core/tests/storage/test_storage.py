@@ -1,14 +1,22 @@
+import io
 from unittest import mock
+from urllib.parse import parse_qs, urlsplit
 
 import pytest
+from botocore.response import StreamingBody
+from botocore.stub import Stubber
 from django.contrib.auth import get_user_model
 from django.test import override_settings
 
 from milk2meat.core.storage import PrivateS3Storage, user_can_access_file
+from milk2meat.core.utils.timing import collect_metrics
 from milk2meat.users.factories import UserFactory
 
 User = get_user_model()
 
+# Start of a signed URL window (of the default length, an hour)
+WINDOW_START = 1_700_000_000 // 3600 * 3600
+
 pytestmark = pytest.mark.django_db
 
 
@@ -39,9 +47,10 @@ class TestPrivateS3Storage:
         assert storage.file_overwrite is True
         assert storage.signature_version == "s3"
 
+    @mock.patch("milk2meat.core.storage.time.time", return_value=WINDOW_START + 1000)
     @mock.patch("storages.backends.s3boto3.S3Boto3Storage.url")
-    def test_url_method_with_expiration(self, mock_url):
-        """Test the URL method generates signed URLs with expiration"""
+    def test_url_method_with_expiration(self, mock_url, mock_time):
+        """Test the URL method generates signed URLs valid until `expire` seconds after the end of the window"""
         # Set up mock
         mock_url.return_value = "https://example.com/signed-url"
 
@@ -49,28 +58,52 @@ class TestPrivateS3Storage:
         storage = PrivateS3Storage()
         url = storage.url("test.pdf", expire=600)
 
-        # Verify correct params are passed
-        mock_url.assert_called_once_with("test.pdf", parameters={"ResponseContentDisposition": "inline"}, expire=600)
+        # Verify correct params are passed (the window ends in 2600 seconds)
+        mock_url.assert_called_once_with(
+            "test.pdf", parameters={"ResponseContentDisposition": "inline"}, expire=2600 + 600
+        )
 
         # Check return value
         assert url == "https://example.com/signed-url"
 
+    @mock.patch("milk2meat.core.storage.time.time", return_value=WINDOW_START)
     @mock.patch("storages.backends.s3boto3.S3Boto3Storage.url")
-    def test_url_method_with_default_expiration(self, mock_url):
+    def test_url_method_with_default_expiration(self, mock_url, mock_time):
         """Test the URL method uses default expiration when not specified"""
         # Set up mock
         mock_url.return_value = "https://example.com/signed-url"
 
         # Create storage and call url with no explicit expiration
-        with override_settings(AWS_SIGNED_URL_EXPIRE_SECONDS=400):
+        with override_settings(AWS_SIGNED_URL_EXPIRE_SECONDS=400, AWS_SIGNED_URL_WINDOW_SECONDS=60):
             storage = PrivateS3Storage()
             storage.url("test.pdf")
 
             # Verify correct default expiration is used
             mock_url.assert_called_once_with(
-                "test.pdf", parameters={"ResponseContentDisposition": "inline"}, expire=400
+                "test.pdf", parameters={"ResponseContentDisposition": "inline"}, expire=60 + 400
             )
 
+    @mock.patch("milk2meat.core.storage.time.time")
+    @mock.patch("storages.backends.s3boto3.S3Boto3Storage.url")
+    def test_url_method_reuses_urls_within_a_window(self, mock_url, mock_time):
+        """Test the URL method returns the same URL throughout a window, and a new one in the next window"""
+        mock_url.side_effect = ["https://example.com/signed-url-1", "https://example.com/signed-url-2"]
+        storage = PrivateS3Storage()
+
+        mock_time.return_value = WINDOW_START + 10
+        first = storage.url("test.pdf")
+        mock_time.return_value = WINDOW_START + 3599
+        assert storage.url("test.pdf") == first
+        assert mock_url.call_count == 1
+
+        # Other files get their own URLs
+        storage.url("other.pdf")
+        assert mock_url.call_count == 2
+
+        mock_url.side_effect = ["https://example.com/signed-url-3"]
+        mock_time.return_value = WINDOW_START + 3600
+        assert storage.url("test.pdf") == "https://example.com/signed-url-3"
+
     @mock.patch("storages.backends.s3boto3.S3Boto3Storage.url")
     def test_url_method_handles_errors(self, mock_url):
         """Test the URL method handles errors properly"""
@@ -86,6 +119,92 @@ class TestPrivateS3Storage:
             storage.url("test.pdf")
 
 
+class TestDirectUploads:
+    """Test the PrivateS3Storage methods supporting uploads straight to the bucket"""
+
+    @pytest.fixture(autouse=True)
+    def bucket_settings(self, settings):
+        settings.AWS_ACCESS_KEY_ID = "access-key"
+        settings.AWS_SECRET_ACCESS_KEY = "secret-key"
+        settings.AWS_STORAGE_BUCKET_NAME = "bucket"
+        settings.AWS_S3_ENDPOINT_URL = "https://r2.example.com"
+        settings.AWS_S3_REGION_NAME = "auto"
+
+    def test_get_upload_url_signs_content_type_and_length(self):
+        """Test that the upload URL is a PUT URL signed for the given type and size"""
+        storage = PrivateS3Storage()
+
+        url, headers = storage.get_upload_url("notes/1/2/test.pdf", "application/pdf", 1234, expire=60)
+
+        parts = urlsplit(url)
+        query = parse_qs(parts.query)
+        assert parts.path == "/bucket/files/notes/1/2/test.pdf"
+        assert query["X-Amz-Expires"] == ["60"]
+        assert query["X-Amz-SignedHeaders"] == ["content-length;content-type;host"]
+        # The browser sends the Content-Length header itself
+        assert headers == {"Content-Type": "application/pdf"}
+
+    def test_read_start_requests_a_range(self):
+        """Test that only the first bytes of the file are requested"""
+        storage = PrivateS3Storage()
+
+        with Stubber(storage.connection.meta.client) as stubber:
+            stubber.add_response(
+                "get_object",
+                {"Body": StreamingBody(io.BytesIO(b"%PDF"), 4)},
+                {"Bucket": "bucket", "Key": "files/test.pdf", "Range": "bytes=0-3"},
+            )
+
+            assert storage.read_start("test.pdf", 4) == b"%PDF"
+
+    def test_list_upload_parts_follows_pages(self):
+        """Test that all the parts of a multipart upload are listed, across pages"""
+        storage = PrivateS3Storage()
+        params = {"Bucket": "bucket", "Key": "files/test.pdf", "UploadId": "upload-id"}
+
+        with Stubber(storage.connection.meta.client) as stubber:
+            stubber.add_response(
+                "list_parts",
+                {"IsTruncated": True, "NextPartNumberMarker": 1, "Parts": [{"PartNumber": 1, "Size": 5, "ETag": "a"}]},
+                params,
+            )
+            stubber.add_response(
+                "list_parts",
+                {"IsTruncated": False, "Parts": [{"PartNumber": 2, "Size": 3, "ETag": "b"}]},
+                {**params, "PartNumberMarker": 1},
+            )
+
+            assert storage.list_upload_parts("test.pdf", "upload-id") == [
+                {"number": 1, "size": 5, "etag": "a"},
+                {"number": 2, "size": 3, "etag": "b"},
+            ]
+
+    def test_list_upload_parts_of_missing_upload(self):
+        """Test that listing the parts of an upload that doesn't exist raises FileNotFoundError"""
+        storage = PrivateS3Storage()
+
+        with Stubber(storage.connection.meta.client) as stubber:
+            stubber.add_client_error("list_parts", service_error_code="NoSuchUpload", http_status_code=404)
+
+            with pytest.raises(FileNotFoundError):
+                storage.list_upload_parts("test.pdf", "upload-id")
+
+    def test_api_calls_are_timed(self):
+        """Test that the API calls (including failed ones) are recorded in the request metrics"""
+        storage = PrivateS3Storage()
+
+        with Stubber(storage.connection.meta.client) as stubber, collect_metrics() as metrics:
+            stubber.add_response("get_object", {"Body": StreamingBody(io.BytesIO(b"%PDF"), 4)})
+            stubber.add_client_error("list_parts", service_error_code="NoSuchUpload", http_status_code=404)
+
+            storage.read_start("test.pdf", 4)
+            with pytest.raises(FileNotFoundError):
+                storage.list_upload_parts("test.pdf", "upload-id")
+
+        assert metrics.counts["storage"] == 2
+        assert metrics.durations["storage"] > 0
+
+
 class TestAccessControl:
     """Test file access control functionality"""
 
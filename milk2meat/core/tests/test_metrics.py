@@ -0,0 +1,110 @@
+from unittest import mock
+
+import pytest
+from django.core.cache import cache
+from django.urls import reverse
+from django_redis.cache import RedisCache
+
+from milk2meat.core.metrics import MetricsRecorder
+from milk2meat.core.utils.timing import RequestMetrics
+from milk2meat.users.factories import UserFactory
+
+
+def request_metrics(**counts):
+    metrics = RequestMetrics()
+    metrics.counts.update(counts)
+    return metrics
+
+
+class TestMetricsRecorder:
+    def test_processes_are_aggregated(self, settings):
+        """Test that the metrics recorded by each process are combined once flushed"""
+        settings.METRICS_FLUSH_INTERVAL = 60
+        worker1, worker2 = MetricsRecorder(), MetricsRecorder()
+
+        worker1.record_request("notes:note_list", 0.005, request_metrics(db=3, cache_hit=2))
+        worker2.record_request("notes:note_list", 0.3, request_metrics(db=4, cache_miss=1, signed_url=1))
+        worker2.record_request("core:global_search", 0.02, request_metrics(db=2, form_upload_bytes=100))
+
+        # The metrics are kept in memory until they're flushed
+        assert 'view="notes:note_list"' not in MetricsRecorder().render()
+
+        worker1.flush()
+        worker2.flush()
+        lines = MetricsRecorder().render().splitlines()
+
+        view = 'view="notes:note_list"'
+        assert f'milk2meat_request_duration_seconds_bucket{{{view},le="0.01"}} 1' in lines
+        assert f'milk2meat_request_duration_seconds_bucket{{{view},le="0.25"}} 1' in lines
+        assert f'milk2meat_request_duration_seconds_bucket{{{view},le="0.5"}} 2' in lines
+        assert f'milk2meat_request_duration_seconds_bucket{{{view},le="+Inf"}} 2' in lines
+        assert f"milk2meat_request_duration_seconds_sum{{{view}}} 0.305" in lines
+        assert f"milk2meat_request_duration_seconds_count{{{view}}} 2" in lines
+        assert f"milk2meat_db_queries_total{{{view}}} 7" in lines
+        assert 'milk2meat_db_queries_total{view="core:global_search"} 2' in lines
+        assert 'milk2meat_cache_requests_total{result="hit"} 2' in lines
+        assert 'milk2meat_cache_requests_total{result="miss"} 1' in lines
+        assert 'milk2meat_signed_urls_total{kind="download"} 1' in lines
+        assert 'milk2meat_upload_bytes_total{method="form"} 100' in lines
+        assert "# TYPE milk2meat_request_duration_seconds histogram" in lines
+
+    def test_redis_increments_are_pipelined(self, settings):
+        """Test that the counters are incremented in a single round trip to Redis"""
+        settings.METRICS_FLUSH_INTERVAL = 60
+        redis_cache = RedisCache("redis://localhost:6379/0", {"KEY_PREFIX": "test"})
+        recorder = MetricsRecorder()
+        recorder.record_request("notes:note_list", 0.1, request_metrics(db=3, cache_hit=1))
+
+        with (
+            mock.patch("milk2meat.core.metrics.cache", redis_cache),
+            mock.patch.object(redis_cache.client, "get_client") as get_client,
+            mock.patch.object(redis_cache, "get", return_value={"notes:note_list"}),
+        ):
+            recorder.flush()
+
+        pipeline = get_client.return_value.pipeline.return_value
+        assert pipeline.execute.call_count == 1
+        increments = {str(call.args[0]): call.args[1] for call in pipeline.incrby.call_args_list}
+        assert increments["test:1:metrics:queries:notes:note_list"] == 3
+        assert increments["test:1:metrics:cache_hit"] == 1
+        # Counters with nothing to add aren't sent
+        assert "test:1:metrics:cache_miss" not in increments
+
+    def test_flush_errors_are_ignored(self):
+        """Test that requests don't fail when the metrics can't be stored"""
+        recorder = MetricsRecorder()
+
+        with mock.patch.object(cache, "incr", side_effect=ConnectionError):
+            recorder.record_request("notes:note_list", 0.1, request_metrics(db=1))
+
+
+@pytest.mark.django_db
+class TestMetricsView:
+    def test_not_found_for_other_users(self, client):
+        """Test that the endpoint isn't visible to anonymous and non-staff users"""
+        assert client.get(reverse("core:metrics")).status_code == 404
+
+        client.force_login(UserFactory())
+        assert client.get(reverse("core:metrics")).status_code == 404
+
+    def test_token(self, client, settings):
+        """Test that the metrics can be read with the bearer token"""
+        settings.METRICS_TOKEN = "secret-token"
+
+        assert client.get(reverse("core:metrics"), HTTP_AUTHORIZATION="Bearer wrong").status_code == 404
+        response = client.get(reverse("core:metrics"), HTTP_AUTHORIZATION="Bearer secret-token")
+
+        assert response.status_code == 200
+        assert response["Content-Type"] == "text/plain; version=0.0.4; charset=utf-8"
+
+    def test_requests_are_recorded(self, client):
+        """Test that the requests served are exported, by URL name"""
+        client.force_login(UserFactory(is_staff=True))
+        client.get(reverse("notes:note_list"))
+
+        response = client.get(reverse("core:metrics"))
+
+        assert response.status_code == 200
+        content = response.content.decode()
+        assert 'milk2meat_request_duration_seconds_count{view="notes:note_list"} 1' in content
+        assert 'milk2meat_db_queries_total{view="notes:note_list"}' in content
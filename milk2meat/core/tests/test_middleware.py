@@ -0,0 +1,65 @@
+import logging
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+
+from milk2meat.notes.factories import NoteFactory
+from milk2meat.users.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+class TestServerTimingMiddleware:
+    def test_server_timing_header(self, client):
+        """Test that the request metrics are reported in the Server-Timing header (to staff)"""
+        user = UserFactory(is_staff=True)
+        client.force_login(user)
+        NoteFactory(owner=user, content="Some *markdown*")
+
+        response = client.get(reverse("notes:note_list"))
+
+        entries = {entry.split(";")[0]: entry for entry in response["Server-Timing"].split(", ")}
+        assert entries["total"].startswith("total;dur=")
+        assert entries["db"].startswith("db;dur=")
+        assert "cache" in entries
+
+    def test_no_server_timing_header_for_other_users(self, client, settings):
+        """Test that the timings aren't revealed to non-staff users, or to staff if disabled"""
+        client.force_login(UserFactory())
+        assert "Server-Timing" not in client.get(reverse("notes:note_list"))
+
+        settings.SERVER_TIMING_FOR_STAFF = False
+        client.force_login(UserFactory(is_staff=True))
+        assert "Server-Timing" not in client.get(reverse("notes:note_list"))
+
+    def test_server_timing_header_in_development(self, client, settings):
+        """Test that anyone gets the Server-Timing header with DEBUG on"""
+        settings.DEBUG = True
+        assert "Server-Timing" in client.get(reverse("auth:login"))
+
+    def test_metrics_are_logged(self, client, caplog):
+        """Test that the request metrics are logged as structured fields"""
+        with caplog.at_level(logging.INFO, logger="milk2meat.performance"):
+            client.get(reverse("auth:login"))
+
+        (record,) = caplog.records
+        assert record.method == "GET"
+        assert record.path == reverse("auth:login")
+        assert record.status == 200
+        assert record.duration_ms > 0
+        assert {"db_count", "db_ms", "markdown_ms", "storage_ms", "cache_hits", "cache_misses"} <= vars(record).keys()
+
+    def test_async_request(self, async_client, mocker):
+        """Test that the metrics of requests served over ASGI are reported too"""
+        user = UserFactory(is_staff=True)
+        async_client.force_login(user)
+        note = NoteFactory(owner=user, upload=SimpleUploadedFile("test.pdf", b"%PDF-1.4", "application/pdf"))
+        mocker.patch("milk2meat.notes.models.Note.get_secure_file_url", return_value="https://example.com/signed")
+
+        response = async_to_sync(async_client.get)(reverse("notes:serve_protected_file", kwargs={"note_id": note.pk}))
+
+        assert response.status_code == 200
+        assert "db;dur=" in response["Server-Timing"]
+        assert 'cache;desc="Cache (0 hits, 1 misses)"' in response["Server-Timing"]
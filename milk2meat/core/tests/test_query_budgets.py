@@ -0,0 +1,395 @@
+"""
+Query budget regression suite.
+
+Every view of the notes, bible, core and home apps is requested against a realistic dataset
+(thousands of notes, hundreds of tags, every book referenced), and must stay within a fixed
+number of database queries and a wall-clock ceiling. Query counts don't depend on how much
+data there is for well-behaved views, so any N+1 query pattern shows up as a budget overrun.
+
+Measuring seeds thousands of rows and checks wall-clock times, so it isn't part of the default
+test run: it's marked `query_budget`, and run with `inv query-budgets` (`pytest -m query_budget`).
+Only the check that every view has a budget runs by default.
+
+Set `QUERY_BUDGET_REPORT` to a file path to get a JSON report of the measurements, which can
+be diffed between releases (`inv query-budgets` writes it to query-budgets.json).
+"""
+
+import io
+import json
+import os
+import random
+import time
+import uuid
+
+import pytest
+from botocore.response import StreamingBody
+from botocore.stub import Stubber
+from django.contrib.contenttypes.models import ContentType
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLResolver, get_resolver, reverse
+from taggit.models import Tag
+
+from milk2meat.bible.models import Book, Testament
+from milk2meat.core.models import UUIDTaggedItem
+from milk2meat.core.utils.markdown import markdown_hash, parse_markdown
+from milk2meat.notes.factories import NoteFactory, NoteTypeFactory
+from milk2meat.notes.models import Note, UserTagStat, note_search_vector
+from milk2meat.notes.views.uploads import MULTIPART_TOKEN_SALT, UPLOAD_TOKEN_SALT
+from milk2meat.users.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+NOTE_COUNT = 2000
+TAG_COUNT = 300
+BOOK_COUNT = 66
+TAGS_PER_NOTE = 3
+BOOKS_PER_NOTE = 2
+
+# Namespaces of the apps whose views are measured (along with the project's own URLs, i.e. the home
+# and dashboard pages)
+MEASURED_NAMESPACES = {"core", "bible", "notes"}
+
+PDF_CONTENT = b"%PDF-1.5\n%\xff\xff\xff\xff\nStudy"
+
+NOTE_CONTENT = """## Observations
+
+The **word** of the Lord endures forever. See also *Isaiah 40:8*.
+
+- Grace
+- Faith
+- Hope
+"""
+
+# Expected status, maximum number of queries and maximum seconds per URL name (with a
+# description of the request when a view is measured more than once). The query counts
+# include the session and user lookups (2 queries), and are measured with warm caches.
+BUDGETS = {
+    "home": (200, 4, 1.0),
+    "dashboard": (200, 5, 1.0),
+    "core:global_search": (200, 7, 2.0),
+    "core:metrics": (200, 4, 1.0),
+    "bible:book_list": (200, 4, 1.0),
+    "bible:book_detail": (200, 5, 1.0),
+    "bible:book_edit": (200, 5, 1.0),
+    "bible:book_update_ajax": (200, 7, 1.0),
+    "notes:note_list": (200, 8, 1.0),
+    "notes:note_list (search)": (200, 9, 2.0),
+    "notes:note_create": (200, 7, 1.0),
+    "notes:note_detail": (200, 10, 1.0),
+    "notes:note_edit": (200, 11, 1.0),
+    "notes:note_delete": (302, 16, 1.0),
+    "notes:serve_protected_file": (200, 2, 1.0),
+    "notes:open_protected_file": (302, 2, 1.0),
+    "notes:note_list_json": (200, 7, 1.0),
+    "notes:note_create_ajax": (200, 27, 1.0),
+    "notes:note_update_ajax": (200, 16, 1.0),
+    "notes:note_autosave": (200, 5, 1.0),
+    "notes:note_upload_start": (200, 5, 1.0),
+    "notes:note_upload_finalize": (200, 6, 1.0),
+    "notes:note_multipart_create": (200, 5, 1.0),
+    "notes:note_multipart_list_parts": (200, 5, 1.0),
+    "notes:note_multipart_sign_parts": (200, 5, 1.0),
+    "notes:note_multipart_complete": (200, 6, 1.0),
+    "notes:note_multipart_abort": (200, 5, 1.0),
+    "notes:create_note_type_ajax": (200, 7, 1.0),
+    "notes:tag_list": (200, 6, 1.0),
+}
+
+
+def seed_dataset():
+    """
+    Create the dataset the views are measured against, with bulk inserts.
+
+    Returns:
+        dict: The objects the requests refer to
+    """
+    rng = random.Random(42)
+    user = UserFactory(is_staff=True)
+    other_user = UserFactory()
+    note_types = [NoteTypeFactory(name=f"Type {i}") for i in range(10)]
+
+    books = Book.objects.bulk_create(
+        Book(
+            title=f"Book {number}",
+            abbreviation=f"B{number}",
+            testament=Testament.OT if number <= 39 else Testament.NT,
+            number=number,
+            chapters=rng.randint(1, 150),
+            title_and_author=NOTE_CONTENT,
+            outline=NOTE_CONTENT,
+            timeline={"events": []},
+        )
+        for number in range(1, BOOK_COUNT + 1)
+    )
+    tags = Tag.objects.bulk_create(Tag(name=f"tag-{i}", slug=f"tag-{i}") for i in range(TAG_COUNT))
+
+    content_html, content_hash = parse_markdown(NOTE_CONTENT), markdown_hash(NOTE_CONTENT)
+    notes = Note.objects.bulk_create(
+        Note(
+            id=uuid.uuid4(),
+            owner=user if i % 10 else other_user,
+            title=f"Study {i}",
+            slug=f"study-{i}",
+            content=NOTE_CONTENT,
+            content_html=content_html,
+            content_hash=content_hash,
+            note_type=note_types[i % len(note_types)],
+        )
+        for i in range(NOTE_COUNT)
+    )
+
+    note_content_type = ContentType.objects.get_for_model(Note)
+    tagged_items, book_links, tag_counts = [], [], {}
+    for i, note in enumerate(notes):
+        for tag in rng.sample(tags, TAGS_PER_NOTE):
+            tagged_items.append(UUIDTaggedItem(content_type=note_content_type, object_id=note.pk, tag=tag))
+            tag_counts[note.owner_id, tag.pk] = tag_counts.get((note.owner_id, tag.pk), 0) + 1
+        # Every book is referenced
+        for offset in range(BOOKS_PER_NOTE):
+            book = books[(i * BOOKS_PER_NOTE + offset) % len(books)]
+            book_links.append(Note.referenced_books.through(note_id=note.pk, book_id=book.pk))
+    UUIDTaggedItem.objects.bulk_create(tagged_items)
+    Note.referenced_books.through.objects.bulk_create(book_links)
+    UserTagStat.objects.bulk_create(
+        UserTagStat(owner_id=owner_id, tag_id=tag_id, note_count=count)
+        for (owner_id, tag_id), count in tag_counts.items()
+    )
+    Note.objects.update(search_vector=note_search_vector(Note.SEARCH_CONFIG))
+    call_command("update_search_index", verbosity=0)
+
+    note = Note.objects.filter(owner=user).first()
+    note_with_file = NoteFactory(
+        owner=user,
+        note_type=note_types[0],
+        upload=SimpleUploadedFile("study.pdf", b"%PDF-1.4\nStudy", content_type="application/pdf"),
+    )
+    return {
+        "user": user,
+        "book": books[0],
+        "note": note,
+        "note_with_file": note_with_file,
+        "notes_to_delete": list(Note.objects.filter(owner=user).exclude(pk=note.pk)[1:3]),
+        "note_type": note_types[0],
+    }
+
+
+def url_names_to_measure():
+    """The names of the URLs to measure: those of the project, and of the measured apps"""
+    names = set()
+    for pattern in get_resolver().url_patterns:
+        if isinstance(pattern, URLResolver):
+            if pattern.namespace in MEASURED_NAMESPACES:
+                names.update(f"{pattern.namespace}:{p.name}" for p in pattern.url_patterns if p.name)
+        elif pattern.name:
+            names.add(pattern.name)
+    return names
+
+
+def requests_to_measure(data, bucket):
+    """
+    The requests to measure, by (budget) name.
+
+    Args:
+        data (dict): The objects created by `seed_dataset`
+        bucket (Stubber): Stubber of the S3 storage's client, for the direct upload views
+
+    Returns:
+        dict: Functions making the request with the given test client, by name
+    """
+    note, book = data["note"], data["book"]
+    note_with_file = data["note_with_file"]
+    notes_to_delete = iter(data["notes_to_delete"])
+    note_form = {
+        "title": note.title,
+        "note_type": data["note_type"].pk,
+        "content": NOTE_CONTENT,
+        "tags_input": "tag-1,tag-2",
+        "referenced_books_json": json.dumps([{"id": book.pk}]),
+    }
+    book_form = {
+        "title_and_author": NOTE_CONTENT,
+        "date_and_occasion": "",
+        "characteristics_and_themes": "",
+        "christ_in_book": "",
+        "outline": NOTE_CONTENT,
+        "timeline": json.dumps({"events": []}),
+    }
+    upload = {"filename": "study.pdf", "size": len(PDF_CONTENT), "content_type": "application/pdf"}
+    upload_name = f"notes/{note.owner_id}/{note.pk}/study.pdf"
+    upload_token = signing.dumps({"note": str(note.pk), "name": upload_name}, salt=UPLOAD_TOKEN_SALT)
+    multipart_token = signing.dumps(
+        {"note": str(note.pk), "name": upload_name, "upload_id": "upload-id", "size": len(PDF_CONTENT)},
+        salt=MULTIPART_TOKEN_SALT,
+    )
+    parts = {"Parts": [{"PartNumber": 1, "Size": len(PDF_CONTENT), "ETag": '"etag"'}], "IsTruncated": False}
+
+    def url(name, **kwargs):
+        return reverse(name.split(" ")[0], kwargs=kwargs)
+
+    def post_json(client, path, payload):
+        return client.post(path, json.dumps(payload), content_type="application/json")
+
+    def with_stubs(*stubs):
+        """
+        Queue the given storage responses before making the request.
+
+        The responses are (method, response) pairs, where the response is a dict, a function
+        returning it, or None for a "not found" error.
+        """
+
+        def decorator(make_request):
+            def wrapper(client):
+                for method, response in stubs:
+                    if response is None:
+                        bucket.add_client_error(method, http_status_code=404)
+                    else:
+                        bucket.add_response(method, response() if callable(response) else response)
+                return make_request(client)
+
+            return wrapper
+
+        return decorator
+
+    uploaded_file = [
+        ("head_object", {"ContentLength": len(PDF_CONTENT)}),
+        # A new body each time, as it's read
+        ("get_object", lambda: {"Body": StreamingBody(io.BytesIO(PDF_CONTENT), len(PDF_CONTENT))}),
+    ]
+
+    return {
+        "home": lambda client: client.get(url("home")),
+        "dashboard": lambda client: client.get(url("dashboard")),
+        "core:global_search": lambda client: client.get(url("core:global_search"), {"q": "study"}),
+        "core:metrics": lambda client: client.get(url("core:metrics")),
+        "bible:book_list": lambda client: client.get(url("bible:book_list")),
+        "bible:book_detail": lambda client: client.get(url("bible:book_detail", pk=book.pk)),
+        "bible:book_edit": lambda client: client.get(url("bible:book_edit", pk=book.pk)),
+        "bible:book_update_ajax": lambda client: client.post(
+            url("bible:book_update_ajax", pk=book.pk), book_form, HTTP_X_REQUESTED_WITH="XMLHttpRequest"
+        ),
+        "notes:note_list": lambda client: client.get(url("notes:note_list")),
+        "notes:note_list (search)": lambda client: client.get(url("notes:note_list"), {"q": "grace"}),
+        "notes:note_create": lambda client: client.get(url("notes:note_create")),
+        "notes:note_detail": lambda client: client.get(url("notes:note_detail", pk=note.pk)),
+        "notes:note_edit": lambda client: client.get(url("notes:note_edit", pk=note.pk)),
+        "notes:note_delete": lambda client: client.post(url("notes:note_delete", pk=next(notes_to_delete).pk)),
+        "notes:serve_protected_file": lambda client: client.get(
+            url("notes:serve_protected_file", note_id=note_with_file.pk)
+        ),
+        "notes:open_protected_file": lambda client: client.get(
+            url("notes:open_protected_file", note_id=note_with_file.pk)
+        ),
+        "notes:note_list_json": lambda client: client.get(url("notes:note_list_json")),
+        "notes:note_create_ajax": lambda client: client.post(
+            url("notes:note_create_ajax"), {**note_form, "title": "New study"}
+        ),
+        "notes:note_update_ajax": lambda client: client.post(url("notes:note_update_ajax", pk=note.pk), note_form),
+        "notes:note_autosave": lambda client: client.patch(
+            url("notes:note_autosave", pk=note.pk), json.dumps({"content": NOTE_CONTENT}), "application/json"
+        ),
+        # The files are uploaded straight to the (stubbed) bucket
+        "notes:note_upload_start": with_stubs(("head_object", None))(
+            lambda client: post_json(client, url("notes:note_upload_start", pk=note.pk), upload)
+        ),
+        "notes:note_upload_finalize": with_stubs(*uploaded_file)(
+            lambda client: post_json(client, url("notes:note_upload_finalize", pk=note.pk), {"token": upload_token})
+        ),
+        "notes:note_multipart_create": with_stubs(
+            ("head_object", None), ("create_multipart_upload", {"UploadId": "upload-id"})
+        )(lambda client: post_json(client, url("notes:note_multipart_create", pk=note.pk), upload)),
+        "notes:note_multipart_list_parts": with_stubs(("list_parts", parts))(
+            lambda client: client.get(url("notes:note_multipart_list_parts", pk=note.pk), {"token": multipart_token})
+        ),
+        "notes:note_multipart_sign_parts": lambda client: post_json(
+            client,
+            url("notes:note_multipart_sign_parts", pk=note.pk),
+            {"token": multipart_token, "part_numbers": [1]},
+        ),
+        "notes:note_multipart_complete": with_stubs(
+            ("list_parts", parts), ("complete_multipart_upload", {}), *uploaded_file
+        )(
+            lambda client: post_json(
+                client, url("notes:note_multipart_complete", pk=note.pk), {"token": multipart_token}
+            )
+        ),
+        "notes:note_multipart_abort": with_stubs(("abort_multipart_upload", {}))(
+            lambda client: post_json(client, url("notes:note_multipart_abort", pk=note.pk), {"token": multipart_token})
+        ),
+        "notes:create_note_type_ajax": lambda client: client.post(
+            url("notes:create_note_type_ajax"), {"name": f"Type {uuid.uuid4().hex}", "description": ""}
+        ),
+        "notes:tag_list": lambda client: client.get(url("notes:tag_list")),
+    }
+
+
+@pytest.fixture
+def bucket(settings):
+    """Use the S3 storage, returning a Stubber for its client"""
+    settings.STORAGES = {**settings.STORAGES, "default": {"BACKEND": "milk2meat.core.storage.PrivateS3Storage"}}
+    settings.AWS_ACCESS_KEY_ID = "access-key"
+    settings.AWS_SECRET_ACCESS_KEY = "secret-key"
+    settings.AWS_STORAGE_BUCKET_NAME = "bucket"
+    settings.AWS_S3_ENDPOINT_URL = "https://r2.example.com"
+    settings.AWS_S3_REGION_NAME = "auto"
+
+    with Stubber(default_storage.connection.meta.client) as stubber:
+        yield stubber
+        stubber.assert_no_pending_responses()
+
+
+def test_budgets_cover_every_view():
+    """Test that every URL of the measured apps has a budget"""
+    assert {name.split(" ")[0] for name in BUDGETS} == url_names_to_measure()
+
+
+@pytest.mark.query_budget
+def test_query_budgets(client, request):
+    """Test that every view stays within its query budget and time ceiling"""
+    data = seed_dataset()
+    # The files of the seeded notes are saved to the file system: only then is the bucket stubbed
+    bucket = request.getfixturevalue("bucket")
+    client.force_login(data["user"])
+    requests = requests_to_measure(data, bucket)
+    assert set(requests) == set(BUDGETS)
+
+    report, failures = {}, []
+    for name, make_request in requests.items():
+        # Warm up the caches (reference data, rendered markdown, signed URLs...)
+        make_request(client)
+
+        start = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            response = make_request(client)
+        seconds = time.perf_counter() - start
+
+        status, max_queries, max_seconds = BUDGETS[name]
+        report[name] = {
+            "status": response.status_code,
+            "queries": len(queries),
+            "query_budget": max_queries,
+            "seconds": round(seconds, 3),
+            "time_ceiling": max_seconds,
+        }
+        if response.status_code != status:
+            failures.append(f"{name}: status {response.status_code} (expected: {status})")
+        if len(queries) > max_queries:
+            failures.append(f"{name}: {len(queries)} queries (budget: {max_queries})")
+        if seconds > max_seconds:
+            failures.append(f"{name}: {seconds:.3f}s (ceiling: {max_seconds}s)")
+
+    if path := os.environ.get("QUERY_BUDGET_REPORT"):
+        with open(path, "w") as f:
+            json.dump(
+                {"dataset": {"notes": NOTE_COUNT, "tags": TAG_COUNT, "books": BOOK_COUNT}, "views": report},
+                f,
+                indent=2,
+                sort_keys=True,
+            )
+            f.write("\n")
+
+    assert not failures, "\n".join(failures)
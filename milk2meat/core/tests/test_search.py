@@ -0,0 +1,46 @@
+import pytest
+from django.db import connection
+
+from milk2meat.bible.factories import BookFactory
+from milk2meat.core.search import search_for_user
+from milk2meat.notes.factories import NoteFactory
+from milk2meat.users.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def get_entry_owner_id(obj):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT owner_id FROM watson_searchentry WHERE object_id = %s", [str(obj.pk)])
+        return cursor.fetchone()[0]
+
+
+class TestOwnerScopedSearch:
+    def test_owner_is_indexed(self):
+        """Test that note entries record their owner, and book entries have none"""
+        note = NoteFactory(title="Covenant")
+        book = BookFactory(title="Genesis")
+
+        assert get_entry_owner_id(note) == note.owner_id
+        assert get_entry_owner_id(book) is None
+
+    def test_owner_is_updated(self):
+        """Test that the owner column follows the note when it changes hands"""
+        note = NoteFactory(title="Covenant")
+        new_owner = UserFactory()
+
+        note.owner = new_owner
+        note.save()
+
+        assert get_entry_owner_id(note) == new_owner.pk
+
+    def test_search_for_user(self):
+        """Test that search results include the user's notes and books, but not other users' notes"""
+        user = UserFactory()
+        own_note = NoteFactory(title="Covenant of grace", owner=user)
+        NoteFactory(title="Covenant of works")
+        book = BookFactory(title="Covenant Book", title_and_author="The covenant")
+
+        results = {entry.object for entry in search_for_user("covenant", user)}
+
+        assert results == {own_note, book}
@@ -1,4 +1,6 @@
 import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from milk2meat.bible.factories import BookFactory
@@ -206,3 +208,27 @@ class TestGlobalSearchView:
         assert response.status_code == 200
         assert response.context["page_obj"].number == 2
         assert len(response.context["search_results"]) == 5  # Second page has 5 results
+
+    def test_search_query_count_is_constant(self, client):
+        """Test that rendering results doesn't run a query per result"""
+        user = UserFactory()
+        client.force_login(user)
+        note_type = NoteTypeFactory(name="Sermon")
+
+        NoteFactory(title="Covenant Note", content="The covenant.", owner=user, note_type=note_type)
+        BookFactory(title="Covenant Book", title_and_author="The covenant book")
+
+        url = reverse("core:global_search") + "?q=covenant"
+        with CaptureQueriesContext(connection) as few_results:
+            response = client.get(url)
+        assert len(response.context["search_results"]) == 2
+
+        for i in range(10):
+            NoteFactory(title=f"Covenant Note {i}", content="The covenant.", owner=user, note_type=note_type)
+
+        with CaptureQueriesContext(connection) as many_results:
+            response = client.get(url)
+        assert len(response.context["search_results"]) == 12
+
+        assert len(many_results) == len(few_results)
+        assert "Sermon" in response.content.decode()
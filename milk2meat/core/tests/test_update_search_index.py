@@ -0,0 +1,107 @@
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from watson.models import SearchEntry
+
+from milk2meat.bible.factories import BookFactory
+from milk2meat.bible.models import Book
+from milk2meat.core.management.commands.update_search_index import get_stale_queryset
+from milk2meat.notes.factories import NoteFactory, NoteTypeFactory
+from milk2meat.notes.models import Note
+
+pytestmark = pytest.mark.django_db
+
+
+def mark_entries_stale(obj):
+    """Make the object's search entry look older than the object"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "UPDATE watson_searchentry SET indexed_at = indexed_at - interval '1 day' WHERE object_id = %s",
+            [str(obj.pk)],
+        )
+
+
+class TestUpdateSearchIndexCommand:
+    """Test the update_search_index management command."""
+
+    def test_entries_are_current_after_save(self):
+        """Test that saving an object (which updates its entry) doesn't leave it stale"""
+        note = NoteFactory()
+        book = BookFactory()
+
+        assert not get_stale_queryset(Note).filter(pk=note.pk).exists()
+        assert not get_stale_queryset(Book).filter(pk=book.pk).exists()
+
+    def test_command_indexes_stale_and_missing_objects(self, capsys):
+        """Test the command only re-indexes objects with a missing or outdated entry."""
+        NoteFactory()
+        stale = NoteFactory(title="Old title")
+        missing = BookFactory(title="Unindexed")
+        mark_entries_stale(stale)
+        Note.objects.filter(pk=stale.pk).update(title="New title")
+        SearchEntry.objects.filter(object_id=str(missing.pk)).delete()
+
+        call_command("update_search_index", "--batch-size=1")
+
+        assert SearchEntry.objects.get(object_id=str(stale.pk)).title == "New title"
+        assert SearchEntry.objects.get(object_id=str(missing.pk)).title == "Unindexed"
+        assert not get_stale_queryset(Note).exists()
+        assert not get_stale_queryset(Book).exists()
+
+        captured = capsys.readouterr()
+        assert "Indexing 2 object(s) in 2 batch(es)" in captured.out
+        assert "Indexed 2 object(s)" in captured.out
+
+    def test_command_fills_batches_with_several_owners(self, capsys):
+        """Test that stale objects are batched together across owners, not in a batch per owner"""
+        notes = [NoteFactory() for _ in range(3)]
+        for note in notes:
+            mark_entries_stale(note)
+
+        call_command("update_search_index", "--batch-size=2")
+
+        assert "Indexing 3 object(s) in 2 batch(es)" in capsys.readouterr().out
+
+    def test_renamed_note_type_is_reindexed(self):
+        """Test that the notes of a renamed type (stored in their entries) are re-indexed"""
+        note_type = NoteTypeFactory(name="Sermon")
+        note = NoteFactory(note_type=note_type)
+        other = NoteFactory()
+
+        note_type.name = "Homily"
+        note_type.save()
+
+        assert list(get_stale_queryset(Note)) == [note]
+        call_command("update_search_index")
+        assert SearchEntry.objects.get(object_id=str(note.pk)).meta["note_type__name"] == "Homily"
+        assert not get_stale_queryset(Note).filter(pk=other.pk).exists()
+
+    def test_command_removes_deleted_objects(self):
+        """Test the command removes entries of objects that no longer exist."""
+        note = NoteFactory()
+        SearchEntry.objects.filter(object_id=str(note.pk)).update(object_id="00000000-0000-0000-0000-000000000000")
+
+        call_command("update_search_index")
+
+        assert not SearchEntry.objects.filter(object_id="00000000-0000-0000-0000-000000000000").exists()
+        assert SearchEntry.objects.filter(object_id=str(note.pk)).count() == 1
+
+    def test_command_up_to_date(self, capsys):
+        """Test the command does nothing when the index is current."""
+        NoteFactory()
+
+        call_command("update_search_index")
+
+        captured = capsys.readouterr()
+        assert "Search index is up to date" in captured.out
+
+    def test_command_full(self, capsys):
+        """Test --full re-indexes every object, keeping the stored meta (e.g. the owner)."""
+        note = NoteFactory()
+        BookFactory()
+
+        call_command("update_search_index", "--full")
+
+        captured = capsys.readouterr()
+        assert "Indexed 2 object(s)" in captured.out
+        assert SearchEntry.objects.get(object_id=str(note.pk)).meta["owner_id"] == note.owner_id
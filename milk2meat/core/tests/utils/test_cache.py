@@ -0,0 +1,110 @@
+import pytest
+from django.core.cache import cache
+
+from milk2meat.bible.factories import BookFactory
+from milk2meat.bible.models import Book
+from milk2meat.core.reference_data import get_books, get_note_types
+from milk2meat.core.utils.cache import REFERENCE_DATA_TIMEOUT, ReferenceCache
+from milk2meat.notes.factories import NoteTypeFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def load_books():
+    return list(Book.objects.all())
+
+
+class TestReferenceCache:
+    def test_get_is_cached(self, django_assert_num_queries):
+        """Test that the data is only loaded from the database once"""
+        BookFactory(title="Genesis")
+        books_cache = ReferenceCache("test_books", load_books)
+
+        with django_assert_num_queries(1):
+            assert [book.title for book in books_cache.get()] == ["Genesis"]
+        with django_assert_num_queries(0):
+            assert [book.title for book in books_cache.get()] == ["Genesis"]
+
+    def test_process_local_copy(self, mocker):
+        """Test that repeated reads are served from the process's copy"""
+        books_cache = ReferenceCache("test_books", load_books)
+        books = books_cache.get()
+
+        mock_get = mocker.patch("milk2meat.core.utils.cache.cache.get", return_value=books_cache._local[0])
+        assert books_cache.get() is books
+        mock_get.assert_called_once_with(books_cache.version_key)
+
+    def test_invalidate_reaches_other_processes(self, django_assert_num_queries):
+        """Test that invalidating in one process makes the others reload (from the shared cache)"""
+        # Two instances with the same name stand in for two worker processes
+        worker1 = ReferenceCache("test_books", load_books)
+        worker2 = ReferenceCache("test_books", load_books)
+        BookFactory(title="Genesis")
+        worker1.get()
+        worker2.get()
+
+        BookFactory(title="Exodus", number=2)
+        worker1.invalidate()
+
+        with django_assert_num_queries(1):
+            assert len(worker2.get()) == 2
+        # The first worker gets the data loaded by the second one
+        with django_assert_num_queries(0):
+            assert len(worker1.get()) == 2
+
+    def test_invalidate_after_commit(self, django_capture_on_commit_callbacks):
+        """Test that the version is bumped again once the transaction commits"""
+        books_cache = ReferenceCache("test_books", load_books)
+        books_cache.get()
+
+        with django_capture_on_commit_callbacks() as callbacks:
+            books_cache.invalidate()
+        version = books_cache.get() and books_cache._local[0]
+
+        for callback in callbacks:
+            callback()
+        books_cache.get()
+        assert books_cache._local[0] != version
+
+    def test_invalidate_deletes_previous_data(self, django_capture_on_commit_callbacks):
+        """Test that the data of the previous versions doesn't stay in the shared cache"""
+        books_cache = ReferenceCache("test_books", load_books)
+        books_cache.get()
+        first_key = books_cache._data_key(books_cache._local[0])
+
+        with django_capture_on_commit_callbacks(execute=True):
+            books_cache.invalidate()
+            books_cache.get()
+            second_key = books_cache._data_key(books_cache._local[0])
+
+        assert cache.get(first_key) is None
+        assert cache.get(second_key) is None
+
+    def test_data_expires(self, mocker):
+        """Test that the data is stored with a finite timeout"""
+        books_cache = ReferenceCache("test_books", load_books)
+        mock_set = mocker.patch("milk2meat.core.utils.cache.cache.set")
+        books_cache.get()
+
+        mock_set.assert_called_once_with(mocker.ANY, [], REFERENCE_DATA_TIMEOUT)
+
+
+class TestReferenceData:
+    def test_books_are_invalidated_on_save(self):
+        """Test that saving or deleting a book refreshes the cached books"""
+        genesis = BookFactory(title="Genesis")
+        assert [book.title for book in get_books()] == ["Genesis"]
+
+        genesis.title = "Bereshit"
+        genesis.save()
+        assert [book.title for book in get_books()] == ["Bereshit"]
+
+        genesis.delete()
+        assert get_books() == []
+
+    def test_note_types_are_invalidated_on_save(self):
+        """Test that creating a note type refreshes the cached note types"""
+        assert get_note_types() == []
+
+        NoteTypeFactory(name="Sermon")
+        assert [note_type.name for note_type in get_note_types()] == ["Sermon"]
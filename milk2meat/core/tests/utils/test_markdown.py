@@ -1,4 +1,10 @@
-from milk2meat.core.utils.markdown import parse_markdown
+import threading
+
+from milk2meat.core.utils.markdown import (
+    get_markdown_engine,
+    parse_markdown,
+    parse_markdown_cached,
+)
 
 
 class TestMarkdownUtils:
@@ -114,3 +120,39 @@ class TestMarkdownUtils:
         assert "Incomplete task" in html
         # The exact HTML will depend on the pymdownx.tasklist extension config
         # but should at minimum contain the text
+
+    def test_engine_is_reused(self):
+        """Test that the same Markdown instance is reused within a thread"""
+        assert get_markdown_engine() is get_markdown_engine()
+
+    def test_engine_is_per_thread(self):
+        """Test that each thread gets its own Markdown instance"""
+        engines = []
+        thread = threading.Thread(target=lambda: engines.append(get_markdown_engine()))
+        thread.start()
+        thread.join()
+
+        assert engines[0] is not get_markdown_engine()
+
+    def test_engine_is_reset_between_uses(self):
+        """Test that no per-document state leaks into the next conversion"""
+        markdown = "Some <span>inline html</span>\n\n```python\nx = 1\n```"
+        first = parse_markdown(markdown)
+
+        engine = get_markdown_engine()
+        assert engine.htmlStash.html_counter == 0
+        assert engine.htmlStash.rawHtmlBlocks == []
+
+        assert parse_markdown(markdown) == first
+
+    def test_parse_markdown_cached(self, mocker):
+        """Test that rendered markdown is cached by content"""
+        parse_spy = mocker.patch(
+            "milk2meat.core.utils.markdown.parse_markdown", side_effect=parse_markdown, autospec=True
+        )
+        markdown = "Cached *markdown* for test_parse_markdown_cached"
+
+        assert parse_markdown_cached(markdown) == parse_markdown(markdown)
+        assert parse_markdown_cached(markdown) == parse_markdown(markdown)
+        assert parse_spy.call_count == 1
+        assert parse_markdown_cached("") == ""
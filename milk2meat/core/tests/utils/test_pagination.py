@@ -0,0 +1,72 @@
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+
+from milk2meat.core.utils.pagination import CursorPaginator, InvalidCursor
+from milk2meat.notes.factories import NoteFactory
+from milk2meat.notes.models import Note
+from milk2meat.users.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+ORDERING = ["-updated_at", "-created_at", "-id"]
+
+
+@pytest.fixture
+def notes():
+    """Seven notes, newest first, with some sharing the same `updated_at` (to exercise tie-breaking)"""
+    owner = UserFactory()
+    now = timezone.now()
+    notes = NoteFactory.create_batch(7, owner=owner)
+    for i, note in enumerate(notes):
+        Note.objects.filter(pk=note.pk).update(updated_at=now - timedelta(minutes=i // 2))
+    return list(Note.objects.filter(owner=owner).order_by(*ORDERING))
+
+
+class TestCursorPaginator:
+    def test_first_page(self, notes):
+        """Test the first page has no previous page"""
+        page = CursorPaginator(Note.objects.all(), 3, ORDERING).page()
+
+        assert list(page) == notes[:3]
+        assert page.has_next()
+        assert not page.has_previous()
+
+    def test_walk_forward_and_back(self, notes):
+        """Test following the cursors visits every note once, in order, in both directions"""
+        paginator = CursorPaginator(Note.objects.all(), 3, ORDERING)
+
+        pages = [paginator.page()]
+        while pages[-1].has_next():
+            pages.append(paginator.page(pages[-1].next_cursor))
+        assert [list(page) for page in pages] == [notes[:3], notes[3:6], notes[6:]]
+        assert pages[-1].has_previous()
+
+        previous = paginator.page(pages[-1].previous_cursor)
+        assert list(previous) == notes[3:6]
+        previous = paginator.page(previous.previous_cursor)
+        assert list(previous) == notes[:3]
+        assert not previous.has_previous()
+        assert previous.has_next()
+
+    def test_single_page(self, notes):
+        """Test a page holding all the results has no other pages"""
+        page = CursorPaginator(Note.objects.all(), 10, ORDERING).page()
+
+        assert list(page) == notes
+        assert not page.has_other_pages()
+
+    def test_cursor_is_opaque(self, notes):
+        """Test cursors are URL-safe tokens"""
+        page = CursorPaginator(Note.objects.all(), 3, ORDERING).page()
+
+        assert page.next_cursor.replace("-", "").replace("_", "").isalnum()
+
+    @pytest.mark.parametrize("cursor", ["not-a-cursor", "eyJ2IjpbXSwiciI6ZmFsc2V9", "eyJ2IjpbMSwyLDNdLCJyIjpmYWxzZX0"])
+    def test_invalid_cursor(self, cursor):
+        """Test malformed cursors (or ones for a different ordering) are rejected"""
+        paginator = CursorPaginator(Note.objects.all(), 3, ORDERING)
+
+        with pytest.raises(InvalidCursor):
+            paginator.page(cursor)
@@ -0,0 +1,33 @@
+import pytest
+
+from milk2meat.core.utils.text import apply_text_delta
+
+
+class TestApplyTextDelta:
+    def test_apply_text_delta(self):
+        """Test that edits are applied in turn"""
+        text = "Blessed are the poor"
+        delta = [[16, 20, "meek"], [20, 20, ", for they shall inherit the earth"], [0, 0, "> "]]
+        assert apply_text_delta(text, delta) == "> Blessed are the meek, for they shall inherit the earth"
+
+    def test_empty_delta(self):
+        """Test that an empty delta leaves the text unchanged"""
+        assert apply_text_delta("Amen", []) == "Amen"
+
+    @pytest.mark.parametrize(
+        "delta",
+        [
+            {"start": 0},
+            [[0, 1]],
+            [["0", 1, "x"]],
+            [[0, True, "x"]],
+            [[0, 1, None]],
+            [[2, 1, "x"]],
+            [[0, 5, "x"]],
+            [[-1, 0, "x"]],
+        ],
+    )
+    def test_invalid_delta(self, delta):
+        """Test that malformed or out of range deltas are rejected"""
+        with pytest.raises(ValueError):
+            apply_text_delta("Amen", delta)
@@ -0,0 +1,51 @@
+import pytest
+from django.contrib.auth import get_user_model
+
+from milk2meat.core.search import search_for_user
+from milk2meat.core.utils.markdown import parse_markdown_cached
+from milk2meat.core.utils.timing import collect_metrics, get_current_metrics, record_cache_lookup, timed
+from milk2meat.users.factories import UserFactory
+
+User = get_user_model()
+
+
+class TestTiming:
+    def test_timed_records_duration(self):
+        """Test that timed blocks add to the current metrics"""
+        with collect_metrics() as metrics:
+            with timed("markdown"):
+                pass
+            with timed("markdown"):
+                pass
+
+        assert metrics.counts["markdown"] == 2
+        assert metrics.durations["markdown"] > 0
+
+    def test_noop_outside_a_request(self):
+        """Test that hooks can be used when no metrics are collected"""
+        assert get_current_metrics() is None
+        with timed("markdown"):
+            record_cache_lookup(True)
+
+    def test_markdown_and_cache_lookups(self):
+        """Test that markdown rendering and its cache lookups are recorded"""
+        with collect_metrics() as metrics:
+            parse_markdown_cached("Some *markdown*")
+            parse_markdown_cached("Some *markdown*")
+
+        assert metrics.counts["markdown"] == 1
+        assert metrics.counts["cache_miss"] == 1
+        assert metrics.counts["cache_hit"] == 1
+
+    @pytest.mark.django_db
+    def test_queries(self):
+        """Test that queries are timed, with the search index queries also recorded separately"""
+        user = UserFactory()
+
+        with collect_metrics() as metrics:
+            User.objects.filter(pk=user.pk).exists()
+            list(search_for_user("grace", user))
+
+        assert metrics.counts["db"] >= 2
+        assert metrics.counts["search"] == 1
+        assert metrics.durations["db"] >= metrics.durations["search"] > 0
@@ -0,0 +1,73 @@
+import os
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.test import RequestFactory
+
+from milk2meat.core.utils.uploads import RejectedUpload, ValidatingUploadHandler
+
+PDF_CONTENT = b"%PDF-1.5\n%\xff\xff\xff\xff\n" + b"test pdf content\n" * 10_000  # ~170KB
+
+
+class SmallUploadHandler(ValidatingUploadHandler):
+    max_size = 100 * 1024
+
+
+def upload(content, name="notes.pdf", handler_class=ValidatingUploadHandler):
+    """Post a file (followed by another field) and parse the request with the given handler"""
+    request = RequestFactory().post(
+        "/", {"upload": SimpleUploadedFile(name, content, content_type="application/pdf"), "title": "Notes"}
+    )
+    request.upload_handlers = [handler_class(request)]
+    return request
+
+
+class TestValidatingUploadHandler:
+    def test_valid_upload(self):
+        """Test that allowed files are streamed to a temporary file"""
+        request = upload(PDF_CONTENT)
+
+        uploaded = request.FILES["upload"]
+        assert isinstance(uploaded, TemporaryUploadedFile)
+        assert uploaded.size == len(PDF_CONTENT)
+        assert uploaded.read() == PDF_CONTENT
+
+    def test_disallowed_type_is_rejected(self, mocker):
+        """Test that files of a disallowed type are rejected from their first chunk"""
+        request = upload(b"#!/bin/sh\necho 'not a document'\n" * 10_000, name="notes.pdf")
+        store_chunk = mocker.spy(TemporaryFileUploadHandler, "receive_data_chunk")
+
+        uploaded = request.FILES["upload"]
+        assert isinstance(uploaded, RejectedUpload)
+        assert "is not allowed" in uploaded.error
+        store_chunk.assert_not_called()
+        # The rest of the request is still parsed
+        assert request.POST["title"] == "Notes"
+
+    def test_oversized_file_is_rejected(self):
+        """Test that files are rejected once they grow over the size limit"""
+        request = upload(PDF_CONTENT, handler_class=SmallUploadHandler)
+
+        uploaded = request.FILES["upload"]
+        assert isinstance(uploaded, RejectedUpload)
+        assert uploaded.error.startswith("File too large.")
+        assert request.POST["title"] == "Notes"
+
+    def test_rejected_file_is_deleted(self, mocker):
+        """Test that the temporary file of a rejected upload is removed"""
+        new_file = mocker.spy(SmallUploadHandler, "new_file")
+        request = upload(PDF_CONTENT, handler_class=SmallUploadHandler)
+
+        assert isinstance(request.FILES["upload"], RejectedUpload)
+        handler = new_file.call_args.args[0]
+        assert not os.path.exists(handler.file.temporary_file_path())
+
+    def test_rejected_upload_has_no_content(self):
+        """Test that a rejected upload can't be read (or saved)"""
+        rejected = RejectedUpload("notes.pdf", "application/pdf", 1024, None, "File too large.")
+
+        with pytest.raises(ValueError):
+            rejected.open()
+        with pytest.raises(ValueError):
+            list(rejected.chunks())
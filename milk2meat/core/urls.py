@@ -7,4 +7,6 @@ app_name = "core"
 urlpatterns = [
     # Search
     path("search/", views.GlobalSearchView.as_view(), name="global_search"),
+    # Metrics (for Prometheus)
+    path("metrics", views.metrics_view, name="metrics"),
 ]
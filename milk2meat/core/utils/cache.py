@@ -0,0 +1,80 @@
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+
+from milk2meat.core.utils.timing import record_cache_lookup
+
+# How long the data of a version is kept in the shared cache. It's reloaded when it expires,
+# and data stored for a version that's no longer current doesn't linger.
+REFERENCE_DATA_TIMEOUT = 60 * 60 * 24
+
+
+class ReferenceCache:
+    """
+    Two-level read-through cache for small, rarely changing reference data (e.g. the Bible books).
+
+    Each process keeps the data in memory (L1), tagged with the version it was loaded at. The
+    current version lives in the shared cache (L2, i.e. Redis in production), next to the data
+    for that version. Reads check the version (a single cache lookup) and only reload when it
+    changed, from the shared cache if another process already did the database query.
+
+    Invalidating bumps the version, so every process picks up the change on its next read, and
+    deletes the data of the previous version.
+    """
+
+    def __init__(self, name, loader):
+        """
+        Args:
+            name (str): Cache key prefix
+            loader: Callable returning the data, e.g. `lambda: list(Book.objects.all())`
+        """
+        self.name = name
+        self.loader = loader
+        self.version_key = f"reference:{name}:version"
+        self._local = None  # (version, data)
+
+    def get(self):
+        """Get the data, loading it if it changed since this process last read it"""
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, uuid.uuid4().hex, None)
+            version = cache.get(self.version_key)
+
+        local = self._local
+        if local is not None and local[0] == version:
+            record_cache_lookup(True)
+            return local[1]
+
+        data_key = self._data_key(version)
+        data = cache.get(data_key)
+        record_cache_lookup(data is not None)
+        if data is None:
+            data = self.loader()
+            cache.set(data_key, data, REFERENCE_DATA_TIMEOUT)
+
+        self._local = (version, data)
+        return data
+
+    def invalidate(self):
+        """
+        Bump the version, so that all processes reload the data.
+
+        The version is bumped again once the current transaction commits: a process reading
+        in between could otherwise cache the data as it was before the commit.
+        """
+        self._bump()
+        transaction.on_commit(self._bump)
+
+    def clear(self):
+        """Forget this process's copy (e.g. between tests)"""
+        self._local = None
+
+    def _data_key(self, version):
+        return f"reference:{self.name}:{version}"
+
+    def _bump(self):
+        previous = cache.get(self.version_key)
+        cache.set(self.version_key, uuid.uuid4().hex, None)
+        if previous is not None:
+            cache.delete(self._data_key(previous))
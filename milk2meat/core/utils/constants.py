@@ -18,3 +18,6 @@ ALLOWED_DOCUMENT_TYPES = [
     "application/vnd.openxmlformats-officedocument.presentationml.presentation",
     "application/vnd.oasis.opendocument.presentation",
 ]
+
+# Maximum size of uploaded files (in bytes)
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024
@@ -1,7 +1,74 @@
+import hashlib
+import threading
+
 import markdown
 import nh3
+from django.conf import settings
+from django.core.cache import cache
+
+from milk2meat.core.utils.timing import record_cache_lookup, timed
+
+# Markdown extensions used to render user content
+MARKDOWN_EXTENSIONS = [
+    "smarty",
+    "tables",
+    "toc",
+    "pymdownx.betterem",
+    "pymdownx.caret",
+    "pymdownx.keys",
+    "pymdownx.magiclink",
+    "pymdownx.mark",
+    "pymdownx.smartsymbols",
+    "pymdownx.superfences",
+    "pymdownx.tasklist",
+    "pymdownx.tilde",
+]
+
+# Identifies the renderer configuration. Any change to the extension list (or an upgrade
+# of markdown / nh3) yields a new version, which invalidates previously stored HTML.
+RENDERER_VERSION = hashlib.sha256(
+    ":".join([markdown.__version__, nh3.__version__, *MARKDOWN_EXTENSIONS]).encode()
+).hexdigest()[:12]
+
+
+# Markdown instances aren't thread-safe, so each thread gets its own pre-configured instance
+# (extensions are loaded once per thread rather than on every call)
+_local = threading.local()
+
+# The sanitizer (and its allowlists) is immutable and can be shared
+_cleaner = nh3.Cleaner()
+
+
+def get_markdown_engine():
+    """
+    Get the Markdown instance for the current thread, creating it on first use.
+
+    Returns:
+        markdown.Markdown: Markdown instance configured with MARKDOWN_EXTENSIONS
+    """
+    engine = getattr(_local, "engine", None)
+    if engine is None:
+        engine = _local.engine = markdown.Markdown(extensions=MARKDOWN_EXTENSIONS)
+    return engine
+
+
+def markdown_hash(text):
+    """
+    Compute a hash identifying the rendered output of the given markdown text.
+
+    The hash covers both the text and the renderer configuration, so stored HTML can be
+    considered current whenever its hash matches.
+
+    Args:
+        text (str): Markdown text
 
+    Returns:
+        str: Hex digest (64 characters)
+    """
+    return hashlib.sha256(f"{RENDERER_VERSION}:{text or ''}".encode()).hexdigest()
 
+
+@timed("markdown")
 def parse_markdown(text):
     """
     Parse markdown text and return sanitized HTML.
@@ -15,26 +82,39 @@ def parse_markdown(text):
     if not text:
         return ""
 
-    # Configure markdown extensions
-    extensions = [
-        "smarty",
-        "tables",
-        "toc",
-        "pymdownx.betterem",
-        "pymdownx.caret",
-        "pymdownx.keys",
-        "pymdownx.magiclink",
-        "pymdownx.mark",
-        "pymdownx.smartsymbols",
-        "pymdownx.superfences",
-        "pymdownx.tasklist",
-        "pymdownx.tilde",
-    ]
-
-    # Convert markdown to HTML
-    html = markdown.markdown(text, extensions=extensions)
+    # Convert markdown to HTML, resetting the engine's per-document state afterwards
+    engine = get_markdown_engine()
+    try:
+        html = engine.convert(text)
+    finally:
+        engine.reset()
 
     # Sanitize HTML
-    sanitized_html = nh3.clean(html)
+    sanitized_html = _cleaner.clean(html)
 
     return sanitized_html
+
+
+def parse_markdown_cached(text):
+    """
+    Parse markdown text and return sanitized HTML, using the cache when possible.
+
+    Entries are keyed on the content hash (which covers the renderer configuration),
+    so they never need to be invalidated.
+
+    Args:
+        text (str): Markdown text to parse
+
+    Returns:
+        str: Sanitized HTML
+    """
+    if not text:
+        return ""
+
+    cache_key = f"markdown:{markdown_hash(text)}"
+    html = cache.get(cache_key)
+    record_cache_lookup(html is not None)
+    if html is None:
+        html = parse_markdown(text)
+        cache.set(cache_key, html, settings.MARKDOWN_CACHE_TIMEOUT)
+    return html
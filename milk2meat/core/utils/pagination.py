@@ -0,0 +1,149 @@
+import base64
+import json
+from functools import reduce
+
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+
+
+class InvalidCursor(InvalidPage):
+    pass
+
+
+class CursorPage:
+    """A page of results from a CursorPaginator, with the cursors of the adjacent pages"""
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f"<CursorPage of {len(self.object_list)} items>"
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Keyset ("cursor") paginator.
+
+    Rather than counting rows and skipping `OFFSET n` of them, each page continues from the
+    ordering values of the last row of the previous page, so every page costs the same
+    (an index range scan, given an index matching the ordering).
+
+    The ordering must be unique, e.g. end with the primary key. Cursors are opaque tokens
+    encoding the ordering values of the boundary row and the direction to read in.
+    """
+
+    def __init__(self, queryset, per_page, ordering):
+        """
+        Args:
+            queryset: The QuerySet to paginate
+            per_page (int): Maximum number of items per page
+            ordering (list): Field names making up a unique ordering, e.g. ["-updated_at", "-id"]
+        """
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = list(ordering)
+
+    def page(self, cursor=None):
+        """
+        Get the page identified by the given cursor (the first page if there is none).
+
+        Raises:
+            InvalidCursor: If the cursor can't be decoded
+        """
+        if cursor:
+            values, reverse = self.decode_cursor(cursor)
+            queryset = self.queryset.filter(self._seek_filter(values, reverse))
+        else:
+            values, reverse = None, False
+            queryset = self.queryset
+
+        ordering = [self._reverse(field_name) for field_name in self.ordering] if reverse else self.ordering
+        # Fetch one extra row to find out whether there is another page in the reading direction
+        rows = list(queryset.order_by(*ordering)[: self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if reverse:
+            rows.reverse()
+
+        next_cursor = previous_cursor = None
+        if rows:
+            if has_more or reverse:
+                next_cursor = self.encode_cursor(rows[-1], reverse=False)
+            if values is not None and (has_more or not reverse):
+                previous_cursor = self.encode_cursor(rows[0], reverse=True)
+        return CursorPage(rows, self, next_cursor=next_cursor, previous_cursor=previous_cursor)
+
+    def encode_cursor(self, obj, reverse=False):
+        """Encode the ordering values of the given object as an opaque cursor"""
+        values = [self._get_field(field_name).value_to_string(obj) for field_name in self.ordering]
+        data = json.dumps({"v": values, "r": reverse}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, cursor):
+        """
+        Decode a cursor into the ordering values it encodes (as Python values) and its direction.
+
+        Raises:
+            InvalidCursor: If the cursor can't be decoded
+        """
+        try:
+            data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            raw_values, reverse = data["v"], bool(data["r"])
+            values = [
+                self._get_field(field_name).to_python(value)
+                for field_name, value in zip(self.ordering, raw_values, strict=True)
+            ]
+        except Exception as e:
+            raise InvalidCursor("Invalid cursor") from e
+        return values, reverse
+
+    def _seek_filter(self, values, reverse):
+        """
+        Build the filter selecting the rows after (or, if reverse, before) the given ordering values.
+
+        For an ordering of (a, b, c) that is: a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z),
+        with the comparisons flipped for descending fields.
+        """
+        conditions = []
+        for i, field_name in enumerate(self.ordering):
+            equal = {self._name(name): value for name, value in zip(self.ordering[:i], values[:i], strict=True)}
+            descending = field_name.startswith("-") != reverse
+            lookup = f"{self._name(field_name)}__{'lt' if descending else 'gt'}"
+            conditions.append(Q(**equal, **{lookup: values[i]}))
+
+        # The bound on the leading field is implied, but lets the database start the index scan there
+        descending = self.ordering[0].startswith("-") != reverse
+        bound = Q(**{f"{self._name(self.ordering[0])}__{'lte' if descending else 'gte'}": values[0]})
+        return bound & reduce(lambda a, b: a | b, conditions)
+
+    def _get_field(self, field_name):
+        return self.queryset.model._meta.get_field(self._name(field_name))
+
+    @staticmethod
+    def _name(field_name):
+        return field_name.removeprefix("-")
+
+    @staticmethod
+    def _reverse(field_name):
+        return field_name[1:] if field_name.startswith("-") else f"-{field_name}"
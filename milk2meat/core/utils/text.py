@@ -0,0 +1,34 @@
+def apply_text_delta(text, delta):
+    """
+    Apply a text delta to the given text.
+
+    A delta is a list of `[start, end, replacement]` edits, each replacing `text[start:end]`.
+    The edits are applied in turn, so the offsets of an edit refer to the text as modified by
+    the previous ones (as reported by editor change events). Offsets count Unicode code points.
+
+    Args:
+        text (str): Text the delta was made against
+        delta (list): Edits to apply
+
+    Returns:
+        str: The edited text
+
+    Raises:
+        ValueError: If the delta is malformed or an edit is out of range
+    """
+    if not isinstance(delta, list):
+        raise ValueError("The delta must be a list of edits.")
+
+    for edit in delta:
+        if not isinstance(edit, list) or len(edit) != 3:
+            raise ValueError("Each edit must be a [start, end, replacement] list.")
+        start, end, replacement = edit
+        if not all(isinstance(offset, int) and not isinstance(offset, bool) for offset in (start, end)):
+            raise ValueError("Edit offsets must be integers.")
+        if not isinstance(replacement, str):
+            raise ValueError("Edit replacements must be strings.")
+        if not 0 <= start <= end <= len(text):
+            raise ValueError(f"Edit [{start}, {end}] is out of range.")
+        text = text[:start] + replacement + text[end:]
+
+    return text
@@ -0,0 +1,95 @@
+import contextvars
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Metrics of the request being handled (see ServerTimingMiddleware). The context is copied
+# into threads by asgiref's sync_to_async, so work done in threads is recorded too.
+_current_metrics = contextvars.ContextVar("request_metrics", default=None)
+
+
+class RequestMetrics:
+    """Time spent (in seconds) and number of operations per kind of work, for a request"""
+
+    def __init__(self):
+        self.durations = defaultdict(float)
+        self.counts = defaultdict(int)
+
+    def add(self, name, duration=0.0, count=1):
+        self.durations[name] += duration
+        self.counts[name] += count
+
+
+def get_current_metrics():
+    """Get the metrics of the request being handled, or None outside a request"""
+    return _current_metrics.get()
+
+
+@contextmanager
+def collect_metrics():
+    """Collect the metrics of the work done in the block, e.g. handling a request"""
+    metrics = RequestMetrics()
+    token = _current_metrics.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current_metrics.reset(token)
+
+
+@contextmanager
+def timed(name):
+    """
+    Record the time spent in the block (or decorated function) under the given name.
+
+    It's a no-op outside a request, so it can be used in code also run by commands.
+    """
+    metrics = _current_metrics.get()
+    if metrics is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add(name, time.perf_counter() - start)
+
+
+def record_cache_lookup(hit):
+    """Record a cache hit (or miss) for the current request"""
+    metrics = _current_metrics.get()
+    if metrics is not None:
+        metrics.add("cache_hit" if hit else "cache_miss")
+
+
+def record_count(name, amount=1):
+    """Add to a count (e.g. of bytes uploaded) for the current request"""
+    metrics = _current_metrics.get()
+    if metrics is not None:
+        metrics.counts[name] += amount
+
+
+def time_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper (see `connection.execute_wrapper`) timing queries.
+
+    Queries on the django-watson index are also recorded separately, as "search".
+    """
+    metrics = _current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - start
+        metrics.add("db", duration)
+        if "watson_searchentry" in sql:
+            metrics.add("search", duration)
+
+
+def install_query_timer(connection, **kwargs):
+    """Add the query timer to a new database connection (a `connection_created` receiver)"""
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
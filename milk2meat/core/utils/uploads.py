@@ -0,0 +1,80 @@
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile, UploadedFile
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from upload_validator import FileTypeValidator
+
+from milk2meat.core.utils.constants import ALLOWED_DOCUMENT_TYPES, ALLOWED_IMAGE_TYPES, MAX_UPLOAD_SIZE
+
+# Number of bytes the type of a file is detected from (the size of an upload chunk)
+SNIFF_SIZE = 64 * 1024
+
+
+class RejectedUpload(UploadedFile):
+    """
+    Placeholder for an uploaded file rejected by ValidatingUploadHandler.
+
+    It has no content (the received bytes were discarded), and carries the reason for the
+    rejection in `error`, so that forms can report it (see `NoteForm.clean_upload`).
+    """
+
+    def __init__(self, name, content_type, size, charset, error):
+        super().__init__(None, name, content_type, size, charset)
+        self.error = error
+
+    def open(self, mode=None):
+        raise ValueError("A rejected upload has no content.")
+
+    def chunks(self, chunk_size=None):
+        raise ValueError("A rejected upload has no content.")
+
+
+class ValidatingUploadHandler(TemporaryFileUploadHandler):
+    """
+    Upload handler validating files while they are received.
+
+    Files are always streamed to a temporary file (never buffered in memory). The type of
+    each file is sniffed from its first chunk, and its size is checked as the chunks arrive,
+    so a file of a disallowed type or over the size limit is rejected without being stored.
+    The rest of a rejected file is discarded, and it's replaced by a RejectedUpload.
+    """
+
+    allowed_types = ALLOWED_IMAGE_TYPES + ALLOWED_DOCUMENT_TYPES
+    max_size = MAX_UPLOAD_SIZE
+    chunk_size = SNIFF_SIZE
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.error = None
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received = start + len(raw_data)
+        if self.error is None:
+            if self.received > self.max_size:
+                self.reject(
+                    f"File too large. The maximum file size that can be uploaded is {self.max_size / (1024 * 1024)}MB"
+                )
+            elif start == 0:
+                self.sniff(raw_data)
+
+        if self.error is not None:
+            return None
+        return super().receive_data_chunk(raw_data, start)
+
+    def sniff(self, head):
+        """Reject the file unless the type detected from its first bytes is allowed"""
+        try:
+            FileTypeValidator(allowed_types=self.allowed_types)(SimpleUploadedFile(self.file_name, head))
+        except ValidationError as e:
+            self.reject(e.messages[0])
+
+    def reject(self, error):
+        """Stop storing the current file, discarding what was received of it"""
+        self.error = error
+        # Closing the temporary file deletes it
+        self.file.close()
+
+    def file_complete(self, file_size):
+        if self.error is not None:
+            return RejectedUpload(self.file_name, self.content_type, self.received, self.charset, self.error)
+        return super().file_complete(file_size)
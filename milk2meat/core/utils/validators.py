@@ -1,6 +1,8 @@
 from django.core.exceptions import ValidationError
 from django.utils.deconstruct import deconstructible
 
+from milk2meat.core.utils.constants import MAX_UPLOAD_SIZE
+
 
 @deconstructible
 class FileSizeValidator(object):
@@ -8,7 +10,7 @@ class FileSizeValidator(object):
     A custom validator to check the file size of a Django FileField.
 
     Attributes:
-        limit (int): The maximum allowed file size in bytes. Default is 10MB.
+        limit (int): The maximum allowed file size in bytes. Default is MAX_UPLOAD_SIZE (10MB).
 
     Usage:
         Attach an instance of this validator to a FileField in your model. You can
@@ -21,7 +23,7 @@ class FileSizeValidator(object):
         )
     """
 
-    def __init__(self, limit=10 * 1024 * 1024):
+    def __init__(self, limit=MAX_UPLOAD_SIZE):
         self.limit = limit
 
     def __call__(self, value):
@@ -1,10 +1,18 @@
+import hmac
 import logging
+from itertools import groupby
 
+from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.contenttypes.prefetch import GenericPrefetch
+from django.http import Http404, HttpResponse
+from django.views.decorators.http import require_GET
 from django.views.generic import ListView
-from watson import search as watson
 
 from milk2meat.bible.models import Book
+from milk2meat.core.metrics import recorder
+from milk2meat.core.search import search_for_user
 from milk2meat.notes.models import Note
 
 logger = logging.getLogger(__name__)
@@ -21,18 +29,21 @@ class GlobalSearchView(LoginRequiredMixin, ListView):
         if not query:
             return []
 
-        # Perform search with watson
-        search_results = watson.search(
-            query,
-            # Limit search to user's own notes
-            models=(
-                Note.objects.get_queryset_for_user(self.request.user),
-                Book.objects.all(),
-            ),
+        # Search the user's own notes and the Bible books (scoped by the indexed owner column)
+        search_results = search_for_user(query, self.request.user)
+
+        # Load the objects behind the current page's results in one query per model
+        # (rather than one query per result when the template accesses `result.object`)
+        return search_results.prefetch_related(
+            GenericPrefetch(
+                "object",
+                [
+                    Note.objects.select_related("note_type"),
+                    Book.objects.all(),
+                ],
+            )
         )
 
-        return search_results
-
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
@@ -57,15 +68,30 @@ class GlobalSearchView(LoginRequiredMixin, ListView):
 
             # Group results by model type (only for current page)
             if context["search_results"]:
-                from itertools import groupby
-
-                # Group results by model type
+                # Group results by model type (get_for_id is served from the content type cache)
                 results_by_type = {}
                 for model_name, group in groupby(
-                    context["search_results"], key=lambda x: x.content_type.model_class().__name__
+                    context["search_results"],
+                    key=lambda x: ContentType.objects.get_for_id(x.content_type_id).model_class().__name__,
                 ):
                     results_by_type[model_name] = list(group)
 
                 context["results_by_type"] = results_by_type
 
         return context
+
+
+@require_GET
+def metrics_view(request):
+    """
+    Export the request metrics of all the processes (see `MetricsRecorder`) for Prometheus.
+
+    Only staff, and clients sending the `METRICS_TOKEN` as a bearer token (i.e. the Prometheus
+    scraper), can read them; others get a 404, so that the endpoint isn't advertised.
+    """
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get("Authorization", "")
+    if not (request.user.is_staff or (token and hmac.compare_digest(authorization, f"Bearer {token}"))):
+        raise Http404
+
+    return HttpResponse(recorder.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -21,8 +21,9 @@ document.addEventListener("DOMContentLoaded", function () {
   // Make formChanged accessible to other functions
   window.formChanged = false;
 
-  // Array to store editor instances
+  // Array to store editor instances, shared with the form scripts (which sync and watch them)
   const editors = [];
+  window.editors = editors;
 
   // Create an editor instance for each element
   editorElements.forEach(function (element) {
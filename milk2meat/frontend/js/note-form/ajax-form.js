@@ -1,3 +1,44 @@
+import { MULTIPART_THRESHOLD, MultipartUploader } from "./file-upload";
+
+// Placeholder for the note ID in the upload and autosave URL templates
+const NOTE_ID_PLACEHOLDER = "00000000-0000-0000-0000-000000000000";
+
+// Milliseconds without changes after which the title and content are autosaved
+export const AUTOSAVE_DELAY = 2000;
+
+/**
+ * Gets the edit turning one text into another, as a delta for the autosave endpoint:
+ * a list of [start, end, replacement] edits, with offsets counting code points.
+ *
+ * Only the span between the common prefix and suffix of the texts is sent.
+ */
+export function textDelta(oldText, newText) {
+  const oldChars = Array.from(oldText);
+  const newChars = Array.from(newText);
+
+  let start = 0;
+  while (
+    start < oldChars.length &&
+    start < newChars.length &&
+    oldChars[start] === newChars[start]
+  ) {
+    start++;
+  }
+
+  let oldEnd = oldChars.length;
+  let newEnd = newChars.length;
+  while (
+    oldEnd > start &&
+    newEnd > start &&
+    oldChars[oldEnd - 1] === newChars[newEnd - 1]
+  ) {
+    oldEnd--;
+    newEnd--;
+  }
+
+  return [[start, oldEnd, newChars.slice(start, newEnd).join("")]];
+}
+
 /**
  * Handles AJAX form submission for notes
  */
@@ -11,15 +52,35 @@ export class AjaxFormManager {
     this.createUrl = options.createUrl;
     this.updateUrl = options.updateUrl;
     this.noteId = options.noteId;
+    // Set when files can be uploaded straight to storage (see uploadDirect)
+    this.uploadUrlTemplate = options.uploadUrlTemplate;
+    // Set when the title and content are autosaved (see autosave)
+    this.autosaveUrlTemplate = options.autosaveUrlTemplate;
+    this.autosaveDelay = options.autosaveDelay ?? AUTOSAVE_DELAY;
+    // Revision of the note the form was loaded with or last saved as
+    this.revision = options.revision || null;
 
     // Track form submission state
     this.isSubmitting = false;
 
+    // Track autosave state
+    this.autosaveTimer = null;
+    this.isAutosaving = false;
+    this.hasConflict = false;
+    this.saved = this.getAutosaveValues();
+
     this.setupEventListeners();
   }
 
   setupEventListeners() {
     this.form.addEventListener("submit", (e) => this.handleSubmit(e));
+
+    if (this.autosaveUrlTemplate) {
+      this.form.addEventListener("input", () => this.scheduleAutosave());
+      this.editorInstances.forEach((editor) => {
+        editor.codemirror.on("change", () => this.scheduleAutosave());
+      });
+    }
   }
 
   async handleSubmit(e) {
@@ -31,6 +92,9 @@ export class AjaxFormManager {
 
     this.isSubmitting = true;
 
+    // The whole form is saved, so there's nothing left to autosave
+    clearTimeout(this.autosaveTimer);
+
     // Show loading state
     const originalBtnText = this.submitBtn.innerHTML;
     this.submitBtn.disabled = true;
@@ -49,6 +113,14 @@ export class AjaxFormManager {
 
       // Create FormData from the form
       const formData = new FormData(this.form);
+      const values = this.getAutosaveValues();
+
+      // The file is uploaded straight to storage once the note is saved, when possible
+      const file = this.uploadUrlTemplate ? formData.get("upload") : null;
+      const uploadDirectly = file instanceof File && file.size > 0;
+      if (uploadDirectly) {
+        formData.delete("upload");
+      }
 
       // Use the appropriate URL (update URL is already set correctly by the template)
       const url = this.noteId ? this.updateUrl : this.createUrl;
@@ -95,6 +167,17 @@ export class AjaxFormManager {
             .replace("/notes/", "/api/notes/");
         }
 
+        // Later autosaves are made against the saved note
+        if (data.revision) {
+          this.revision = data.revision;
+          this.saved = values;
+          this.hasConflict = false;
+        }
+
+        if (uploadDirectly && !(await this.uploadDirect(file, this.noteId))) {
+          return;
+        }
+
         // Reset the form changed state since we just saved
         if (window.formChanged !== undefined) {
           window.formChanged = false;
@@ -121,6 +204,186 @@ export class AjaxFormManager {
     }
   }
 
+  /**
+   * Gets the current values of the autosaved fields
+   */
+  getAutosaveValues() {
+    this.editorInstances.forEach((editor) => {
+      editor.codemirror.save();
+    });
+    return {
+      title: this.form.querySelector('[name="title"]')?.value ?? "",
+      content: this.form.querySelector('[name="content"]')?.value ?? "",
+    };
+  }
+
+  /**
+   * Autosaves the note once the form hasn't changed for a while.
+   * New notes are only autosaved once they have been saved.
+   */
+  scheduleAutosave() {
+    if (!this.noteId || !this.revision || this.hasConflict) return;
+
+    clearTimeout(this.autosaveTimer);
+    this.autosaveTimer = setTimeout(() => this.autosave(), this.autosaveDelay);
+  }
+
+  /**
+   * Saves the changes to the title and content since the last save.
+   * The content is sent as a delta against the saved revision, so that the whole note
+   * isn't sent on every change. If the note has changed elsewhere since, the user is
+   * asked to reload it rather than overwrite the other changes.
+   */
+  async autosave() {
+    if (this.isSubmitting || this.isAutosaving) {
+      // Try again once the current save is done
+      this.scheduleAutosave();
+      return;
+    }
+
+    const values = this.getAutosaveValues();
+    const payload = { revision: this.revision };
+    // The title is required, so it's saved with the rest of the form if cleared
+    if (values.title !== this.saved.title && values.title.trim()) {
+      payload.title = values.title;
+    }
+    if (values.content !== this.saved.content) {
+      payload.content_delta = textDelta(this.saved.content, values.content);
+    }
+    if (!payload.title && !payload.content_delta) return;
+
+    const url = this.autosaveUrlTemplate.replace(
+      NOTE_ID_PLACEHOLDER,
+      this.noteId,
+    );
+
+    this.isAutosaving = true;
+    try {
+      const response = await fetch(url, {
+        method: "PATCH",
+        body: JSON.stringify(payload),
+        headers: {
+          "Content-Type": "application/json",
+          "X-CSRFToken": this.csrfToken,
+          "X-Requested-With": "XMLHttpRequest",
+        },
+        credentials: "same-origin",
+      });
+      const data = await response.json();
+
+      if (data.success) {
+        this.revision = data.revision;
+        this.saved = {
+          title: payload.title ?? this.saved.title,
+          content: values.content,
+        };
+      } else if (response.status === 409) {
+        // Stop autosaving, so the other changes aren't overwritten
+        this.hasConflict = true;
+        if (window.confirm(`${data.error} Reload now?`)) {
+          window.location.reload();
+        }
+      } else {
+        this.displayErrors(
+          data.errors || {
+            _form: [data.error || "The note could not be autosaved"],
+          },
+        );
+      }
+    } catch (error) {
+      // The changes are sent again on the next autosave
+      console.error("Error autosaving note:", error);
+    } finally {
+      this.isAutosaving = false;
+    }
+  }
+
+  /**
+   * Uploads a file straight to storage and attaches it to the note.
+   * Large files are uploaded in parts, so that an interrupted upload can be resumed.
+   *
+   * Returns true if the file was attached, false otherwise (with the errors displayed)
+   */
+  async uploadDirect(file, noteId) {
+    const uploadUrl = this.uploadUrlTemplate.replace(
+      NOTE_ID_PLACEHOLDER,
+      noteId,
+    );
+
+    let result;
+    if (file.size > MULTIPART_THRESHOLD) {
+      const uploader = new MultipartUploader({
+        uploadUrl: `${uploadUrl}multipart/`,
+        csrfToken: this.csrfToken,
+      });
+      result = await uploader.upload(file);
+    } else {
+      result = await this.uploadSingle(file, uploadUrl);
+    }
+
+    if (!result.success) {
+      this.displayErrors(result.errors || { upload: [result.error] });
+      return false;
+    }
+
+    // The file is attached, so it doesn't need to be uploaded again on the next save
+    const fileInput = this.form.querySelector('[name="upload"]');
+    if (fileInput) {
+      fileInput.value = "";
+    }
+    return true;
+  }
+
+  /**
+   * Uploads a file in a single request: the server signs an upload URL, the file
+   * is PUT to it, and the server then checks the uploaded file before attaching it.
+   *
+   * Returns the response of the last request made
+   */
+  async uploadSingle(file, uploadUrl) {
+    const upload = await this.postJson(uploadUrl, {
+      filename: file.name,
+      content_type: file.type,
+      size: file.size,
+    });
+    if (!upload.success) {
+      return upload;
+    }
+
+    const response = await fetch(upload.url, {
+      method: upload.method,
+      headers: upload.headers,
+      body: file,
+    });
+    if (!response.ok) {
+      return {
+        success: false,
+        errors: {
+          upload: ["The file could not be uploaded. Please try again."],
+        },
+      };
+    }
+
+    return this.postJson(`${uploadUrl}finalize/`, { token: upload.token });
+  }
+
+  /**
+   * Posts JSON data to the given URL, returning the JSON response
+   */
+  async postJson(url, data) {
+    const response = await fetch(url, {
+      method: "POST",
+      body: JSON.stringify(data),
+      headers: {
+        "Content-Type": "application/json",
+        "X-CSRFToken": this.csrfToken,
+        "X-Requested-With": "XMLHttpRequest",
+      },
+      credentials: "same-origin",
+    });
+    return response.json();
+  }
+
   /**
    * Displays a message to the user
    */
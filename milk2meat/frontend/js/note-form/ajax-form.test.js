@@ -2,7 +2,7 @@
  * @jest-environment jsdom
  */
 
-import { AjaxFormManager } from "./ajax-form";
+import { AUTOSAVE_DELAY, AjaxFormManager, textDelta } from "./ajax-form";
 
 // Mock response data
 const successResponse = {
@@ -202,6 +202,67 @@ describe("AjaxFormManager", () => {
     );
   });
 
+  test("uploads files straight to storage when direct uploads are available", async () => {
+    const file = new File(["%PDF-1.4"], "notes.pdf", {
+      type: "application/pdf",
+    });
+    const formData = new window.FormData();
+    formData.get.mockImplementation((key) => (key === "upload" ? file : null));
+    formData.delete = jest.fn();
+
+    ajaxFormManager.uploadUrlTemplate =
+      "/api/notes/00000000-0000-0000-0000-000000000000/upload/";
+
+    const jsonResponse = (data) => ({
+      ok: true,
+      json: jest.fn().mockResolvedValue(data),
+    });
+    window.fetch = jest
+      .fn()
+      .mockResolvedValueOnce(jsonResponse(successResponse))
+      .mockResolvedValueOnce(
+        jsonResponse({
+          success: true,
+          url: "https://bucket.example.com/signed",
+          method: "PUT",
+          headers: { "Content-Type": "application/pdf" },
+          token: "upload-token",
+        }),
+      )
+      .mockResolvedValueOnce({ ok: true })
+      .mockResolvedValueOnce(jsonResponse({ success: true }));
+
+    const mockEvent = { preventDefault: jest.fn() };
+    await ajaxFormManager.handleSubmit(mockEvent);
+
+    // The file isn't sent with the form
+    expect(formData.delete).toHaveBeenCalledWith("upload");
+
+    // It's PUT to the signed URL, then attached to the note
+    expect(window.fetch).toHaveBeenNthCalledWith(
+      2,
+      "/api/notes/123/upload/",
+      expect.objectContaining({ method: "POST" }),
+    );
+    expect(window.fetch).toHaveBeenNthCalledWith(
+      3,
+      "https://bucket.example.com/signed",
+      {
+        method: "PUT",
+        headers: { "Content-Type": "application/pdf" },
+        body: file,
+      },
+    );
+    expect(window.fetch).toHaveBeenNthCalledWith(
+      4,
+      "/api/notes/123/upload/finalize/",
+      expect.objectContaining({
+        body: JSON.stringify({ token: "upload-token" }),
+      }),
+    );
+    expect(window.resetFormChanged).toHaveBeenCalled();
+  });
+
   test("handles network errors during submission", async () => {
     // Mock fetch to throw a network error
     window.fetch = jest.fn().mockRejectedValue(new Error("Network error"));
@@ -256,4 +317,111 @@ describe("AjaxFormManager", () => {
       "error",
     );
   });
+
+  describe("autosave", () => {
+    let autosaveManager;
+
+    beforeEach(() => {
+      jest.useFakeTimers();
+      window.editors[0].codemirror.on = jest.fn();
+      window.confirm = jest.fn().mockReturnValue(false);
+
+      autosaveManager = new AjaxFormManager({
+        formSelector: "#note-form",
+        messageContainerId: "form-messages",
+        editorInstances: window.editors,
+        createUrl: "/api/notes/create/",
+        updateUrl: "/api/notes/update/123/",
+        noteId: "123",
+        autosaveUrlTemplate:
+          "/api/notes/00000000-0000-0000-0000-000000000000/autosave/",
+        revision: "2024-01-01T00:00:00+00:00",
+      });
+    });
+
+    afterEach(() => {
+      jest.useRealTimers();
+    });
+
+    test("computes the delta between two texts", () => {
+      expect(textDelta("hello world", "hello brave world")).toEqual([
+        [6, 6, "brave "],
+      ]);
+      expect(textDelta("aaa", "aa")).toEqual([[2, 3, ""]]);
+      // Offsets count code points, like the server does
+      expect(textDelta("x😀y", "x😀!y")).toEqual([[2, 2, "!"]]);
+    });
+
+    test("sends the changes as a delta once the form stops changing", async () => {
+      window.fetch = jest.fn().mockResolvedValue({
+        ok: true,
+        status: 200,
+        json: jest
+          .fn()
+          .mockResolvedValue({ success: true, revision: "new-revision" }),
+      });
+      expect(window.editors[0].codemirror.on).toHaveBeenCalledWith(
+        "change",
+        expect.any(Function),
+      );
+      const autosaveSpy = jest.spyOn(autosaveManager, "autosave");
+
+      const content = formElement.querySelector('[name="content"]');
+      content.value = "Test content, edited";
+      formElement.dispatchEvent(new Event("input"));
+      jest.advanceTimersByTime(AUTOSAVE_DELAY / 2);
+      formElement.dispatchEvent(new Event("input"));
+      jest.advanceTimersByTime(AUTOSAVE_DELAY / 2);
+      expect(window.fetch).not.toHaveBeenCalled();
+
+      jest.advanceTimersByTime(AUTOSAVE_DELAY / 2);
+      expect(window.fetch).toHaveBeenCalledTimes(1);
+      expect(window.fetch).toHaveBeenCalledWith(
+        "/api/notes/123/autosave/",
+        expect.objectContaining({
+          method: "PATCH",
+          body: JSON.stringify({
+            revision: "2024-01-01T00:00:00+00:00",
+            content_delta: [[12, 12, ", edited"]],
+          }),
+          headers: expect.objectContaining({
+            "X-CSRFToken": "test-csrf-token",
+          }),
+        }),
+      );
+
+      // The next changes are made against the new revision
+      await autosaveSpy.mock.results[0].value;
+      expect(autosaveManager.revision).toBe("new-revision");
+      expect(autosaveManager.saved.content).toBe("Test content, edited");
+    });
+
+    test("asks the user to reload when the note changed elsewhere", async () => {
+      window.fetch = jest.fn().mockResolvedValue({
+        ok: false,
+        status: 409,
+        json: jest.fn().mockResolvedValue({
+          success: false,
+          error: "This note has been changed elsewhere.",
+          revision: "other-revision",
+        }),
+      });
+
+      formElement.querySelector('[name="title"]').value = "Renamed";
+      await autosaveManager.autosave();
+
+      expect(JSON.parse(window.fetch.mock.calls[0][1].body)).toEqual({
+        revision: "2024-01-01T00:00:00+00:00",
+        title: "Renamed",
+      });
+      expect(window.confirm).toHaveBeenCalledWith(
+        expect.stringContaining("This note has been changed elsewhere."),
+      );
+
+      // Autosaving stops, so the other changes aren't overwritten
+      formElement.dispatchEvent(new Event("input"));
+      jest.advanceTimersByTime(AUTOSAVE_DELAY);
+      expect(window.fetch).toHaveBeenCalledTimes(1);
+    });
+  });
 });
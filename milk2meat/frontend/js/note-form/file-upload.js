@@ -132,3 +132,184 @@ export class FileUploadManager {
     });
   }
 }
+
+// Files larger than this are uploaded in parts, so that an interrupted upload can be resumed
+export const MULTIPART_THRESHOLD = 5 * 1024 * 1024;
+
+/**
+ * Uploads a file straight to storage in parts (a multipart upload), several parts at a time.
+ *
+ * The upload is remembered (in localStorage) until it's completed, so that uploading
+ * the same file again after an interruption only uploads the missing parts.
+ */
+export class MultipartUploader {
+  constructor(options) {
+    // URL of the note_multipart_create endpoint; the other endpoints are relative to it
+    this.uploadUrl = options.uploadUrl;
+    this.csrfToken = options.csrfToken;
+    this.concurrency = options.concurrency || 3;
+    this.retries = options.retries ?? 2;
+    this.storage = options.storage || window.localStorage;
+  }
+
+  /**
+   * Uploads the file, returning the response of the note_multipart_complete endpoint
+   * (or of the request that failed)
+   */
+  async upload(file) {
+    const key = this.resumeKey(file);
+    let upload = await this.resume(key);
+
+    if (!upload) {
+      const created = await this.postJson(this.uploadUrl, {
+        filename: file.name,
+        content_type: file.type,
+        size: file.size,
+      });
+      if (!created.success) {
+        return created;
+      }
+      upload = {
+        token: created.token,
+        partSize: created.part_size,
+        partCount: created.part_count,
+        uploaded: new Set(),
+      };
+      this.storage.setItem(
+        key,
+        JSON.stringify({
+          token: upload.token,
+          partSize: upload.partSize,
+          partCount: upload.partCount,
+        }),
+      );
+    }
+
+    const missing = [];
+    for (let number = 1; number <= upload.partCount; number++) {
+      if (!upload.uploaded.has(number)) {
+        missing.push(number);
+      }
+    }
+
+    if (missing.length > 0) {
+      const signed = await this.postJson(`${this.uploadUrl}parts/sign/`, {
+        token: upload.token,
+        part_numbers: missing,
+      });
+      if (!signed.success) {
+        return signed;
+      }
+
+      try {
+        await this.uploadParts(file, upload.partSize, missing, signed.urls);
+      } catch (error) {
+        console.error("Error uploading file parts:", error);
+        return {
+          success: false,
+          errors: {
+            upload: [
+              "The upload was interrupted. Save again to resume uploading the file.",
+            ],
+          },
+        };
+      }
+    }
+
+    const result = await this.postJson(`${this.uploadUrl}complete/`, {
+      token: upload.token,
+    });
+    // The upload can only be resumed if some parts are missing
+    if (!result.missing_parts) {
+      this.storage.removeItem(key);
+    }
+    return result;
+  }
+
+  /**
+   * Gets the upload of the file started earlier, with the parts uploaded so far,
+   * or null if there is none
+   */
+  async resume(key) {
+    const saved = JSON.parse(this.storage.getItem(key) || "null");
+    if (!saved) {
+      return null;
+    }
+
+    const params = new URLSearchParams({ token: saved.token });
+    const response = await fetch(`${this.uploadUrl}parts/?${params}`, {
+      headers: { "X-Requested-With": "XMLHttpRequest" },
+      credentials: "same-origin",
+    });
+    const data = await response.json();
+    if (!data.success) {
+      // The upload expired or was aborted, so start again
+      this.storage.removeItem(key);
+      return null;
+    }
+
+    return {
+      ...saved,
+      uploaded: new Set(data.parts.map((part) => part.number)),
+    };
+  }
+
+  /**
+   * Uploads the given parts of the file to their signed URLs, several at a time
+   */
+  async uploadParts(file, partSize, numbers, urls) {
+    const queue = [...numbers];
+    const worker = async () => {
+      while (queue.length > 0) {
+        const number = queue.shift();
+        const start = (number - 1) * partSize;
+        await this.uploadPart(
+          urls[number],
+          file.slice(start, start + partSize),
+        );
+      }
+    };
+
+    const workers = Math.min(this.concurrency, numbers.length);
+    await Promise.all(Array.from({ length: workers }, worker));
+  }
+
+  /**
+   * Uploads a part, retrying a few times if it fails
+   */
+  async uploadPart(url, blob) {
+    let lastError;
+    for (let attempt = 0; attempt <= this.retries; attempt++) {
+      try {
+        const response = await fetch(url, { method: "PUT", body: blob });
+        if (response.ok) {
+          return;
+        }
+        lastError = new Error(
+          `Part upload failed with status ${response.status}`,
+        );
+      } catch (error) {
+        lastError = error;
+      }
+    }
+    throw lastError;
+  }
+
+  resumeKey(file) {
+    return `multipart-upload:${this.uploadUrl}:${file.name}:${file.size}:${file.lastModified}`;
+  }
+
+  async postJson(url, data) {
+    const response = await fetch(url, {
+      method: "POST",
+      body: JSON.stringify(data),
+      headers: {
+        "Content-Type": "application/json",
+        "X-CSRFToken": this.csrfToken,
+        "X-Requested-With": "XMLHttpRequest",
+      },
+      credentials: "same-origin",
+    });
+    return response.json();
+  }
+}
@@ -2,7 +2,7 @@
  * @jest-environment jsdom
  */
 
-import { FileUploadManager } from "./file-upload";
+import { FileUploadManager, MultipartUploader } from "./file-upload";
 
 describe("FileUploadManager", () => {
   // DOM elements we'll reference across tests
@@ -354,3 +354,141 @@ describe("FileUploadManager", () => {
     expect(simpleManager.deleteFileBtn).toBeNull();
   });
 });
+
+describe("MultipartUploader", () => {
+  const uploadUrl = "/api/notes/123/upload/multipart/";
+  const file = new File(["abcdefghij"], "notes.pdf", {
+    type: "application/pdf",
+    lastModified: 1,
+  });
+  let originalFetch;
+  let storage;
+  let uploader;
+
+  const jsonResponse = (data) => ({
+    ok: true,
+    json: jest.fn().mockResolvedValue(data),
+  });
+
+  // Responds to the upload endpoints, and to part uploads with the given responses
+  const mockEndpoints = (responses, partResponse = () => ({ ok: true })) => {
+    window.fetch = jest.fn((url) => {
+      const path = url.split("?")[0];
+      if (path in responses) {
+        return Promise.resolve(jsonResponse(responses[path]));
+      }
+      return Promise.resolve(partResponse(url));
+    });
+  };
+
+  beforeEach(() => {
+    originalFetch = window.fetch;
+    jest.spyOn(console, "error").mockImplementation(() => {});
+    storage = window.localStorage;
+    storage.clear();
+    uploader = new MultipartUploader({
+      uploadUrl,
+      csrfToken: "test-csrf-token",
+      concurrency: 2,
+    });
+  });
+
+  afterEach(() => {
+    jest.restoreAllMocks();
+    window.fetch = originalFetch;
+  });
+
+  test("uploads every part, then completes the upload", async () => {
+    mockEndpoints({
+      [uploadUrl]: {
+        success: true,
+        token: "token",
+        part_size: 4,
+        part_count: 3,
+      },
+      [`${uploadUrl}parts/sign/`]: {
+        success: true,
+        urls: {
+          1: "https://bucket/1",
+          2: "https://bucket/2",
+          3: "https://bucket/3",
+        },
+      },
+      [`${uploadUrl}complete/`]: { success: true },
+    });
+
+    const result = await uploader.upload(file);
+
+    expect(result.success).toBe(true);
+    const partUploads = window.fetch.mock.calls.filter(([url]) =>
+      url.startsWith("https://bucket/"),
+    );
+    expect(partUploads.map(([url]) => url).sort()).toEqual([
+      "https://bucket/1",
+      "https://bucket/2",
+      "https://bucket/3",
+    ]);
+    // The last part holds the rest of the file
+    const lastPart = partUploads.find(([url]) => url === "https://bucket/3");
+    expect(lastPart[1].body.size).toBe(2);
+    // The completed upload is forgotten
+    expect(storage.getItem(uploader.resumeKey(file))).toBeNull();
+  });
+
+  test("resumes an interrupted upload with the missing parts", async () => {
+    storage.setItem(
+      uploader.resumeKey(file),
+      JSON.stringify({ token: "token", partSize: 4, partCount: 3 }),
+    );
+    mockEndpoints({
+      [`${uploadUrl}parts/`]: {
+        success: true,
+        parts: [
+          { number: 1, size: 4 },
+          { number: 3, size: 2 },
+        ],
+      },
+      [`${uploadUrl}parts/sign/`]: {
+        success: true,
+        urls: { 2: "https://bucket/2" },
+      },
+      [`${uploadUrl}complete/`]: { success: true },
+    });
+
+    const result = await uploader.upload(file);
+
+    expect(result.success).toBe(true);
+    expect(window.fetch).toHaveBeenCalledWith(
+      `${uploadUrl}parts/sign/`,
+      expect.objectContaining({
+        body: JSON.stringify({ token: "token", part_numbers: [2] }),
+      }),
+    );
+    // No new upload is created
+    expect(window.fetch).not.toHaveBeenCalledWith(uploadUrl, expect.anything());
+  });
+
+  test("keeps the upload for resuming when parts fail", async () => {
+    mockEndpoints(
+      {
+        [uploadUrl]: {
+          success: true,
+          token: "token",
+          part_size: 8,
+          part_count: 2,
+        },
+        [`${uploadUrl}parts/sign/`]: {
+          success: true,
+          urls: { 1: "https://bucket/1", 2: "https://bucket/2" },
+        },
+      },
+      () => ({ ok: false, status: 500 }),
+    );
+
+    const result = await uploader.upload(file);
+
+    expect(result.success).toBe(false);
+    expect(result.errors.upload).toHaveLength(1);
+    expect(storage.getItem(uploader.resumeKey(file))).not.toBeNull();
+  });
+});
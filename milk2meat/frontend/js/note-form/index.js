@@ -57,6 +57,9 @@ document.addEventListener("DOMContentLoaded", () => {
     createUrl: window.noteCreateUrl,
     updateUrl: window.noteUpdateUrl,
     noteId: window.currentNoteId,
+    uploadUrlTemplate: window.noteUploadUrlTemplate,
+    autosaveUrlTemplate: window.noteAutosaveUrlTemplate,
+    revision: window.noteRevision,
   });
 
   // Initialize Form Enhancer for keyboard shortcuts and floating save button
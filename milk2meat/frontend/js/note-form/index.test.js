@@ -74,6 +74,8 @@ describe("Note Form Index", () => {
     global.window.noteCreateUrl = "/api/notes/create/";
     global.window.noteUpdateUrl = "/api/notes/update/";
     global.window.currentNoteId = "123";
+    global.window.noteAutosaveUrlTemplate = "/api/notes/0/autosave/";
+    global.window.noteRevision = "2024-01-01T00:00:00+00:00";
     global.window.editors = [{ name: "mockEditor" }];
 
     // Import the module to test (this will trigger the event listener setup)
@@ -97,6 +99,8 @@ describe("Note Form Index", () => {
     delete global.window.noteCreateUrl;
     delete global.window.noteUpdateUrl;
     delete global.window.currentNoteId;
+    delete global.window.noteAutosaveUrlTemplate;
+    delete global.window.noteRevision;
     delete global.window.editors;
   });
 
@@ -167,6 +171,8 @@ describe("Note Form Index", () => {
       createUrl: "/api/notes/create/",
       updateUrl: "/api/notes/update/",
       noteId: "123",
+      autosaveUrlTemplate: "/api/notes/0/autosave/",
+      revision: "2024-01-01T00:00:00+00:00",
     });
 
     // Verify FormEnhancer was initialized with correct options
@@ -12,27 +12,8 @@ function initSecureFileDownloads() {
     link.addEventListener("click", function (e) {
       e.preventDefault();
 
-      // Get note ID from the page context
-      const noteId = document.querySelector("[data-note-id]")?.dataset?.noteId;
-      if (!noteId) {
-        console.error("Note ID not found");
-        return;
-      }
-
-      // Request a fresh signed URL
-      fetch(`/notes/${noteId}/file/`)
-        .then((response) => response.json())
-        .then((data) => {
-          if (data.url) {
-            // Open the URL in a new tab
-            window.open(data.url, "_blank");
-          } else {
-            alert("Error accessing file: " + (data.error || "Unknown error"));
-          }
-        })
-        .catch((error) => {
-          alert("Network error while accessing file");
-        });
+      // The link redirects to a freshly signed URL of the file, so open it in a new tab
+      window.open(link.href, "_blank");
     });
   });
 }
@@ -5,27 +5,6 @@
 
 import "@testing-library/jest-dom";
 
-// Mock fetch API
-global.fetch = jest.fn();
-
-// Setup mock fetch success response
-const mockFetchSuccess = () => {
-  global.fetch.mockImplementation(() =>
-    Promise.resolve({
-      json: () => Promise.resolve({ url: "https://example.com/secure-url" }),
-    }),
-  );
-};
-
-// Setup mock fetch error response
-const mockFetchError = () => {
-  global.fetch.mockImplementation(() =>
-    Promise.resolve({
-      json: () => Promise.resolve({ error: "Access denied" }),
-    }),
-  );
-};
-
 // Mock window.open
 global.open = jest.fn();
 
@@ -48,7 +27,6 @@ document.addEventListener = jest.fn((event, handler) => {
 describe("Notes Detail Module", () => {
   beforeEach(() => {
     // Reset mocks
-    global.fetch.mockClear();
     global.open.mockClear();
     global.alert.mockClear();
 
@@ -58,7 +36,7 @@ describe("Notes Detail Module", () => {
     // Reset DOM
     document.body.innerHTML = `
       <div data-note-id="123">
-        <a href="#" data-download>Download File</a>
+        <a href="/notes/123/file/open/" data-download>Download File</a>
         <button onclick="confirmDelete()">Delete</button>
         <dialog id="delete-modal">
           <div class="modal-content">
@@ -90,79 +68,18 @@ describe("Notes Detail Module", () => {
   });
 
   describe("Secure File Download", () => {
-    test("should fetch secure URL and open in new tab", async () => {
-      mockFetchSuccess();
-
+    test("should open the link in a new tab", () => {
       // Trigger download click
       const downloadLink = document.querySelector("[data-download]");
       downloadLink.click();
 
-      // Check fetch was called with correct URL
-      expect(global.fetch).toHaveBeenCalledWith("/notes/123/file/");
-
-      // Wait for promise to resolve
-      await new Promise(process.nextTick);
-
-      // Check window.open was called with secure URL
+      // The link redirects to the signed URL, so it's opened as rendered
       expect(global.open).toHaveBeenCalledWith(
-        "https://example.com/secure-url",
+        "http://localhost/notes/123/file/open/",
         "_blank",
       );
-
-      // Alert should not be called
       expect(global.alert).not.toHaveBeenCalled();
     });
-
-    test("should show error alert when fetch returns error", async () => {
-      mockFetchError();
-
-      // Trigger download click
-      const downloadLink = document.querySelector("[data-download]");
-      downloadLink.click();
-
-      // Check fetch was called
-      expect(global.fetch).toHaveBeenCalled();
-
-      // Wait for promise to resolve
-      await new Promise(process.nextTick);
-
-      // Check alert was shown with error
-      expect(global.alert).toHaveBeenCalledWith(
-        "Error accessing file: Access denied",
-      );
-
-      // Window.open should not be called
-      expect(global.open).not.toHaveBeenCalled();
-    });
-
-    test("should handle case when note ID is not found", () => {
-      // Remove note ID from DOM
-      document.querySelector("[data-note-id]").removeAttribute("data-note-id");
-
-      // Trigger download click
-      const downloadLink = document.querySelector("[data-download]");
-      downloadLink.click();
-
-      // Fetch should not be called
-      expect(global.fetch).not.toHaveBeenCalled();
-    });
-
-    test("should handle network error", async () => {
-      // Make fetch reject
-      global.fetch.mockImplementation(() => Promise.reject("Network error"));
-
-      // Trigger download click
-      const downloadLink = document.querySelector("[data-download]");
-      downloadLink.click();
-
-      // Wait for promise to reject
-      await new Promise(process.nextTick);
-
-      // Should show error alert
-      expect(global.alert).toHaveBeenCalledWith(
-        "Network error while accessing file",
-      );
-    });
   });
 
   describe("Delete Confirmation", () => {
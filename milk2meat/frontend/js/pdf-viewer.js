@@ -32,20 +32,48 @@ document.addEventListener("DOMContentLoaded", function () {
       '<div class="text-center p-4"><span class="loading loading-spinner loading-md"></span> Loading PDF...</div>';
 
     // Fetch secure URL then initialize
-    fetchSecureUrl(noteId)
-      .then((secureUrl) => {
-        if (secureUrl) {
-          initPdfViewer(pdfViewerContainer, secureUrl, noteId);
-        } else {
-          showError(pdfViewerContainer, "Could not load the secure PDF URL");
-        }
-      })
-      .catch((error) => {
-        showError(pdfViewerContainer, "Error loading PDF: " + error.message);
-      });
+    const loadPdf = () => {
+      fetchSecureUrl(noteId)
+        .then((secureUrl) => {
+          if (secureUrl) {
+            initPdfViewer(pdfViewerContainer, secureUrl, noteId);
+          } else {
+            showError(pdfViewerContainer, "Could not load the secure PDF URL");
+          }
+        })
+        .catch((error) => {
+          showError(pdfViewerContainer, "Error loading PDF: " + error.message);
+        });
+    };
+
+    whenVisible(pdfViewerContainer, loadPdf);
   }
 });
 
+/**
+ * Call a function once an element scrolls into view (right away if that can't be observed),
+ * so that the PDF is only requested if it's going to be seen
+ * @param {HTMLElement} element - The element to watch
+ * @param {Function} callback - The function to call
+ */
+function whenVisible(element, callback) {
+  if (!("IntersectionObserver" in window)) {
+    callback();
+    return;
+  }
+
+  const observer = new IntersectionObserver(
+    (entries) => {
+      if (entries.some((entry) => entry.isIntersecting)) {
+        observer.disconnect();
+        callback();
+      }
+    },
+    { rootMargin: "200px" },
+  );
+  observer.observe(element);
+}
+
 /**
  * Fetch a secure URL for the PDF
  * @param {string} noteId - The ID of the note
@@ -53,7 +81,10 @@ document.addEventListener("DOMContentLoaded", function () {
  */
 async function fetchSecureUrl(noteId) {
   try {
-    const response = await fetch(`/notes/${noteId}/file/`);
+    // The endpoint's URL is on the viewer; the response is cached by the browser
+    const container = document.getElementById("pdf-viewer");
+    const fileUrl = container?.dataset.fileUrl || `/notes/${noteId}/file/`;
+    const response = await fetch(fileUrl);
     if (!response.ok) {
       const errorData = await response.json();
       throw new Error(errorData.error || "Server error");
@@ -121,6 +121,39 @@ describe("PDF Viewer", () => {
     expect(global.fetch).toHaveBeenCalledWith("/notes/123/file/");
   });
 
+  test("only fetches the secure URL once the viewer is visible", () => {
+    document.body.innerHTML = `
+      <div id="pdf-viewer" data-note-id="123" data-file-url="/notes/123/file/"></div>
+    `;
+
+    // Mock IntersectionObserver, capturing its callback
+    let observerCallback;
+    const observe = jest.fn();
+    const disconnect = jest.fn();
+    window.IntersectionObserver = jest.fn((callback) => {
+      observerCallback = callback;
+      return { observe, disconnect };
+    });
+
+    try {
+      require(pdfViewerPath);
+      domContentLoadedHandler();
+
+      // Nothing is fetched until the viewer scrolls into view
+      expect(observe).toHaveBeenCalledWith(
+        document.getElementById("pdf-viewer"),
+      );
+      expect(global.fetch).not.toHaveBeenCalled();
+
+      observerCallback([{ isIntersecting: true }]);
+
+      expect(disconnect).toHaveBeenCalled();
+      expect(global.fetch).toHaveBeenCalledWith("/notes/123/file/");
+    } finally {
+      delete window.IntersectionObserver;
+    }
+  });
+
   test("doesn't initialize when PDF viewer container doesn't exist", () => {
     // Clear the DOM
     document.body.innerHTML = "";
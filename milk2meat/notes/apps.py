@@ -6,3 +6,7 @@ class NotesConfig(AppConfig):
     name = "milk2meat.notes"
     label = "notes"
     verbose_name = _("Notes")
+
+    def ready(self):
+        # Connect the signal handlers maintaining the search vector
+        from . import signals  # noqa: F401
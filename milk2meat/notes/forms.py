@@ -3,7 +3,10 @@ import json
 from django import forms
 from django.core.exceptions import ValidationError
 
+from milk2meat.core.reference_data import get_note_types
+from milk2meat.core.utils.constants import ALLOWED_DOCUMENT_TYPES, ALLOWED_IMAGE_TYPES
 from milk2meat.core.utils.markdown import parse_markdown
+from milk2meat.core.utils.uploads import RejectedUpload
 from milk2meat.notes.models import Note, NoteType
 
 
@@ -59,6 +62,9 @@ class NoteForm(forms.ModelForm):
         self.user = kwargs.pop("user", None)
         super().__init__(*args, **kwargs)
 
+        # The sanitized HTML of the content, produced once during validation
+        self.content_html = None
+
         # Limit note_type choices to existing types
         self.fields["note_type"].queryset = NoteType.objects.all()
         self.fields["note_type"].widget.attrs.update({"class": "select select-bordered"})
@@ -78,11 +84,18 @@ class NoteForm(forms.ModelForm):
     def clean_content(self):
         """Sanitize markdown content"""
         data = self.cleaned_data.get("content", "")
-        if data:
-            # Parse and sanitize the markdown to ensure it's safe
-            parse_markdown(data)
+        # Parse and sanitize the markdown to ensure it's safe, keeping the HTML so
+        # that saving the note doesn't render it again
+        self.content_html = parse_markdown(data)
         return data
 
+    def clean_upload(self):
+        """Report uploads rejected while they were received (see ValidatingUploadHandler)"""
+        upload = self.cleaned_data.get("upload")
+        if isinstance(upload, RejectedUpload):
+            raise ValidationError(upload.error)
+        return upload
+
     def clean_referenced_books_json(self):
         """Validate and process the referenced books JSON"""
         data = self.cleaned_data.get("referenced_books_json", "")
@@ -131,6 +144,10 @@ class NoteForm(forms.ModelForm):
                 # If we still don't have an owner, give up
                 raise ValueError("Cannot create note: Couldn't determine who the owner is")
 
+        # Hand over the HTML rendered during validation
+        if self.content_html is not None:
+            note.set_content_html(self.content_html)
+
         # Handle file deletion if requested
         if self.cleaned_data.get("delete_upload") and note.upload:
             # Store the file to delete after saving
@@ -147,16 +164,75 @@ class NoteForm(forms.ModelForm):
                 # This will also remove the file from storage
                 file_to_delete.delete(save=False)
 
-            # Handle referenced books (clear and add)
-            book_ids = self.cleaned_data.get("referenced_books_json", [])
-            note.referenced_books.clear()
-            if book_ids:
-                note.referenced_books.add(*book_ids)
-
-            # Handle tags (clear and add)
-            tags = self.cleaned_data.get("tags_input", [])
-            note.tags.clear()
-            if tags:
-                note.tags.add(*tags)
+            self.save_relations(note)
 
         return note
+
+    def save_relations(self, note):
+        """
+        Save the referenced books and tags of the (saved) note.
+
+        Only the memberships that changed are written, so saving a note without changing
+        its books or tags doesn't touch them.
+        """
+        note.referenced_books.set(self.cleaned_data.get("referenced_books_json", []))
+        note.set_tags(self.cleaned_data.get("tags_input", []))
+
+
+class NoteAutosaveForm(forms.Form):
+    """
+    Form validating a partial update of a note (see the note_autosave view).
+
+    Only the submitted fields are validated; the others are dropped, so `cleaned_data`
+    holds exactly the fields to update.
+    """
+
+    revision = forms.DateTimeField(required=False)
+    title = forms.CharField(max_length=Note._meta.get_field("title").max_length)
+    content = forms.CharField(required=False, strip=False)
+    # Edits to the content of `revision`, see `apply_text_delta`
+    content_delta = forms.JSONField()
+    note_type = forms.TypedChoiceField(coerce=int)
+
+    def __init__(self, data, **kwargs):
+        super().__init__(data, **kwargs)
+        self.unknown_fields = sorted(data.keys() - self.fields.keys())
+        for field_name in self.fields.keys() - data.keys():
+            del self.fields[field_name]
+
+        if "note_type" in self.fields:
+            self.fields["note_type"].choices = [(note_type.pk, note_type.name) for note_type in get_note_types()]
+
+    def clean(self):
+        cleaned_data = super().clean()
+
+        if self.unknown_fields:
+            raise ValidationError(f"These fields can't be autosaved: {', '.join(self.unknown_fields)}")
+        if not self.fields.keys() - {"revision"}:
+            raise ValidationError("Nothing to save.")
+        if "content_delta" in self.fields:
+            if "content" in self.fields:
+                self.add_error("content_delta", "Send either the content or a delta, not both.")
+            elif not cleaned_data.get("revision"):
+                self.add_error("content_delta", "A revision is required to apply a delta.")
+
+        return cleaned_data
+
+
+class DirectUploadForm(forms.Form):
+    """Form validating a request to upload a note's file straight to storage (see the note_upload_start view)"""
+
+    filename = forms.CharField(max_length=255)
+    content_type = forms.ChoiceField(
+        choices=[(content_type, content_type) for content_type in ALLOWED_IMAGE_TYPES + ALLOWED_DOCUMENT_TYPES],
+        error_messages={"invalid_choice": "File type '%(value)s' is not allowed."},
+    )
+    # The limit is the one the uploaded file is checked against once uploaded (see `_validate_uploaded_file`)
+    size = forms.IntegerField(
+        min_value=1,
+        max_value=Note.upload_size_limit(),
+        error_messages={
+            "max_value": "File too large. The maximum file size that can be uploaded is "
+            f"{Note.upload_size_limit() / (1024 * 1024)}MB"
+        },
+    )
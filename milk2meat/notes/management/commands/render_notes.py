@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+
+from milk2meat.core.utils.markdown import markdown_hash, parse_markdown
+from milk2meat.notes.models import Note
+
+
+class Command(BaseCommand):
+    help = "Re-render the stored HTML of notes whose content or markdown configuration has changed"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Re-render every note, even if its stored HTML is current",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of notes to fetch and update per batch (default: 500)",
+        )
+
+    def handle(self, *args, **options):
+        force = options["force"]
+        batch_size = options["batch_size"]
+
+        notes = Note.objects.only("id", "content", "content_hash").order_by("pk")
+
+        checked = 0
+        rendered = 0
+        batch = []
+        for note in notes.iterator(chunk_size=batch_size):
+            checked += 1
+            content_hash = markdown_hash(note.content)
+            if not force and content_hash == note.content_hash:
+                continue
+
+            note.content_html = parse_markdown(note.content)
+            note.content_hash = content_hash
+            batch.append(note)
+
+            if len(batch) >= batch_size:
+                rendered += self._flush(batch)
+                batch = []
+
+        rendered += self._flush(batch)
+
+        self.stdout.write(self.style.SUCCESS(f"Rendered {rendered} of {checked} notes."))
+
+    def _flush(self, batch):
+        # bulk_update doesn't touch `updated_at`, so re-rendering doesn't reorder notes
+        if batch:
+            Note.objects.bulk_update(batch, ["content_html", "content_hash"])
+        return len(batch)
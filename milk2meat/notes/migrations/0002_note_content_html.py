@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-17 21:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("notes", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="note",
+            name="content_hash",
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name="note",
+            name="content_html",
+            field=models.TextField(blank=True, editable=False),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2 on 2026-10-17 22:08
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.functions.text
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.operations import TrigramExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def populate_search_vectors(apps, schema_editor):
+    """Compute the search vector of existing notes (mirrors `note_search_vector`)"""
+    Note = apps.get_model("notes", "Note")
+    UUIDTaggedItem = apps.get_model("core", "UUIDTaggedItem")
+
+    tag_names = (
+        UUIDTaggedItem.objects.filter(
+            object_id=OuterRef("pk"),
+            content_type__app_label="notes",
+            content_type__model="note",
+        )
+        .values("object_id")
+        .annotate(names=StringAgg("tag__name", delimiter=" "))
+        .values("names")
+    )
+    Note.objects.update(
+        search_vector=SearchVector("title", weight="A", config="english")
+        + SearchVector(Subquery(tag_names), weight="B", config="english")
+        + SearchVector("content", weight="C", config="english")
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("core", "0001_initial"),
+        ("notes", "0002_note_content_html"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name="note",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="note",
+            index=django.contrib.postgres.indexes.GinIndex(fields=["search_vector"], name="note_search_vector_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="note",
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.text.Upper("title"), name="gin_trgm_ops"
+                ),
+                name="note_title_trgm_idx",
+            ),
+        ),
+        migrations.RunPython(populate_search_vectors, migrations.RunPython.noop),
+    ]
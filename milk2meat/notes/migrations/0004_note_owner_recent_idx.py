@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-17 22:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("notes", "0003_note_search_vector"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="note",
+            index=models.Index(fields=["owner", "-updated_at", "-created_at", "-id"], name="note_owner_recent_idx"),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2 on 2026-10-17 22:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+
+
+def populate_user_tag_stats(apps, schema_editor):
+    """Count the existing tagged notes per owner and tag"""
+    Note = apps.get_model("notes", "Note")
+    UserTagStat = apps.get_model("notes", "UserTagStat")
+    UUIDTaggedItem = apps.get_model("core", "UUIDTaggedItem")
+
+    counts = (
+        UUIDTaggedItem.objects.filter(content_type__app_label="notes", content_type__model="note")
+        .annotate(owner_id=Subquery(Note.objects.filter(pk=OuterRef("object_id")).values("owner_id")))
+        .filter(owner_id__isnull=False)
+        .values("owner_id", "tag_id")
+        .annotate(note_count=Count("id"))
+        .order_by()
+    )
+    UserTagStat.objects.bulk_create(
+        [UserTagStat(owner_id=row["owner_id"], tag_id=row["tag_id"], note_count=row["note_count"]) for row in counts],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("core", "0001_initial"),
+        ("notes", "0004_note_owner_recent_idx"),
+        ("taggit", "0006_rename_taggeditem_content_type_object_id_taggit_tagg_content_8fc721_idx"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserTagStat",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("note_count", models.PositiveIntegerField(default=0)),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="tag_stats",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "tag",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, related_name="user_stats", to="taggit.tag"
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [models.UniqueConstraint(fields=("owner", "tag"), name="unique_owner_tag_stat")],
+            },
+        ),
+        migrations.RunPython(populate_user_tag_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2 on 2026-10-17 22:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("notes", "0005_usertagstat"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="note",
+            index=models.Index(
+                fields=["owner", "slug"],
+                name="note_owner_slug_prefix_idx",
+                opclasses=["int8_ops", "varchar_pattern_ops"],
+            ),
+        ),
+    ]
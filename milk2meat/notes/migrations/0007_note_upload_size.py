@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 22:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("notes", "0006_note_owner_slug_prefix_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="note",
+            name="upload_size",
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -1,14 +1,24 @@
 import os
 import uuid
 
-from django.db import models
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.core.cache import cache
+from django.db import IntegrityError, models, transaction
+from django.db.models import F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Greatest, Lower, Upper
+from django.db.models.signals import m2m_changed
 from django.utils.text import slugify
 from taggit.managers import TaggableManager
+from taggit.models import Tag
 from upload_validator import FileTypeValidator
 
 from milk2meat.bible.models import Book
 from milk2meat.core.models import BaseModel, TypeMixin, UUIDTaggedItem
 from milk2meat.core.utils.constants import ALLOWED_DOCUMENT_TYPES, ALLOWED_IMAGE_TYPES
+from milk2meat.core.utils.markdown import markdown_hash, parse_markdown
+from milk2meat.core.utils.timing import record_count
 from milk2meat.core.utils.validators import FileSizeValidator
 
 
@@ -26,6 +36,34 @@ def user_note_upload_path(instance, filename):
     return f"notes/{instance.owner.id}/{instance.id}/{sanitized_filename}"
 
 
+def note_search_vector(config, title=None, content=None):
+    """
+    Build the expression computing a note's search vector, weighted by title (A), tags (B)
+    and content (C). It can be used to update a single note or all of them at once.
+
+    Args:
+        config (str): Postgres text search configuration, e.g. "english"
+        title (str): New title, for an UPDATE that also sets the title (the column would
+            still hold the old value). Defaults to the stored title.
+        content (str): New content, likewise
+    """
+    tag_names = (
+        UUIDTaggedItem.objects.filter(
+            object_id=OuterRef("pk"),
+            content_type__app_label="notes",
+            content_type__model="note",
+        )
+        .values("object_id")
+        .annotate(names=StringAgg("tag__name", delimiter=" "))
+        .values("names")
+    )
+    return (
+        SearchVector("title" if title is None else Value(title), weight="A", config=config)
+        + SearchVector(Subquery(tag_names), weight="B", config=config)
+        + SearchVector("content" if content is None else Value(content), weight="C", config=config)
+    )
+
+
 class NoteType(TypeMixin):
     """
     This allows for categorizing notes
@@ -47,10 +85,17 @@ class NoteManager(models.Manager):
 
 
 class Note(BaseModel):
+    # Postgres text search configuration used for `search_vector` and search queries
+    SEARCH_CONFIG = "english"
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     title = models.CharField(max_length=200)
     slug = models.SlugField(max_length=255)
     content = models.TextField(blank=True)
+    # Rendered (sanitized) HTML of `content`, refreshed on save. `content_hash` identifies the
+    # markdown and renderer configuration the HTML was produced from.
+    content_html = models.TextField(blank=True, editable=False)
+    content_hash = models.CharField(max_length=64, blank=True, editable=False)
     upload = models.FileField(
         upload_to=user_note_upload_path,
         blank=True,
@@ -63,43 +108,301 @@ class Note(BaseModel):
             FileSizeValidator(),
         ],
     )
+    # Size of `upload` in bytes, so that showing it doesn't query the storage (unknown for older notes)
+    upload_size = models.PositiveBigIntegerField(null=True, blank=True, editable=False)
     note_type = models.ForeignKey(NoteType, on_delete=models.PROTECT, related_name="notes")
     tags = TaggableManager(through=UUIDTaggedItem, blank=True)
     referenced_books = models.ManyToManyField(Book, blank=True, related_name="notes")
     owner = models.ForeignKey("users.User", on_delete=models.PROTECT, related_name="notes")
+    # Weighted full-text search vector over title, tags and content, maintained by signals
+    search_vector = SearchVectorField(null=True, editable=False)
 
     objects = NoteManager()
 
+    # Fields whose database values are remembered, to tell whether they changed (see `has_changed`):
+    # the title determines the slug, and validating the others is costly
+    TRACKED_FIELDS = ("title", "upload", "note_type", "owner")
+    EXPENSIVE_FIELDS = ("upload", "note_type", "owner")
+    # Number of slugs to try when concurrent saves take the generated ones
+    SLUG_ATTEMPTS = 3
+
     class Meta:
         ordering = ["-updated_at", "-created_at"]
         constraints = [models.UniqueConstraint(fields=["slug", "owner"], name="unique_owner_slug")]
+        indexes = [
+            # Backs the slug prefix lookups of `_generate_unique_slug`
+            models.Index(
+                fields=["owner", "slug"],
+                name="note_owner_slug_prefix_idx",
+                opclasses=["int8_ops", "varchar_pattern_ops"],
+            ),
+            # Backs the (cursor-paginated) notes list, see NoteListView
+            models.Index(fields=["owner", "-updated_at", "-created_at", "-id"], name="note_owner_recent_idx"),
+            GinIndex(fields=["search_vector"], name="note_search_vector_idx"),
+            # Trigram index backing case-insensitive substring matches on the title
+            GinIndex(OpClass(Upper("title"), name="gin_trgm_ops"), name="note_title_trgm_idx"),
+        ]
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_values()
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._remember_values(fields)
+
     def save(self, *args, **kwargs):
-        if not self.slug or (self.pk and self.title != self.__class__.objects.get(pk=self.pk).title):
+        generate_slug = not self.slug or self.has_changed("title")
+        if generate_slug:
             self.slug = self._generate_unique_slug()
-        self.full_clean()
-        super().save(*args, **kwargs)
+
+        # Only validate the costly fields (file sniffing, foreign key queries) if they changed.
+        # The primary key is generated, and slug clashes are handled by `_save_with_unique_slug`.
+        exclude = [field_name for field_name in self.EXPENSIVE_FIELDS if not self.has_changed(field_name)]
+        self.full_clean(exclude=["id", *exclude], validate_constraints=False)
+
+        update_fields = kwargs.get("update_fields")
+        if self.render_content() and update_fields is not None and "content" in update_fields:
+            update_fields = kwargs["update_fields"] = {*update_fields, "content_html", "content_hash"}
+
+        if self.has_changed("upload"):
+            # Files being uploaded know their size; the size of other files is looked up when needed
+            self.upload_size = self.upload.size if self.upload and not self.upload._committed else None
+            if self.upload_size:
+                record_count("form_upload_bytes", self.upload_size)
+            if update_fields is not None and "upload" in update_fields:
+                update_fields = kwargs["update_fields"] = {*update_fields, "upload_size"}
+
+        # Compute the search vector in the UPDATE itself (new notes get theirs after the INSERT)
+        update_search_vector = not self._state.adding and (
+            update_fields is None or {"title", "content"} & set(update_fields)
+        )
+        if update_search_vector:
+            self.search_vector = note_search_vector(self.SEARCH_CONFIG, title=self.title, content=self.content)
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "search_vector"}
+
+        if generate_slug:
+            self._save_with_unique_slug(*args, **kwargs)
+        else:
+            super().save(*args, **kwargs)
+
+        if update_search_vector:
+            # Drop the expression, the stored value is loaded on access
+            del self.search_vector
+        self._remember_values(kwargs.get("update_fields"))
+
+    def _save_with_unique_slug(self, *args, **kwargs):
+        """
+        Save the note with its newly generated slug, generating another one if a concurrent
+        save took it in the meantime (i.e. the `unique_owner_slug` constraint is violated).
+        """
+        for attempt in range(1, self.SLUG_ATTEMPTS + 1):
+            try:
+                with transaction.atomic():
+                    super().save(*args, **kwargs)
+                return
+            except IntegrityError as e:
+                if attempt == self.SLUG_ATTEMPTS or "unique_owner_slug" not in str(e):
+                    raise
+                self.slug = self._generate_unique_slug()
+
+    def has_changed(self, field_name):
+        """
+        Check whether a tracked field (see TRACKED_FIELDS) differs from its value in the database.
+
+        Always True for new notes, and for fields whose value wasn't loaded.
+        """
+        loaded_values = getattr(self, "_loaded_values", {})
+        if self._state.adding or field_name not in loaded_values:
+            return True
+        return self._get_tracked_value(field_name) != loaded_values[field_name]
+
+    def _get_tracked_value(self, field_name):
+        field = self._meta.get_field(field_name)
+        value = getattr(self, field.attname)
+        if isinstance(field, models.FileField):
+            return value.name or ""
+        return value
+
+    def _remember_values(self, field_names=None):
+        """Remember the current values of the tracked fields (or the given ones) as their database values"""
+        if not hasattr(self, "_loaded_values"):
+            self._loaded_values = {}
+        deferred = self.get_deferred_fields()
+        for field_name in self.TRACKED_FIELDS:
+            attname = self._meta.get_field(field_name).attname
+            if attname in deferred:
+                continue
+            if field_names is None or field_name in field_names or attname in field_names:
+                self._loaded_values[field_name] = self._get_tracked_value(field_name)
+
+    def render_content(self):
+        """
+        Refresh the stored HTML if the content (or the renderer configuration) has changed.
+
+        Returns:
+            bool: True if the content was re-rendered, False if the stored HTML was current
+        """
+        content_hash = markdown_hash(self.content)
+        if content_hash == self.content_hash:
+            return False
+
+        self.content_html = parse_markdown(self.content)
+        self.content_hash = content_hash
+        return True
+
+    def set_content_html(self, html):
+        """
+        Store HTML that was already rendered from the current content (e.g. during form
+        validation), so that saving doesn't render the content again.
+
+        Args:
+            html: Sanitized HTML produced by `parse_markdown(self.content)`
+        """
+        self.content_html = html
+        self.content_hash = markdown_hash(self.content)
+
+    def get_content_html(self):
+        """
+        Get the sanitized HTML for the note content.
+
+        The stored HTML is served as-is when current; otherwise (e.g. the renderer
+        configuration changed and `render_notes` hasn't run yet) the content is rendered on the fly.
+        """
+        if self.content_hash == markdown_hash(self.content):
+            return self.content_html
+        return parse_markdown(self.content)
+
+    def update_search_vector(self):
+        """Recompute the stored search vector from the saved title, tags and content."""
+        Note.objects.filter(pk=self.pk).update(search_vector=note_search_vector(self.SEARCH_CONFIG))
+
+    def set_tags(self, names):
+        """
+        Set the note's tags to the given tag names, only touching the tags that changed.
+
+        Unlike `tags.set()`, existing tags are resolved with a single query (rather than one per
+        name) and the added tagged items are inserted in bulk. Names are compared case-insensitively
+        (see TAGGIT_CASE_INSENSITIVE), so nothing is written when the submitted tags are unchanged.
+        The usual `m2m_changed` signals are sent for the added and removed tags.
+
+        Args:
+            names: Tag names the note should be tagged with
+        """
+        through = self.tags.through
+        lookup_kwargs = through.lookup_kwargs(self)
+
+        wanted = {}
+        for name in names:
+            wanted.setdefault(name.lower(), name)
+
+        current = dict(
+            through.objects.filter(**lookup_kwargs)
+            .annotate(lower_name=Lower("tag__name"))
+            .values_list("lower_name", "tag_id")
+        )
+        removed_ids = {tag_id for lower_name, tag_id in current.items() if lower_name not in wanted}
+        added_names = [name for lower_name, name in wanted.items() if lower_name not in current]
+        if not removed_ids and not added_names:
+            return
+
+        # Any prefetched tags are stale from here on
+        getattr(self, "_prefetched_objects_cache", {}).pop(self.tags.prefetch_cache_name, None)
+
+        if removed_ids:
+            m2m_changed.send(
+                sender=through, action="pre_remove", instance=self, reverse=False, model=Tag, pk_set=removed_ids
+            )
+            through.objects.filter(**lookup_kwargs, tag_id__in=removed_ids).delete()
+            m2m_changed.send(
+                sender=through, action="post_remove", instance=self, reverse=False, model=Tag, pk_set=removed_ids
+            )
+
+        if added_names:
+            # Resolve the existing tags in one query (the oldest one wins if several only differ by case)
+            tags = {}
+            existing = Tag.objects.annotate(lower_name=Lower("name")).filter(
+                lower_name__in=[name.lower() for name in added_names]
+            )
+            for tag in existing.order_by("-pk"):
+                tags[tag.lower_name] = tag
+            # New tags are created one by one, as taggit generates their (unique) slugs on save
+            for name in added_names:
+                if name.lower() not in tags:
+                    tags[name.lower()], _ = Tag.objects.get_or_create(name__iexact=name, defaults={"name": name})
+
+            added_ids = {tag.pk for tag in tags.values()}
+            m2m_changed.send(
+                sender=through, action="pre_add", instance=self, reverse=False, model=Tag, pk_set=added_ids
+            )
+            through.objects.bulk_create([through(**lookup_kwargs, tag_id=tag_id) for tag_id in added_ids])
+            m2m_changed.send(
+                sender=through, action="post_add", instance=self, reverse=False, model=Tag, pk_set=added_ids
+            )
 
     def _generate_unique_slug(self):
-        """Generate a unique slug by appending a number if needed."""
+        """
+        Generate a slug that is unique among the owner's notes, appending a number if needed.
+
+        The owner's slugs the new one could collide with (`slug` and `slug-N`) are fetched with
+        a single query (the `slug-` prefix match uses the slug prefix index), and the lowest free
+        number is picked.
+        """
         slug = slugify(self.title)
-        unique_slug = slug
-        num = 1
 
         # Skip owner uniqueness check if owner is not set
         if not hasattr(self, "owner") or self.owner is None:
-            return unique_slug
+            return slug
 
-        # Check uniqueness only within this user's notes
-        while self.__class__.objects.filter(slug=unique_slug, owner=self.owner).exists():
+        taken = set(
+            self.__class__.objects.filter(Q(slug=slug) | Q(slug__startswith=f"{slug}-"), owner=self.owner)
+            .exclude(pk=self.pk)
+            .order_by()
+            .values_list("slug", flat=True)
+        )
+        unique_slug = slug
+        num = 1
+        while unique_slug in taken:
             unique_slug = f"{slug}-{num}"
             num += 1
 
         return unique_slug
 
+    @property
+    def file_size(self):
+        """Size of the uploaded file in bytes (only queried from the storage for older notes)"""
+        if not self.upload:
+            return None
+        if self.upload_size is None:
+            return self.upload.size
+        return self.upload_size
+
+    @classmethod
+    def upload_size_limit(cls):
+        """Maximum size of uploaded files in bytes (the limit of the `FileSizeValidator` of `upload`)"""
+        validators = cls._meta.get_field("upload").validators
+        return next(validator.limit for validator in validators if isinstance(validator, FileSizeValidator))
+
+    @staticmethod
+    def file_url_cache_key(note_id):
+        """Cache key of the URL of a note's file, see `serve_protected_file`"""
+        return f"note-file-url:{note_id}"
+
+    def forget_file_url(self):
+        """
+        Forget the cached URL of the note's file, which may have changed, once the transaction commits.
+
+        A request reading the note before the commit could otherwise cache the old URL again.
+        """
+        key = self.file_url_cache_key(self.pk)
+        transaction.on_commit(lambda: cache.delete(key))
+
     def get_secure_file_url(self, user):
         """
         Get a secure URL for the uploaded file, but only if the user has permission.
@@ -121,3 +424,58 @@ class Note(BaseModel):
         # In dev mode, this will return a regular file URL
         # In production, this will use S3Boto3Storage which returns a signed URL
         return self.upload.url
+
+
+class UserTagStat(models.Model):
+    """
+    Number of notes each user has tagged with each tag.
+
+    Maintained by signal handlers whenever note tags change or notes are deleted, so that the
+    tag sidebar and tag page don't have to aggregate the tagged items on every request.
+    """
+
+    owner = models.ForeignKey("users.User", on_delete=models.CASCADE, related_name="tag_stats")
+    tag = models.ForeignKey("taggit.Tag", on_delete=models.CASCADE, related_name="user_stats")
+    note_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=["owner", "tag"], name="unique_owner_tag_stat")]
+
+    def __str__(self):
+        return f"{self.tag} ({self.note_count})"
+
+    @classmethod
+    def get_tags_for_user(cls, user):
+        """
+        Get the tags used by the user's notes, annotated with their `note_count` (a single indexed read).
+
+        Returns:
+            QuerySet: Tags ordered by name
+        """
+        return (
+            Tag.objects.filter(user_stats__owner=user, user_stats__note_count__gt=0)
+            .annotate(note_count=F("user_stats__note_count"))
+            .order_by("name")
+        )
+
+    @classmethod
+    def adjust(cls, owner_id, tag_ids, delta):
+        """
+        Add `delta` to the user's note count of each of the given tags.
+
+        Args:
+            owner_id: ID of the user owning the tagged (or untagged) note
+            tag_ids: IDs of the tags added to (delta > 0) or removed from (delta < 0) the note
+            delta (int): Change in the number of notes
+        """
+        if not tag_ids:
+            return
+
+        with transaction.atomic():
+            if delta > 0:
+                cls.objects.bulk_create(
+                    [cls(owner_id=owner_id, tag_id=tag_id) for tag_id in tag_ids], ignore_conflicts=True
+                )
+            cls.objects.filter(owner_id=owner_id, tag_id__in=tag_ids).update(
+                note_count=Greatest(F("note_count") + delta, 0)
+            )
@@ -0,0 +1,56 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from milk2meat.core.search import mark_search_entries_stale
+from milk2meat.notes.models import Note, NoteType, UserTagStat
+
+
+@receiver(post_save, sender=Note)
+def update_note_search_vector(sender, instance, created, raw=False, **kwargs):
+    """Compute the search vector of new notes (`Note.save` updates it along with existing notes)"""
+    if created and not raw:
+        instance.update_search_vector()
+
+
+@receiver(post_save, sender=NoteType)
+def mark_note_search_entries_stale(sender, instance, created, raw=False, **kwargs):
+    """The search entries of notes store the name of their type, so have them re-indexed when it changes"""
+    if not created and not raw:
+        mark_search_entries_stale(Note.objects.filter(note_type=instance))
+
+
+@receiver(m2m_changed, sender=Note.tags.through)
+def update_note_search_vector_on_tag_change(sender, instance, action, **kwargs):
+    """Keep the search vector current whenever a note's tags change"""
+    if action in ("post_add", "post_remove", "post_clear") and isinstance(instance, Note):
+        instance.update_search_vector()
+
+
+@receiver(m2m_changed, sender=Note.tags.through)
+def update_user_tag_stats(sender, instance, action, pk_set=None, **kwargs):
+    """Keep the owner's tag statistics current whenever a note's tags change"""
+    if not isinstance(instance, Note):
+        return
+
+    if action == "post_add":
+        UserTagStat.adjust(instance.owner_id, pk_set, 1)
+    elif action == "post_remove":
+        UserTagStat.adjust(instance.owner_id, pk_set, -1)
+    elif action == "pre_clear":
+        # The tags are gone by the time of "post_clear"
+        instance._cleared_tag_ids = set(instance.tags.values_list("id", flat=True))
+    elif action == "post_clear":
+        UserTagStat.adjust(instance.owner_id, instance.__dict__.pop("_cleared_tag_ids", None), -1)
+
+
+@receiver(pre_delete, sender=Note)
+def update_user_tag_stats_on_delete(sender, instance, **kwargs):
+    """Keep the owner's tag statistics current when a note (and with it its tagged items) is deleted"""
+    UserTagStat.adjust(instance.owner_id, set(instance.tags.values_list("id", flat=True)), -1)
+
+
+@receiver(post_save, sender=Note)
+@receiver(post_delete, sender=Note)
+def forget_note_file_url(sender, instance, **kwargs):
+    """Forget the cached URL of the note's file (see `serve_protected_file`), which may have changed"""
+    instance.forget_file_url()
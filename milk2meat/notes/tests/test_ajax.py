@@ -9,6 +9,7 @@ and editing, which allows users to save notes without page reloads. The tests co
 3. Updating existing notes via AJAX
 4. Permission validation (users can only edit their own notes)
 5. Validation error handling
+6. Autosaving partial updates (PATCH)
 """
 
 import json
@@ -16,8 +17,12 @@ import uuid
 
 import pytest
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
+from milk2meat.bible.factories import BookFactory
+from milk2meat.core.utils.markdown import markdown_hash
 from milk2meat.notes.factories import NoteFactory, NoteTypeFactory
 from milk2meat.notes.models import Note
 from milk2meat.users.factories import UserFactory
@@ -187,6 +192,26 @@ class TestNoteAjaxViews:
         assert note.upload is not None
         assert "test_file.pdf" in note.upload.name
 
+    def test_create_note_ajax_with_rejected_upload(self, client):
+        """Test that uploads rejected while they were received are reported as upload errors"""
+        user = UserFactory()
+        client.force_login(user)
+        note_type = NoteTypeFactory()
+
+        form_data = {
+            "title": "Note with File",
+            "note_type": note_type.id,
+            "content": "This note has a file attachment",
+            "upload": SimpleUploadedFile("script.pdf", b"#!/bin/sh\necho hello\n", content_type="application/pdf"),
+            "referenced_books_json": json.dumps([]),
+        }
+        response = client.post(reverse("notes:note_create_ajax"), form_data, format="multipart")
+
+        assert response.status_code == 400
+        data = json.loads(response.content)
+        assert list(data["errors"]) == ["upload"]
+        assert not Note.objects.filter(owner=user).exists()
+
     def test_update_note_ajax_with_file_deletion(self, client):
         """Test successful deletion of a file attachment via AJAX"""
         user = UserFactory()
@@ -228,3 +253,225 @@ class TestNoteAjaxViews:
         # Verify file was deleted
         note.refresh_from_db()
         assert note.upload is None or note.upload == ""
+
+
+class TestNoteAjaxRelations:
+    """Saving a note only writes the tag and book memberships that changed"""
+
+    M2M_TABLES = ('"core_uuidtaggeditem"', '"notes_note_referenced_books"', '"taggit_tag"')
+    WRITES = ("INSERT INTO", "DELETE FROM")
+
+    @pytest.fixture
+    def note(self):
+        note = NoteFactory(title="Romans", content="Justified by faith")
+        note.tags.add("faith", "grace")
+        note.referenced_books.add(BookFactory(title="Romans", number=45), BookFactory(title="Galatians", number=48))
+        return note
+
+    def save(self, client, note, tags, books):
+        client.force_login(note.owner)
+        form_data = {
+            "title": note.title,
+            "note_type": note.note_type_id,
+            "content": note.content + " alone",
+            "tags_input": ",".join(tags),
+            "referenced_books_json": json.dumps([{"id": book.id, "title": book.title} for book in books]),
+        }
+        url = reverse("notes:note_update_ajax", kwargs={"pk": note.pk})
+        with CaptureQueriesContext(connection) as queries:
+            response = client.post(url, form_data)
+        assert response.status_code == 200
+        return [
+            query["sql"]
+            for query in queries
+            if query["sql"].startswith(tuple(f"{verb} {table}" for verb in self.WRITES for table in self.M2M_TABLES))
+        ]
+
+    def test_unchanged_save(self, client, note):
+        """Test that saving unchanged tags and books writes no memberships"""
+        books = list(note.referenced_books.all())
+
+        assert self.save(client, note, ["grace", "faith"], books) == []
+        assert sorted(note.tags.names()) == ["faith", "grace"]
+        assert set(note.referenced_books.all()) == set(books)
+
+    def test_add_one(self, client, note):
+        """Test that adding a tag and a book inserts only those"""
+        books = [*note.referenced_books.all(), BookFactory(title="Ephesians", number=49)]
+
+        writes = self.save(client, note, ["faith", "grace", "hope"], books)
+        assert [sql.split(" ")[0] for sql in writes] == ["INSERT", "INSERT", "INSERT"]  # book, new tag, tagged item
+        assert sorted(note.tags.names()) == ["faith", "grace", "hope"]
+        assert set(note.referenced_books.all()) == set(books)
+
+    def test_remove_one(self, client, note):
+        """Test that removing a tag and a book deletes only those"""
+        books = list(note.referenced_books.filter(title="Romans"))
+
+        writes = self.save(client, note, ["faith"], books)
+        assert [sql.split(" ")[0] for sql in writes] == ["DELETE", "DELETE"]
+        assert list(note.tags.names()) == ["faith"]
+        assert list(note.referenced_books.all()) == books
+
+
+class TestNoteAutosave:
+    def autosave(self, client, note, data):
+        url = reverse("notes:note_autosave", kwargs={"pk": note.pk})
+        return client.patch(url, json.dumps(data), content_type="application/json")
+
+    @pytest.fixture
+    def note(self, client):
+        note = NoteFactory(title="Psalm 23", content="The Lord is my shepherd")
+        client.force_login(note.owner)
+        return note
+
+    def test_login_required(self, client):
+        """Test that login is required for autosaving"""
+        response = self.autosave(client, NoteFactory(), {"title": "Psalm 23"})
+        assert response.status_code == 302
+
+    def test_patch_only(self, client, note):
+        """Test that the endpoint only accepts PATCH requests"""
+        url = reverse("notes:note_autosave", kwargs={"pk": note.pk})
+        assert client.post(url, {"title": "Psalm 23"}).status_code == 405
+
+    def test_autosave_content(self, client, note):
+        """Test that autosaving the content also refreshes the derived columns"""
+        response = self.autosave(client, note, {"content": "The Lord is my **shepherd**"})
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["success"] is True
+        note.refresh_from_db()
+        assert note.content == "The Lord is my **shepherd**"
+        assert note.content_html == "<p>The Lord is my <strong>shepherd</strong></p>"
+        assert note.content_hash == markdown_hash(note.content)
+        assert "'shepherd':" in note.search_vector
+        assert data["revision"] == note.updated_at.isoformat()
+
+    def test_autosave_is_a_single_update(self, client, note):
+        """Test that the note is autosaved with a single UPDATE (and without reading it)"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.autosave(client, note, {"content": "I shall not want"})
+
+        assert response.status_code == 200
+        note_queries = [query["sql"] for query in queries if '"notes_note"' in query["sql"]]
+        assert len(note_queries) == 1
+        assert note_queries[0].startswith('UPDATE "notes_note" SET "content" =')
+
+    def test_autosave_title(self, client, note):
+        """Test that autosaving the title updates the slug and search vector"""
+        response = self.autosave(client, note, {"title": "The Shepherd Psalm"})
+
+        assert response.status_code == 200
+        note.refresh_from_db()
+        assert note.title == "The Shepherd Psalm"
+        assert note.slug == "the-shepherd-psalm"
+        assert Note.objects.filter(pk=note.pk, search_vector="shepherd psalm").exists()
+
+    def test_autosave_title_slug_clash(self, client, note, mocker):
+        """Test that the slug is generated again if a concurrent save took it"""
+        NoteFactory(title="Sermon", owner=note.owner)
+        mocker.patch.object(Note, "_generate_unique_slug", side_effect=["sermon", "sermon-2"])
+
+        response = self.autosave(client, note, {"title": "Sermon"})
+
+        assert response.status_code == 200
+        note.refresh_from_db()
+        assert note.slug == "sermon-2"
+
+    def test_autosave_note_type(self, client, note):
+        """Test that the note type can be autosaved"""
+        note_type = NoteTypeFactory()
+
+        response = self.autosave(client, note, {"note_type": note_type.pk})
+
+        assert response.status_code == 200
+        note.refresh_from_db()
+        assert note.note_type == note_type
+
+    def test_autosave_content_delta(self, client, note):
+        """Test that a delta is applied to the content of the given revision"""
+        revision = note.updated_at.isoformat()
+
+        response = self.autosave(
+            client, note, {"revision": revision, "content_delta": [[23, 23, "; I shall not want"]]}
+        )
+
+        assert response.status_code == 200
+        note.refresh_from_db()
+        assert note.content == "The Lord is my shepherd; I shall not want"
+
+        # The new revision can be used for the next delta
+        response = self.autosave(client, note, {"revision": response.json()["revision"], "content_delta": [[0, 4, ""]]})
+        assert response.status_code == 200
+        note.refresh_from_db()
+        assert note.content == "Lord is my shepherd; I shall not want"
+
+    def test_autosave_stale_revision(self, client, note):
+        """Test that changes made against an old revision are rejected"""
+        revision = note.updated_at.isoformat()
+        note.content = "Changed in another tab"
+        note.save()
+
+        for data in ({"content": "Overwrite"}, {"content_delta": [[0, 0, "Overwrite"]]}):
+            response = self.autosave(client, note, {"revision": revision, **data})
+            assert response.status_code == 409
+            assert response.json()["revision"] == note.updated_at.isoformat()
+
+        note.refresh_from_db()
+        assert note.content == "Changed in another tab"
+
+    def test_autosave_other_users_note(self, client, note):
+        """Test that users can't autosave other users' notes"""
+        other_note = NoteFactory()
+
+        response = self.autosave(client, other_note, {"title": "Mine now"})
+
+        assert response.status_code == 404
+        other_note.refresh_from_db()
+        assert other_note.title != "Mine now"
+
+    @pytest.mark.parametrize(
+        "data,field",
+        [
+            ({"title": ""}, "title"),
+            ({"title": "x" * 201}, "title"),
+            ({"note_type": 0}, "note_type"),
+            ({"revision": "yesterday", "content": "x"}, "revision"),
+            ({"content_delta": [[0, 0, "x"]]}, "content_delta"),
+            ({"content": "x", "content_delta": []}, "content_delta"),
+            ({"tags_input": "faith"}, "__all__"),
+            ({}, "__all__"),
+        ],
+    )
+    def test_autosave_validation_errors(self, client, note, data, field):
+        """Test that invalid changes are rejected"""
+        response = self.autosave(client, note, data)
+
+        assert response.status_code == 400
+        assert field in response.json()["errors"]
+
+    def test_autosave_invalid_delta(self, client, note):
+        """Test that deltas that don't fit the content are rejected"""
+        response = self.autosave(
+            client, note, {"revision": note.updated_at.isoformat(), "content_delta": [[0, 1000, ""]]}
+        )
+
+        assert response.status_code == 400
+        assert "content_delta" in response.json()["errors"]
+
+    def test_revision_from_full_save(self, client, note):
+        """Test that the revision returned by note_save_ajax can be used to autosave"""
+        form_data = {
+            "title": note.title,
+            "note_type": note.note_type_id,
+            "content": "The Lord is my shepherd",
+            "tags_input": "",
+            "referenced_books_json": "[]",
+        }
+        response = client.post(reverse("notes:note_update_ajax", kwargs={"pk": note.pk}), form_data)
+        revision = response.json()["revision"]
+
+        response = self.autosave(client, note, {"revision": revision, "content_delta": [[0, 0, "# Psalm 23\n\n"]]})
+        assert response.status_code == 200
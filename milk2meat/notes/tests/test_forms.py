@@ -5,6 +5,7 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from django.forms import ValidationError
 
 from milk2meat.bible.factories import BookFactory
+from milk2meat.core.utils import markdown as markdown_utils
 from milk2meat.notes.factories import NoteFactory, NoteTypeFactory
 from milk2meat.notes.forms import NoteForm, NoteTypeForm
 from milk2meat.notes.models import NoteType
@@ -215,6 +216,29 @@ class TestNoteForm:
         assert {tag.name for tag in updated_note.tags.all()} == {"updated", "tags"}
         assert updated_note.referenced_books.count() == 0  # References removed
 
+    def test_content_rendered_once_on_save(self, mocker):
+        """Test that the HTML rendered during validation is stored without rendering again"""
+        user = UserFactory()
+        note_type = NoteTypeFactory()
+        parse_spy = mocker.spy(markdown_utils, "parse_markdown")
+        mocker.patch("milk2meat.notes.forms.parse_markdown", parse_spy)
+        mocker.patch("milk2meat.notes.models.parse_markdown", parse_spy)
+
+        form_data = {
+            "title": "Rendered Once",
+            "note_type": note_type.id,
+            "content": "# Heading\n\nSome *content*",
+        }
+        form = NoteForm(data=form_data, user=user)
+        assert form.is_valid(), f"Form errors: {form.errors}"
+        form.instance.owner = user
+        note = form.save()
+
+        assert parse_spy.call_count == 1
+        note.refresh_from_db()
+        assert note.content_html == "<h1>Heading</h1>\n<p>Some <em>content</em></p>"
+        assert note.get_content_html() == note.content_html
+
 
 class TestNoteTypeForm:
     def test_form_valid(self):
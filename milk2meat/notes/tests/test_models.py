@@ -1,10 +1,15 @@
 import pytest
-from django.db import IntegrityError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, connection
+from django.test.utils import CaptureQueriesContext
 from django.utils.text import slugify
+from taggit.models import Tag
+from upload_validator import FileTypeValidator
 
 from milk2meat.bible.factories import BookFactory
+from milk2meat.core.utils.markdown import markdown_hash
 from milk2meat.notes.factories import NoteFactory, NoteTypeFactory
-from milk2meat.notes.models import Note, NoteType
+from milk2meat.notes.models import Note, NoteType, UserTagStat
 from milk2meat.users.factories import UserFactory
 
 pytestmark = pytest.mark.django_db
@@ -74,6 +79,63 @@ class TestNoteModel:
         note4 = NoteFactory(title="My Note", owner=user1, note_type=note_type)
         assert note4.slug == "my-note-2"
 
+    def test_unique_slug_is_allocated_with_one_query(self, django_assert_num_queries):
+        """Test that the next free slug is found with a single query, however many notes collide"""
+        user = UserFactory()
+        note_type = NoteTypeFactory()
+        notes = [NoteFactory(title="Sunday Sermon", owner=user, note_type=note_type) for _ in range(5)]
+        NoteFactory(title="Sunday Sermons", owner=user, note_type=note_type)
+        assert notes[-1].slug == "sunday-sermon-4"
+
+        note = Note(title="Sunday Sermon", owner=user, note_type=note_type)
+        with django_assert_num_queries(1):
+            assert note._generate_unique_slug() == "sunday-sermon-5"
+
+        # Freed numbers are reused
+        notes[2].delete()
+        assert note._generate_unique_slug() == "sunday-sermon-2"
+
+    def test_unique_slug_ignores_longer_slugs(self):
+        """Test that slugs merely sharing the prefix (e.g. "sunday-sermons") aren't fetched"""
+        user = UserFactory()
+        note_type = NoteTypeFactory()
+        NoteFactory(title="Sunday Sermons", owner=user, note_type=note_type)
+        note = Note(title="Sunday Sermon", owner=user, note_type=note_type)
+
+        with CaptureQueriesContext(connection) as queries:
+            assert note._generate_unique_slug() == "sunday-sermon"
+        assert "'sunday-sermon-%'" in queries[0]["sql"]
+
+    def test_slug_is_kept_when_title_keeps_it(self):
+        """Test that a title change yielding the same slug doesn't clash with the note itself"""
+        note = NoteFactory(title="My Note")
+
+        note.title = "My note"
+        note.save()
+
+        assert note.slug == "my-note"
+
+    def test_slug_clash_is_retried(self, mocker):
+        """Test that a slug taken by a concurrent save is replaced by another one"""
+        user = UserFactory()
+        NoteFactory(title="Sermon", owner=user)
+        # Simulate a concurrent save taking the generated slug before this note is saved
+        mocker.patch.object(Note, "_generate_unique_slug", side_effect=["sermon", "sermon-1"])
+
+        note = NoteFactory(title="Sermon", owner=user)
+
+        assert note.slug == "sermon-1"
+        assert Note.objects.filter(owner=user).count() == 2
+
+    def test_slug_clash_gives_up(self, mocker):
+        """Test that saving fails if the generated slugs keep clashing"""
+        user = UserFactory()
+        NoteFactory(title="Sermon", owner=user)
+        mocker.patch.object(Note, "_generate_unique_slug", return_value="sermon")
+
+        with pytest.raises(IntegrityError):
+            NoteFactory(title="Sermon", owner=user)
+
     def test_note_with_referenced_books(self):
         """Test that a note can reference books"""
         book1 = BookFactory(title="Genesis")
@@ -133,6 +195,191 @@ class TestNoteModel:
         # Slug should be updated
         assert note.slug == "new-title"
 
+    def test_has_changed(self):
+        """Test that changes to the tracked fields are detected against the database values"""
+        note = NoteFactory(title="Original Title")
+        assert not note.has_changed("title")
+
+        note = Note.objects.get(pk=note.pk)
+        assert not note.has_changed("title")
+        assert not note.has_changed("upload")
+        assert not note.has_changed("note_type")
+
+        note.title = "New Title"
+        note.note_type = NoteTypeFactory()
+        assert note.has_changed("title")
+        assert note.has_changed("note_type")
+
+        note.refresh_from_db()
+        assert not note.has_changed("title")
+        assert not note.has_changed("note_type")
+
+        note.title = "New Title"
+        note.save()
+        assert not note.has_changed("title")
+
+    def test_has_changed_for_new_and_deferred_values(self):
+        """Test that fields of new notes and deferred fields count as changed"""
+        assert Note(title="Unsaved").has_changed("title")
+
+        note = Note.objects.only("id", "content").get(pk=NoteFactory().pk)
+        assert note.has_changed("title")
+
+    def test_content_save_is_a_single_update(self):
+        """Test that saving a note with only new content is a single UPDATE of the note"""
+        note = Note.objects.get(pk=NoteFactory(content="Before").pk)
+
+        note.content = "Grace upon grace"
+        with CaptureQueriesContext(connection) as queries:
+            note.save()
+
+        note_queries = [query["sql"] for query in queries if '"notes_note"' in query["sql"]]
+        assert len(note_queries) == 1
+        assert note_queries[0].startswith('UPDATE "notes_note"')
+        assert "'grace':" in note.search_vector
+
+    def test_upload_is_only_validated_when_changed(self, mocker):
+        """Test that the upload validators only run when the upload changes"""
+        note = NoteFactory()
+        validator = mocker.patch.object(FileTypeValidator, "__call__")
+
+        note.content = "New content"
+        note.save()
+        validator.assert_not_called()
+
+        note.upload = SimpleUploadedFile("notes.pdf", b"%PDF-1.4", content_type="application/pdf")
+        note.save()
+        validator.assert_called_once()
+
+    def test_upload_size_is_stored(self):
+        """Test that the size of an uploaded file is stored with the note, and forgotten with the file"""
+        note = NoteFactory(upload=SimpleUploadedFile("notes.pdf", b"%PDF-1.4", content_type="application/pdf"))
+        note = Note.objects.get(pk=note.pk)
+        assert note.upload_size == note.file_size == 8
+
+        note.upload = None
+        note.save(update_fields=["upload"])
+        note.refresh_from_db()
+        assert note.upload_size is None
+        assert note.file_size is None
+
+    def test_file_size_of_older_notes(self):
+        """Test that the file size is looked up in the storage when it wasn't stored"""
+        note = NoteFactory(upload=SimpleUploadedFile("notes.pdf", b"%PDF-1.4", content_type="application/pdf"))
+        Note.objects.filter(pk=note.pk).update(upload_size=None)
+
+        assert Note.objects.get(pk=note.pk).file_size == 8
+
+    def test_content_html_is_rendered_on_save(self):
+        """Test that the rendered HTML is stored when a note is saved"""
+        note = NoteFactory(content="# Heading\n\nSome **bold** text")
+
+        assert "<h1>Heading</h1>" in note.content_html
+        assert "<strong>bold</strong>" in note.content_html
+        assert note.content_hash == markdown_hash(note.content)
+
+        # Editing the content refreshes the stored HTML
+        note.content = "Plain text"
+        note.save()
+        note.refresh_from_db()
+        assert note.content_html == "<p>Plain text</p>"
+        assert note.content_hash == markdown_hash("Plain text")
+
+    def test_content_html_is_rendered_with_update_fields(self):
+        """Test that saving only the content also saves the rendered HTML"""
+        note = NoteFactory(content="Before")
+
+        note.content = "After"
+        note.save(update_fields=["content"])
+        note.refresh_from_db()
+
+        assert note.content_html == "<p>After</p>"
+
+    def test_get_content_html_uses_stored_html(self, mocker):
+        """Test that current stored HTML is served without rendering"""
+        note = NoteFactory(content="Some *text*")
+        mock_parse = mocker.patch("milk2meat.notes.models.parse_markdown")
+
+        assert note.get_content_html() == "<p>Some <em>text</em></p>"
+        mock_parse.assert_not_called()
+
+    def test_get_content_html_renders_stale_html(self):
+        """Test that stale stored HTML is not served"""
+        note = NoteFactory(content="Some *text*")
+        Note.objects.filter(pk=note.pk).update(content_html="<p>stale</p>", content_hash="outdated")
+        note.refresh_from_db()
+
+        assert note.get_content_html() == "<p>Some <em>text</em></p>"
+
+    def test_search_vector_is_updated_on_save(self):
+        """Test that the search vector is weighted by title and content on save"""
+        note = NoteFactory(title="Grace", content="Justification by faith")
+        note.refresh_from_db()
+        assert "'grace':1A" in note.search_vector
+        assert "'faith':4C" in note.search_vector
+
+        note.title = "Mercy"
+        note.save()
+        assert Note.objects.filter(pk=note.pk, search_vector="mercy").exists()
+        assert not Note.objects.filter(pk=note.pk, search_vector="grace").exists()
+
+    def test_search_vector_is_updated_on_tag_change(self):
+        """Test that adding and removing tags refreshes the search vector"""
+        note = NoteFactory(title="Study", content="")
+
+        note.tags.add("atonement")
+        note.refresh_from_db()
+        assert "'aton':2B" in note.search_vector
+
+        note.tags.clear()
+        assert not Note.objects.filter(pk=note.pk, search_vector="atonement").exists()
+
+    def test_set_tags(self):
+        """Test that set_tags adds and removes only the changed tags"""
+        note = NoteFactory()
+        note.tags.add("grace", "faith")
+
+        note.set_tags(["Faith", "hope", "hope"])
+        assert sorted(note.tags.names()) == ["faith", "hope"]
+        assert "'hope':" in Note.objects.get(pk=note.pk).search_vector
+
+    def test_set_tags_reuses_existing_tags(self):
+        """Test that set_tags resolves existing tags case-insensitively instead of creating new ones"""
+        NoteFactory().tags.add("Prayer")
+        note = NoteFactory()
+
+        note.set_tags(["prayer"])
+        assert list(note.tags.names()) == ["Prayer"]
+        assert Tag.objects.count() == 1
+
+    def test_set_tags_unchanged(self, django_assert_num_queries):
+        """Test that setting the same tags only reads the current ones"""
+        note = NoteFactory()
+        note.tags.add("grace", "faith")
+
+        with django_assert_num_queries(1):
+            note.set_tags(["faith", "Grace"])
+
+    def test_set_tags_writes_only_the_changes(self):
+        """Test that adding or removing one tag doesn't rewrite the other tagged items"""
+        note = NoteFactory()
+        note.tags.add("grace", "faith")
+
+        with CaptureQueriesContext(connection) as queries:
+            note.set_tags(["grace", "faith", "hope"])
+        tagged_item_writes = [query["sql"] for query in queries if query["sql"].startswith(("INSERT", "DELETE"))]
+        tagged_item_writes = [sql for sql in tagged_item_writes if '"core_uuidtaggeditem"' in sql]
+        assert len(tagged_item_writes) == 1
+        assert tagged_item_writes[0].startswith("INSERT")
+
+        with CaptureQueriesContext(connection) as queries:
+            note.set_tags(["grace", "faith"])
+        tagged_item_writes = [query["sql"] for query in queries if query["sql"].startswith(("INSERT", "DELETE"))]
+        tagged_item_writes = [sql for sql in tagged_item_writes if '"core_uuidtaggeditem"' in sql]
+        assert len(tagged_item_writes) == 1
+        assert tagged_item_writes[0].startswith("DELETE")
+        assert sorted(note.tags.names()) == ["faith", "grace"]
+
 
 class TestNoteTypeModel:
     def test_note_type_creation(self):
@@ -160,3 +407,52 @@ class TestNoteTypeModel:
         """Test that a blank description is allowed"""
         note_type = NoteTypeFactory(description="")
         assert note_type.description == ""
+
+
+class TestUserTagStat:
+    def get_counts(self, user):
+        return {tag.name: tag.note_count for tag in UserTagStat.get_tags_for_user(user)}
+
+    def test_counts_follow_tag_changes(self):
+        """Test that adding, removing and clearing tags updates the owner's counts"""
+        user = UserFactory()
+        note1 = NoteFactory(owner=user)
+        note2 = NoteFactory(owner=user)
+
+        note1.tags.add("faith", "grace")
+        note2.tags.add("faith")
+        assert self.get_counts(user) == {"faith": 2, "grace": 1}
+
+        note1.tags.remove("grace")
+        assert self.get_counts(user) == {"faith": 2}
+
+        note2.tags.clear()
+        assert self.get_counts(user) == {"faith": 1}
+
+        note1.tags.set(["hope"])
+        assert self.get_counts(user) == {"hope": 1}
+
+        note1.set_tags(["hope", "love"])
+        assert self.get_counts(user) == {"hope": 1, "love": 1}
+
+        note1.set_tags(["love"])
+        assert self.get_counts(user) == {"love": 1}
+
+    def test_counts_are_per_owner(self):
+        """Test that other users' notes don't affect the counts"""
+        user = UserFactory()
+        NoteFactory(owner=user).tags.add("faith")
+        NoteFactory().tags.add("faith", "works")
+
+        assert self.get_counts(user) == {"faith": 1}
+
+    def test_counts_follow_note_deletion(self):
+        """Test that deleting a note decrements the counts of its tags"""
+        user = UserFactory()
+        note = NoteFactory(owner=user)
+        note.tags.add("faith")
+        NoteFactory(owner=user).tags.add("faith")
+
+        note.delete()
+
+        assert self.get_counts(user) == {"faith": 1}
@@ -0,0 +1,51 @@
+import pytest
+from django.core.management import call_command
+
+from milk2meat.core.utils.markdown import markdown_hash
+from milk2meat.notes.factories import NoteFactory
+from milk2meat.notes.models import Note
+
+pytestmark = pytest.mark.django_db
+
+
+class TestRenderNotesCommand:
+    """Test the render_notes management command."""
+
+    def test_command_renders_stale_notes(self, capsys):
+        """Test the command re-renders notes whose stored HTML is out of date."""
+        current = NoteFactory(content="Up to date")
+        stale = NoteFactory(content="# Stale")
+        Note.objects.filter(pk=stale.pk).update(content_html="", content_hash="")
+
+        call_command("render_notes")
+
+        stale.refresh_from_db()
+        assert stale.content_html == "<h1>Stale</h1>"
+        assert stale.content_hash == markdown_hash("# Stale")
+
+        captured = capsys.readouterr()
+        assert "Rendered 1 of 2 notes" in captured.out
+
+        current.refresh_from_db()
+        assert current.content_html == "<p>Up to date</p>"
+
+    def test_command_preserves_updated_at(self):
+        """Test re-rendering doesn't change when a note was last updated."""
+        note = NoteFactory(content="Some text")
+        Note.objects.filter(pk=note.pk).update(content_hash="")
+        note.refresh_from_db()
+        updated_at = note.updated_at
+
+        call_command("render_notes")
+
+        note.refresh_from_db()
+        assert note.updated_at == updated_at
+
+    def test_command_force(self, capsys):
+        """Test --force re-renders every note."""
+        NoteFactory.create_batch(3)
+
+        call_command("render_notes", "--force", "--batch-size=2")
+
+        captured = capsys.readouterr()
+        assert "Rendered 3 of 3 notes" in captured.out
@@ -0,0 +1,385 @@
+"""
+Tests for uploading note files straight to storage.
+
+The browser asks for a signed upload URL (note_upload_start), PUTs the file to the bucket,
+then asks for the file to be attached to the note (note_upload_finalize), which checks it.
+Large files are uploaded in parts instead (note_multipart_*), so that uploads can be resumed.
+Storage requests are stubbed with botocore's Stubber.
+"""
+
+import io
+import json
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+from botocore.response import StreamingBody
+from botocore.stub import ANY, Stubber
+from django.core import signing
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.urls import reverse
+
+from milk2meat.notes.factories import NoteFactory
+from milk2meat.notes.models import Note
+from milk2meat.notes.views.uploads import (
+    MULTIPART_MIN_PART_SIZE,
+    MULTIPART_TOKEN_SALT,
+    UPLOAD_TOKEN_SALT,
+    multipart_part_size,
+)
+from milk2meat.users.factories import UserFactory
+
+pytestmark = pytest.mark.django_db
+
+PDF_CONTENT = b"%PDF-1.5\n%\xff\xff\xff\xff\ntest pdf content"
+
+
+@pytest.fixture
+def bucket(settings):
+    """Use the S3 storage, returning a Stubber for its client"""
+    settings.STORAGES = {**settings.STORAGES, "default": {"BACKEND": "milk2meat.core.storage.PrivateS3Storage"}}
+    settings.AWS_ACCESS_KEY_ID = "access-key"
+    settings.AWS_SECRET_ACCESS_KEY = "secret-key"
+    settings.AWS_STORAGE_BUCKET_NAME = "bucket"
+    settings.AWS_S3_ENDPOINT_URL = "https://r2.example.com"
+    settings.AWS_S3_REGION_NAME = "auto"
+
+    with Stubber(default_storage.connection.meta.client) as stubber:
+        yield stubber
+        stubber.assert_no_pending_responses()
+
+
+@pytest.fixture
+def user(client):
+    user = UserFactory()
+    client.force_login(user)
+    return user
+
+
+def post_json(client, url, data):
+    return client.post(url, json.dumps(data), content_type="application/json")
+
+
+def stub_uploaded_file(bucket, key, content):
+    """Stub the requests checking an uploaded file: its size (HEAD), then its first bytes (ranged GET)"""
+    bucket.add_response("head_object", {"ContentLength": len(content)}, {"Bucket": "bucket", "Key": key})
+    bucket.add_response(
+        "get_object",
+        {"Body": StreamingBody(io.BytesIO(content), len(content))},
+        {"Bucket": "bucket", "Key": key, "Range": ANY},
+    )
+
+
+class TestNoteUploadStart:
+    def test_login_required(self, client):
+        """Test that login is required"""
+        note = NoteFactory()
+        response = post_json(client, reverse("notes:note_upload_start", kwargs={"pk": note.pk}), {})
+        assert response.status_code == 302
+
+    def test_other_users_note(self, client, user, bucket):
+        """Test that files can't be uploaded for other users' notes"""
+        note = NoteFactory()
+        response = post_json(client, reverse("notes:note_upload_start", kwargs={"pk": note.pk}), {})
+        assert response.status_code == 404
+
+    def test_unavailable_without_bucket(self, client, user):
+        """Test that direct uploads aren't available with the file system storage"""
+        note = NoteFactory(owner=user)
+        data = {"filename": "test.pdf", "content_type": "application/pdf", "size": 100}
+        response = post_json(client, reverse("notes:note_upload_start", kwargs={"pk": note.pk}), data)
+        assert response.status_code == 501
+
+    @pytest.mark.parametrize(
+        "data, field",
+        [
+            ({"filename": "test.exe", "content_type": "application/x-msdownload", "size": 100}, "content_type"),
+            ({"filename": "test.pdf", "content_type": "application/pdf", "size": 11 * 1024 * 1024}, "size"),
+            ({"filename": "test.pdf", "content_type": "application/pdf", "size": 0}, "size"),
+            ({"content_type": "application/pdf", "size": 100}, "filename"),
+        ],
+    )
+    def test_invalid_upload(self, client, user, bucket, data, field):
+        """Test that disallowed types and sizes are refused before anything is uploaded"""
+        note = NoteFactory(owner=user)
+        response = post_json(client, reverse("notes:note_upload_start", kwargs={"pk": note.pk}), data)
+
+        assert response.status_code == 400
+        assert list(response.json()["errors"]) == [field]
+
+    def test_signed_upload_url(self, client, user, bucket):
+        """Test that a PUT URL is signed for a free name in the note's directory"""
+        note = NoteFactory(owner=user)
+        key = f"files/notes/{user.id}/{note.id}/test.pdf"
+        bucket.add_client_error("head_object", http_status_code=404, expected_params={"Bucket": "bucket", "Key": key})
+
+        data = {"filename": "test.pdf", "content_type": "application/pdf", "size": len(PDF_CONTENT)}
+        response = post_json(client, reverse("notes:note_upload_start", kwargs={"pk": note.pk}), data)
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["method"] == "PUT"
+        assert data["url"].startswith(f"https://r2.example.com/bucket/{key}?")
+        assert data["headers"] == {"Content-Type": "application/pdf"}
+        assert signing.loads(data["token"], salt=UPLOAD_TOKEN_SALT) == {
+            "note": str(note.pk),
+            "name": f"notes/{user.id}/{note.id}/test.pdf",
+        }
+
+
+class TestNoteUploadFinalize:
+    def finalize(self, client, note, name):
+        token = signing.dumps({"note": str(note.pk), "name": name}, salt=UPLOAD_TOKEN_SALT)
+        return post_json(client, reverse("notes:note_upload_finalize", kwargs={"pk": note.pk}), {"token": token})
+
+    def test_attaches_upload(self, client, user, bucket):
+        """Test that a valid uploaded file is attached to the note"""
+        note = NoteFactory(owner=user)
+        name = f"notes/{user.id}/{note.id}/test.pdf"
+        stub_uploaded_file(bucket, f"files/{name}", PDF_CONTENT)
+
+        response = self.finalize(client, note, name)
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["file"]["name"] == "test.pdf"
+        note = Note.objects.get(pk=note.pk)
+        assert note.upload.name == name
+        assert data["revision"] == note.updated_at.isoformat()
+
+    def test_cached_file_url_is_forgotten_on_commit(self, client, user, bucket, django_capture_on_commit_callbacks):
+        """Test that the cached URL of the previous file is dropped once the upload is attached"""
+        note = NoteFactory(owner=user)
+        name = f"notes/{user.id}/{note.id}/test.pdf"
+        stub_uploaded_file(bucket, f"files/{name}", PDF_CONTENT)
+        cache.set(
+            Note.file_url_cache_key(note.pk), {"window": 0, "owner": user.pk, "url": "https://example.com/old.pdf"}
+        )
+
+        with django_capture_on_commit_callbacks(execute=True):
+            self.finalize(client, note, name)
+            assert cache.get(Note.file_url_cache_key(note.pk)) is not None
+
+        assert cache.get(Note.file_url_cache_key(note.pk)) is None
+
+    def test_invalid_upload_is_deleted(self, client, user, bucket):
+        """Test that an uploaded file of a disallowed type is deleted instead of attached"""
+        note = NoteFactory(owner=user)
+        name = f"notes/{user.id}/{note.id}/test.pdf"
+        stub_uploaded_file(bucket, f"files/{name}", b"#!/bin/sh\necho hello\n")
+        bucket.add_response("delete_object", {}, {"Bucket": "bucket", "Key": f"files/{name}"})
+
+        response = self.finalize(client, note, name)
+
+        assert response.status_code == 400
+        assert list(response.json()["errors"]) == ["upload"]
+        assert not Note.objects.get(pk=note.pk).upload
+
+    def test_missing_upload(self, client, user, bucket):
+        """Test that finalizing an upload that didn't happen fails"""
+        note = NoteFactory(owner=user)
+        name = f"notes/{user.id}/{note.id}/test.pdf"
+        bucket.add_client_error("head_object", http_status_code=404)
+
+        response = self.finalize(client, note, name)
+
+        assert response.status_code == 400
+        assert response.json()["errors"] == {"upload": ["The file wasn't uploaded."]}
+
+    def test_token_for_another_note(self, client, user, bucket):
+        """Test that an upload token can't be used to attach a file to another note"""
+        note = NoteFactory(owner=user)
+        other_note = NoteFactory(owner=user)
+        token = signing.dumps({"note": str(other_note.pk), "name": "notes/x/test.pdf"}, salt=UPLOAD_TOKEN_SALT)
+
+        response = post_json(client, reverse("notes:note_upload_finalize", kwargs={"pk": note.pk}), {"token": token})
+
+        assert response.status_code == 400
+        assert not Note.objects.get(pk=note.pk).upload
+
+    @pytest.mark.parametrize("token", ["tampered", None, 42])
+    def test_invalid_token(self, client, user, bucket, token):
+        """Test that invalid tokens are refused"""
+        note = NoteFactory(owner=user)
+        response = post_json(client, reverse("notes:note_upload_finalize", kwargs={"pk": note.pk}), {"token": token})
+        assert response.status_code == 400
+
+
+PART_SIZE = multipart_part_size()
+
+
+class TestNoteMultipartUpload:
+    SIZE = PART_SIZE + 1024
+
+    def token(self, note, size=SIZE):
+        name = f"notes/{note.owner_id}/{note.id}/test.pdf"
+        return signing.dumps(
+            {"note": str(note.pk), "name": name, "upload_id": "upload-id", "size": size}, salt=MULTIPART_TOKEN_SALT
+        )
+
+    def part_list(self, note, parts):
+        return {
+            "Bucket": "bucket",
+            "Key": f"files/notes/{note.owner_id}/{note.id}/test.pdf",
+            "UploadId": "upload-id",
+            "Parts": [{"PartNumber": number, "Size": size, "ETag": f'"etag-{number}"'} for number, size in parts],
+        }
+
+    def test_create(self, client, user, bucket):
+        """Test that a multipart upload is created, split in parts of the part size"""
+        note = NoteFactory(owner=user)
+        key = f"files/notes/{user.id}/{note.id}/test.pdf"
+        bucket.add_client_error("head_object", http_status_code=404)
+        bucket.add_response(
+            "create_multipart_upload",
+            {"UploadId": "upload-id"},
+            {"Bucket": "bucket", "Key": key, "ContentType": "application/pdf"},
+        )
+
+        data = {"filename": "test.pdf", "content_type": "application/pdf", "size": self.SIZE}
+        response = post_json(client, reverse("notes:note_multipart_create", kwargs={"pk": note.pk}), data)
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["part_size"] == PART_SIZE
+        assert data["part_count"] == 2
+        assert signing.loads(data["token"], salt=MULTIPART_TOKEN_SALT)["upload_id"] == "upload-id"
+
+    def test_part_size_follows_size_limit(self):
+        """Test that parts are as small as allowed, unless the largest files need more parts than allowed"""
+        assert PART_SIZE == MULTIPART_MIN_PART_SIZE
+        with mock.patch.object(Note, "upload_size_limit", return_value=100 * 1024**3):
+            assert multipart_part_size() == 10737419  # 100GB in 10000 parts
+
+    def test_create_enforces_size_limit(self, client, user, bucket):
+        """Test that the file size limit applies to multipart uploads"""
+        note = NoteFactory(owner=user)
+        data = {"filename": "test.pdf", "content_type": "application/pdf", "size": 11 * 1024 * 1024}
+        response = post_json(client, reverse("notes:note_multipart_create", kwargs={"pk": note.pk}), data)
+
+        assert response.status_code == 400
+        assert list(response.json()["errors"]) == ["size"]
+
+    def test_sign_parts(self, client, user, bucket):
+        """Test that the requested parts get signed upload URLs"""
+        note = NoteFactory(owner=user)
+        url = reverse("notes:note_multipart_sign_parts", kwargs={"pk": note.pk})
+
+        response = post_json(client, url, {"token": self.token(note), "part_numbers": [1, 2]})
+
+        assert response.status_code == 200
+        urls = response.json()["urls"]
+        assert list(urls) == ["1", "2"]
+        query = parse_qs(urlsplit(urls["2"]).query)
+        assert query["partNumber"] == ["2"]
+        assert query["uploadId"] == ["upload-id"]
+        assert "content-length" in query["X-Amz-SignedHeaders"][0]
+
+    @pytest.mark.parametrize("part_numbers", [[0], [3], ["1"], None])
+    def test_sign_invalid_parts(self, client, user, bucket, part_numbers):
+        """Test that only the parts of the upload can be signed"""
+        note = NoteFactory(owner=user)
+        url = reverse("notes:note_multipart_sign_parts", kwargs={"pk": note.pk})
+
+        response = post_json(client, url, {"token": self.token(note), "part_numbers": part_numbers})
+
+        assert response.status_code == 400
+
+    def test_list_parts(self, client, user, bucket):
+        """Test that the uploaded parts are listed, to resume an upload"""
+        note = NoteFactory(owner=user)
+        part_list = self.part_list(note, [(1, PART_SIZE)])
+        bucket.add_response("list_parts", part_list)
+
+        url = reverse("notes:note_multipart_list_parts", kwargs={"pk": note.pk})
+        response = client.get(url, {"token": self.token(note)})
+
+        assert response.status_code == 200
+        assert response.json()["parts"] == [{"number": 1, "size": PART_SIZE}]
+
+    def test_list_parts_of_expired_upload(self, client, user, bucket):
+        """Test that listing the parts of an upload that no longer exists fails"""
+        note = NoteFactory(owner=user)
+        bucket.add_client_error("list_parts", service_error_code="NoSuchUpload", http_status_code=404)
+
+        url = reverse("notes:note_multipart_list_parts", kwargs={"pk": note.pk})
+        response = client.get(url, {"token": self.token(note)})
+
+        assert response.status_code == 400
+
+    def test_complete(self, client, user, bucket):
+        """Test that the parts are assembled, and the file is checked and attached"""
+        note = NoteFactory(owner=user)
+        key = f"files/notes/{user.id}/{note.id}/test.pdf"
+        bucket.add_response("list_parts", self.part_list(note, [(1, PART_SIZE), (2, 1024)]))
+        bucket.add_response(
+            "complete_multipart_upload",
+            {},
+            {
+                "Bucket": "bucket",
+                "Key": key,
+                "UploadId": "upload-id",
+                "MultipartUpload": {
+                    "Parts": [{"PartNumber": 1, "ETag": '"etag-1"'}, {"PartNumber": 2, "ETag": '"etag-2"'}]
+                },
+            },
+        )
+        stub_uploaded_file(bucket, key, PDF_CONTENT)
+
+        url = reverse("notes:note_multipart_complete", kwargs={"pk": note.pk})
+        response = post_json(client, url, {"token": self.token(note)})
+
+        assert response.status_code == 200
+        assert Note.objects.get(pk=note.pk).upload.name == f"notes/{user.id}/{note.id}/test.pdf"
+
+    @pytest.mark.parametrize("error_code", ["NoSuchUpload", "InvalidPart"])
+    def test_complete_expired_upload(self, client, user, bucket, error_code):
+        """Test that an upload (or part) that no longer exists when completing it is refused"""
+        note = NoteFactory(owner=user)
+        bucket.add_response("list_parts", self.part_list(note, [(1, PART_SIZE), (2, 1024)]))
+        bucket.add_client_error("complete_multipart_upload", service_error_code=error_code, http_status_code=400)
+
+        url = reverse("notes:note_multipart_complete", kwargs={"pk": note.pk})
+        response = post_json(client, url, {"token": self.token(note)})
+
+        assert response.status_code == 400
+        assert response.json()["errors"] == {"upload": ["Invalid or expired upload."]}
+        assert not Note.objects.get(pk=note.pk).upload
+
+    @pytest.mark.parametrize("parts", [[(1, PART_SIZE)], [(1, PART_SIZE), (2, 512)]])
+    def test_complete_with_missing_parts(self, client, user, bucket, parts):
+        """Test that uploads with missing (or partial) parts aren't completed"""
+        note = NoteFactory(owner=user)
+        bucket.add_response("list_parts", self.part_list(note, parts))
+
+        url = reverse("notes:note_multipart_complete", kwargs={"pk": note.pk})
+        response = post_json(client, url, {"token": self.token(note)})
+
+        assert response.status_code == 400
+        assert response.json()["missing_parts"] == [2]
+        assert not Note.objects.get(pk=note.pk).upload
+
+    def test_abort(self, client, user, bucket):
+        """Test that aborting an upload deletes its parts"""
+        note = NoteFactory(owner=user)
+        bucket.add_response(
+            "abort_multipart_upload",
+            {},
+            {"Bucket": "bucket", "Key": f"files/notes/{user.id}/{note.id}/test.pdf", "UploadId": "upload-id"},
+        )
+
+        url = reverse("notes:note_multipart_abort", kwargs={"pk": note.pk})
+        response = post_json(client, url, {"token": self.token(note)})
+
+        assert response.status_code == 200
+
+    def test_token_for_another_note(self, client, user, bucket):
+        """Test that an upload token can't be used for another note"""
+        note = NoteFactory(owner=user)
+        other_note = NoteFactory(owner=user)
+
+        url = reverse("notes:note_multipart_complete", kwargs={"pk": note.pk})
+        response = post_json(client, url, {"token": self.token(other_note)})
+
+        assert response.status_code == 400
@@ -1,6 +1,9 @@
 import json
+from unittest import mock
 
 import pytest
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
 
 from milk2meat.bible.factories import BookFactory
@@ -170,6 +173,141 @@ class TestNoteListView:
         assert response.context["search_query"] == "salvation"
         assert response.context["result_count"] == 1
 
+    def test_note_list_search_matches_tags(self, client):
+        """Test that searching matches note tags"""
+        user = UserFactory()
+        client.force_login(user)
+
+        tagged = NoteFactory(title="Romans 5", content="Peace with God", owner=user)
+        tagged.tags.add("justification")
+        NoteFactory(title="Romans 6", content="Dead to sin", owner=user)
+
+        response = client.get(reverse("notes:note_list") + "?q=justification")
+
+        assert list(response.context["notes"]) == [tagged]
+
+    def test_note_list_search_ranks_title_matches_first(self, client):
+        """Test that notes matching on the title rank above notes matching on the content"""
+        user = UserFactory()
+        client.force_login(user)
+
+        title_match = NoteFactory(title="Faith", content="Hebrews 11", owner=user)
+        content_match = NoteFactory(title="Hebrews 11", content="By faith Abel offered", owner=user)
+        # The most recently updated note would come first without ranking
+        content_match.save()
+
+        response = client.get(reverse("notes:note_list") + "?q=faith")
+
+        assert list(response.context["notes"]) == [title_match, content_match]
+
+    def test_note_list_search_substring_fallback(self, client):
+        """Test that partial words still match note titles"""
+        user = UserFactory()
+        client.force_login(user)
+
+        note = NoteFactory(title="Sanctification Study", content="", owner=user)
+        NoteFactory(title="Grace Study", content="", owner=user)
+
+        response = client.get(reverse("notes:note_list") + "?q=anctif")
+
+        assert list(response.context["notes"]) == [note]
+
+    def test_note_list_search_excludes_other_users(self, client):
+        """Test that search results only include the user's own notes"""
+        user = UserFactory()
+        client.force_login(user)
+
+        own = NoteFactory(title="Prayer", owner=user)
+        NoteFactory(title="Prayer")
+
+        response = client.get(reverse("notes:note_list") + "?q=prayer")
+
+        assert list(response.context["notes"]) == [own]
+
+    def test_note_list_tags_sidebar(self, client, django_assert_num_queries):
+        """Test the tag filter lists the user's tags"""
+        user = UserFactory()
+        client.force_login(user)
+        NoteFactory(owner=user).tags.add("faith", "grace")
+        NoteFactory().tags.add("works")
+
+        response = client.get(reverse("notes:note_list"))
+
+        assert [tag.name for tag in response.context["tags"]] == ["faith", "grace"]
+        with django_assert_num_queries(1):
+            list(response.context["tags"].all())
+
+    def test_note_list_cursor_pagination(self, client):
+        """Test the notes list pages with cursors, without counting the notes"""
+        user = UserFactory()
+        client.force_login(user)
+        NoteFactory.create_batch(13, owner=user)
+        notes = list(Note.objects.filter(owner=user).order_by("-updated_at", "-created_at", "-id"))
+
+        url = reverse("notes:note_list")
+        response = client.get(url)
+        assert response.context["is_cursor_paginated"] is True
+        assert list(response.context["notes"]) == notes[:12]
+
+        page = response.context["page_obj"]
+        assert not page.has_previous()
+        response = client.get(url, {"cursor": page.next_cursor})
+        assert list(response.context["notes"]) == notes[12:]
+        assert f"?cursor={response.context['page_obj'].previous_cursor}" in response.content.decode()
+
+    def test_note_list_invalid_cursor(self, client):
+        """Test an invalid cursor returns a 404"""
+        user = UserFactory()
+        client.force_login(user)
+
+        response = client.get(reverse("notes:note_list"), {"cursor": "invalid"})
+        assert response.status_code == 404
+
+
+class TestNoteListJsonView:
+    def test_login_required(self, client):
+        """Test that login is required to list notes"""
+        response = client.get(reverse("notes:note_list_json"))
+        assert response.status_code == 302  # Redirect to login page
+
+    def test_note_list_json(self, client):
+        """Test the JSON notes list follows cursors and keeps the filters"""
+        user = UserFactory()
+        client.force_login(user)
+        note_type = NoteTypeFactory(name="Sermon")
+        NoteFactory.create_batch(13, owner=user, note_type=note_type)
+        NoteFactory(owner=user)  # Different note type, filtered out
+        NoteFactory(note_type=note_type)  # Another user's note
+
+        response = client.get(reverse("notes:note_list_json"), {"type": "Sermon"})
+        data = response.json()
+        assert len(data["notes"]) == 12
+        assert data["notes"][0]["note_type"] == "Sermon"
+        assert data["previous"] is None
+        assert "type=Sermon" in data["next"]
+
+        data = client.get(data["next"]).json()
+        assert len(data["notes"]) == 1
+        assert data["next"] is None
+        assert data["previous"] is not None
+
+        first_page = client.get(data["previous"]).json()
+        assert len(first_page["notes"]) == 12
+
+    def test_note_list_json_search(self, client):
+        """Test the JSON notes list pages search results by number"""
+        user = UserFactory()
+        client.force_login(user)
+        NoteFactory.create_batch(13, title="Covenant", owner=user)
+
+        data = client.get(reverse("notes:note_list_json"), {"q": "covenant"}).json()
+        assert len(data["notes"]) == 12
+        assert data["next"].endswith("q=covenant&page=2")
+
+        data = client.get(data["next"]).json()
+        assert len(data["notes"]) == 1
+        assert data["previous"].endswith("q=covenant&page=1")
+
 
 class TestNoteDetailView:
     def test_login_required(self, client):
@@ -212,6 +350,38 @@ class TestNoteDetailView:
         assert "content_html" in response.context
         assert "<h1>Genesis 1:1</h1>" in response.context["content_html"]
 
+    def test_note_detail_view_does_not_touch_storage(self, client):
+        """Test the page links to the file without signing a URL or looking up its size"""
+        user = UserFactory()
+        client.force_login(user)
+        test_file = SimpleUploadedFile("test.pdf", b"%PDF-1.4\nTest PDF", content_type="application/pdf")
+        note = NoteFactory(owner=user, upload=test_file)
+
+        with (
+            mock.patch.object(default_storage, "url") as mock_url,
+            mock.patch.object(default_storage, "size") as mock_size,
+        ):
+            response = client.get(reverse("notes:note_detail", kwargs={"pk": note.pk}))
+
+        assert response.status_code == 200
+        mock_url.assert_not_called()
+        mock_size.assert_not_called()
+        content = response.content.decode()
+        assert reverse("notes:open_protected_file", kwargs={"note_id": note.pk}) in content
+        assert "17\xa0bytes" in content
+
+    def test_note_detail_view_image_preview(self, client):
+        """Test the lightbox is told the file is an image, as its URL has no extension"""
+        user = UserFactory()
+        client.force_login(user)
+        png = b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR\x00\x00\x00\x01\x00\x00\x00\x01\x08\x06\x00\x00\x00\x1f\x15\xc4\x89"
+        note = NoteFactory(owner=user, upload=SimpleUploadedFile("scan.png", png, content_type="image/png"))
+
+        response = client.get(reverse("notes:note_detail", kwargs={"pk": note.pk}))
+
+        assert response.status_code == 200
+        assert 'data-type="image"' in response.content.decode()
+
     def test_cannot_view_other_users_notes(self, client):
         """Test users cannot view notes owned by others"""
         # Create two users
@@ -293,6 +463,9 @@ class TestNoteEditPageView:
         assert json.loads(form.initial["referenced_books_json"]) == [{"id": book.id, "title": book.title}]
         assert form.initial["tags_input"] == "original,tag"
 
+        # The page is autosaved against the revision it was loaded with
+        assert f'window.noteRevision = "{note.updated_at.isoformat()}"' in response.content.decode()
+
     def test_cannot_edit_other_users_notes(self, client):
         """Test users cannot view edit page for notes owned by others"""
         # Create two users
@@ -2,6 +2,7 @@ from django.urls import path
 
 from .views import notes as note_views
 from .views import tags as tags_views
+from .views import uploads as upload_views
 
 app_name = "notes"
 
@@ -14,9 +15,35 @@ urlpatterns = [
     path("notes/<uuid:pk>/delete/", note_views.note_delete_view, name="note_delete"),
     # Secure file access
     path("notes/<uuid:note_id>/file/", note_views.serve_protected_file, name="serve_protected_file"),
+    path("notes/<uuid:note_id>/file/open/", note_views.open_protected_file, name="open_protected_file"),
     # AJAX endpoints
+    path("api/notes/", note_views.NoteListJsonView.as_view(), name="note_list_json"),
     path("api/notes/create/", note_views.note_save_ajax, name="note_create_ajax"),
     path("api/notes/<uuid:pk>/update/", note_views.note_save_ajax, name="note_update_ajax"),
+    path("api/notes/<uuid:pk>/autosave/", note_views.note_autosave, name="note_autosave"),
+    path("api/notes/<uuid:pk>/upload/", upload_views.note_upload_start, name="note_upload_start"),
+    path("api/notes/<uuid:pk>/upload/finalize/", upload_views.note_upload_finalize, name="note_upload_finalize"),
+    path("api/notes/<uuid:pk>/upload/multipart/", upload_views.note_multipart_create, name="note_multipart_create"),
+    path(
+        "api/notes/<uuid:pk>/upload/multipart/parts/",
+        upload_views.note_multipart_list_parts,
+        name="note_multipart_list_parts",
+    ),
+    path(
+        "api/notes/<uuid:pk>/upload/multipart/parts/sign/",
+        upload_views.note_multipart_sign_parts,
+        name="note_multipart_sign_parts",
+    ),
+    path(
+        "api/notes/<uuid:pk>/upload/multipart/complete/",
+        upload_views.note_multipart_complete,
+        name="note_multipart_complete",
+    ),
+    path(
+        "api/notes/<uuid:pk>/upload/multipart/abort/",
+        upload_views.note_multipart_abort,
+        name="note_multipart_abort",
+    ),
     path("api/note-types/create/", note_views.create_note_type_ajax, name="create_note_type_ajax"),
     # Tags
     path("tags/", tags_views.TagListView.as_view(), name="tag_list"),
@@ -1,33 +1,65 @@
+import json
 import logging
 
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.core.cache import cache
 from django.core.exceptions import PermissionDenied
-from django.db.models import Count, Q
-from django.http import Http404, JsonResponse
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.http import Http404, HttpResponseRedirect, JsonResponse
 from django.shortcuts import get_object_or_404, redirect
 from django.urls import reverse, reverse_lazy
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
 from django.utils.safestring import mark_safe
-from django.views.decorators.http import require_GET, require_POST
+from django.views.decorators.http import require_GET, require_http_methods, require_POST
 from django.views.generic import DetailView, ListView, TemplateView
-from taggit.models import Tag
 
-from milk2meat.bible.models import Book
-from milk2meat.core.utils.markdown import parse_markdown
-from milk2meat.notes.forms import NoteForm, NoteTypeForm
-from milk2meat.notes.models import Note, NoteType
+from milk2meat.core.reference_data import get_books, get_note_types
+from milk2meat.core.storage import signed_url_window
+from milk2meat.core.utils.markdown import markdown_hash, parse_markdown
+from milk2meat.core.utils.pagination import CursorPaginator, InvalidCursor
+from milk2meat.core.utils.text import apply_text_delta
+from milk2meat.core.utils.timing import record_cache_lookup
+from milk2meat.notes.forms import NoteAutosaveForm, NoteForm, NoteTypeForm
+from milk2meat.notes.models import Note, UserTagStat, note_search_vector
+from milk2meat.notes.views.uploads import direct_uploads_available
 
 logger = logging.getLogger(__name__)
 
 
 class NoteListView(LoginRequiredMixin, ListView):
-    """View for listing user's notes with filtering options"""
+    """
+    View for listing user's notes with filtering options.
+
+    Notes are paginated with cursors (keyset pagination, see `CursorPaginator`), except for
+    search results, which are ordered by rank and use page numbers.
+    """
 
     model = Note
     template_name = "core/note_list.html"
     context_object_name = "notes"
     paginate_by = 12  # Show 12 notes per page
+    # Unique ordering used for cursor pagination, matching the `note_owner_recent_idx` index
+    cursor_ordering = ["-updated_at", "-created_at", "-id"]
+
+    def is_search_active(self):
+        return bool(self.request.GET.get("q"))
+
+    def paginate_queryset(self, queryset, page_size):
+        """Paginate with cursors, unless the results are ranked search results"""
+        if self.is_search_active():
+            return super().paginate_queryset(queryset, page_size)
+
+        paginator = CursorPaginator(queryset, page_size, self.cursor_ordering)
+        try:
+            page = paginator.page(self.request.GET.get("cursor"))
+        except InvalidCursor as e:
+            raise Http404("Invalid cursor") from e
+        return paginator, page, page.object_list, page.has_other_pages()
 
     def get_queryset(self):
         """Filter notes by the current user with enhanced search"""
@@ -53,11 +85,14 @@ class NoteListView(LoginRequiredMixin, ListView):
             queryset = queryset.filter(tags__name__iexact=tag)
 
         if search_query:
-            queryset = queryset.filter(
-                Q(title__icontains=search_query)
-                | Q(content__icontains=search_query)
-                | Q(tags__name__icontains=search_query)
-            ).distinct()
+            # Ranked full-text search over the stored (GIN-indexed) vector, falling back to
+            # substring matches on the title (backed by a trigram index) for partial words
+            query = SearchQuery(search_query, search_type="websearch", config=Note.SEARCH_CONFIG)
+            queryset = (
+                queryset.annotate(rank=SearchRank(F("search_vector"), query))
+                .filter(Q(search_vector=query) | Q(title__icontains=search_query))
+                .order_by("-rank", *Note._meta.ordering)
+            )
 
         return queryset
 
@@ -65,10 +100,10 @@ class NoteListView(LoginRequiredMixin, ListView):
         context = super().get_context_data(**kwargs)
 
         # Add note types for filter dropdown
-        context["note_types"] = NoteType.objects.all()
+        context["note_types"] = get_note_types()
 
         # Add Bible books for filter dropdown
-        context["bible_books"] = Book.objects.all()
+        context["bible_books"] = get_books()
 
         # Add search query to context for UI feedback
         search_query = self.request.GET.get("q", "")
@@ -82,28 +117,87 @@ class NoteListView(LoginRequiredMixin, ListView):
             "q": search_query,
         }
 
-        # Get all note IDs for the current user
-        user_note_ids = Note.objects.get_queryset_for_user(self.request.user).values_list("id", flat=True)
-
         # Get tags with note counts
-        context["tags"] = (
-            Tag.objects.filter(
-                core_uuidtaggeditem_items__content_type__app_label="core",
-                core_uuidtaggeditem_items__content_type__model="note",
-                core_uuidtaggeditem_items__object_id__in=user_note_ids,
-            )
-            .annotate(count=Count("core_uuidtaggeditem_items"))
-            .order_by("name")
-        )
+        context["tags"] = UserTagStat.get_tags_for_user(self.request.user)
 
         # Add count of search results if search is active
         if search_query:
             context["is_search_active"] = True
             context["result_count"] = context["paginator"].count
+        else:
+            context["is_cursor_paginated"] = True
 
         return context
 
 
+class NoteListJsonView(NoteListView):
+    """
+    JSON variant of the notes list, supporting the same filters and pagination.
+
+    Returns:
+        JsonResponse with the following structure:
+            {
+                "notes": [
+                    {
+                        "id": "<note-uuid>",
+                        "title": "<note-title>",
+                        "note_type": "<note-type-name>",
+                        "tags": ["<tag-name>", ...],
+                        "updated_at": "<ISO 8601 timestamp>",
+                        "detail_url": "<url>",
+                        "edit_url": "<url>"
+                    },
+                    ...
+                ],
+                "next": "<url of the next page>" or null,
+                "previous": "<url of the previous page>" or null
+            }
+    """
+
+    def get_context_data(self, **kwargs):
+        # Only the current page is needed (not the sidebar data of the HTML list)
+        paginator, page, notes, is_paginated = self.paginate_queryset(self.object_list, self.paginate_by)
+        return {"page_obj": page, "notes": notes}
+
+    def render_to_response(self, context, **response_kwargs):
+        page = context["page_obj"]
+        if self.is_search_active():
+            next_params = {"page": page.next_page_number()} if page.has_next() else None
+            previous_params = {"page": page.previous_page_number()} if page.has_previous() else None
+        else:
+            next_params = {"cursor": page.next_cursor} if page.has_next() else None
+            previous_params = {"cursor": page.previous_cursor} if page.has_previous() else None
+
+        return JsonResponse(
+            {
+                "notes": [
+                    {
+                        "id": str(note.pk),
+                        "title": note.title,
+                        "note_type": note.note_type.name,
+                        "tags": [tag.name for tag in note.tags.all()],
+                        "updated_at": note.updated_at.isoformat(),
+                        "detail_url": reverse("notes:note_detail", kwargs={"pk": note.pk}),
+                        "edit_url": reverse("notes:note_edit", kwargs={"pk": note.pk}),
+                    }
+                    for note in context["notes"]
+                ],
+                "next": self._get_page_url(next_params),
+                "previous": self._get_page_url(previous_params),
+            }
+        )
+
+    def _get_page_url(self, params):
+        """Build the URL of another page, keeping the current filters"""
+        if params is None:
+            return None
+        query = self.request.GET.copy()
+        query.pop("page", None)
+        query.pop("cursor", None)
+        query.update(params)
+        return f"{self.request.path}?{query.urlencode()}"
+
+
 class NoteDetailView(LoginRequiredMixin, DetailView):
     """View for displaying a single note"""
 
@@ -120,11 +214,7 @@ class NoteDetailView(LoginRequiredMixin, DetailView):
 
         # Convert markdown content to HTML
         if self.object.content:
-            context["content_html"] = mark_safe(parse_markdown(self.object.content))
-
-        # Add secure URL for file if present
-        if self.object.upload:
-            context["secure_file_url"] = self.object.get_secure_file_url(self.request.user)
+            context["content_html"] = mark_safe(self.object.get_content_html())
 
         return context
 
@@ -141,8 +231,9 @@ class NoteCreatePageView(LoginRequiredMixin, TemplateView):
         context["form"] = NoteForm(user=self.request.user)
 
         # Add other context data
-        context["note_types"] = NoteType.objects.all()
-        context["bible_books"] = Book.objects.all()
+        context["note_types"] = get_note_types()
+        context["bible_books"] = get_books()
+        context["direct_uploads"] = direct_uploads_available()
         context["is_create"] = True
         return context
 
@@ -168,8 +259,9 @@ class NoteEditPageView(LoginRequiredMixin, TemplateView):
         context["form"] = NoteForm(instance=note, user=self.request.user)
 
         # Add other context data
-        context["note_types"] = NoteType.objects.all()
-        context["bible_books"] = Book.objects.all()
+        context["note_types"] = get_note_types()
+        context["bible_books"] = get_books()
+        context["direct_uploads"] = direct_uploads_available()
         context["is_create"] = False
         return context
 
@@ -228,6 +320,7 @@ def note_save_ajax(request, pk=None):
                     "detail_url": "<url>",
                     "edit_url": "<url>"
                 },
+                "revision": "<revision, see note_autosave>",
                 "message": "Note saved successfully."
             }
         - On validation error:
@@ -271,18 +364,7 @@ def note_save_ajax(request, pk=None):
 
             # We need to manually handle tags and referenced books instead of using form.save_m2m()
             # because we're saving with commit=False
-
-            # Handle referenced books
-            book_ids = form.cleaned_data.get("referenced_books_json", [])
-            note.referenced_books.clear()
-            if book_ids:
-                note.referenced_books.add(*book_ids)
-
-            # Handle tags
-            tags = form.cleaned_data.get("tags_input", [])
-            note.tags.clear()
-            if tags:
-                note.tags.add(*tags)
+            form.save_relations(note)
 
             # Build response data
             data = {
@@ -294,6 +376,7 @@ def note_save_ajax(request, pk=None):
                     "detail_url": reverse("notes:note_detail", kwargs={"pk": note.pk}),
                     "edit_url": reverse("notes:note_edit", kwargs={"pk": note.pk}),
                 },
+                "revision": note.updated_at.isoformat(),
                 "message": "Note saved successfully.",
             }
 
@@ -309,6 +392,135 @@ def note_save_ajax(request, pk=None):
         return JsonResponse({"success": False, "error": str(e)}, status=500)
 
 
+@require_http_methods(["PATCH"])
+@login_required
+def note_autosave(request, pk):
+    """
+    Lightweight autosave endpoint, updating only the given fields of a note.
+
+    Unlike note_save_ajax, only the submitted fields are validated, and the note is updated with
+    a single UPDATE statement (which also refreshes the rendered content and the search vector).
+    Tags, referenced books and uploads are left to note_save_ajax.
+
+    The revision of a note is the timestamp of its last update. When a revision is given, the
+    update only applies if the note hasn't changed since, so concurrent editors can't silently
+    overwrite each other.
+
+    Note that the django-watson index (global search) isn't updated; it catches up on the next
+    full save or `update_search_index` run.
+
+    Parameters:
+        request: The HTTP request object
+        pk (UUID): The primary key of the note to update
+
+    Request Data (JSON):
+        - revision: Revision the changes were made against (required with content_delta)
+        - title, note_type, content: New values of these fields
+        - content_delta: Edits to the content of the given revision instead of the full content,
+          as a list of [start, end, replacement] edits (see `apply_text_delta`)
+
+    Returns:
+        JsonResponse with the following structure:
+        - On success:
+            {"success": true, "revision": "<new revision>"}
+        - On validation error:
+            {"success": false, "errors": {field_errors}}
+        - On conflict:
+            {"success": false, "error": "error message", "revision": "<current revision>"}
+
+    Status Codes:
+        - 200: Success
+        - 400: Validation error
+        - 404: Note not found
+        - 409: The note changed since the given revision
+    """
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        return JsonResponse({"success": False, "error": "Expected a JSON object"}, status=400)
+
+    form = NoteAutosaveForm(data)
+    if not form.is_valid():
+        return JsonResponse({"success": False, "errors": form.errors}, status=400)
+
+    notes = Note.objects.filter(pk=pk, owner=request.user)
+    if form.cleaned_data.get("revision"):
+        notes = notes.filter(updated_at=form.cleaned_data["revision"])
+
+    changes = {
+        field_name: form.cleaned_data[field_name] for field_name in ("title", "content") if field_name in form.fields
+    }
+    if "note_type" in form.fields:
+        changes["note_type_id"] = form.cleaned_data["note_type"]
+    if "content_delta" in form.fields:
+        content = notes.values_list("content", flat=True).first()
+        if content is None:
+            return _autosave_failure(request, pk)
+        try:
+            changes["content"] = apply_text_delta(content, form.cleaned_data["content_delta"])
+        except ValueError as e:
+            return JsonResponse({"success": False, "errors": {"content_delta": [str(e)]}}, status=400)
+
+    values = _autosave_values(request, pk, changes)
+    if not _autosave_update(request, pk, notes, values, changes):
+        return _autosave_failure(request, pk)
+    return JsonResponse({"success": True, "revision": values["updated_at"].isoformat()})
+
+
+def _autosave_values(request, pk, changes):
+    """Get the column values to update for the given changes, including the derived ones"""
+    values = {**changes, "updated_at": timezone.now()}
+    if "title" in changes:
+        values["slug"] = Note(pk=pk, owner=request.user, title=changes["title"])._generate_unique_slug()
+    if "content" in changes:
+        values["content_html"] = parse_markdown(changes["content"])
+        values["content_hash"] = markdown_hash(changes["content"])
+    if "title" in changes or "content" in changes:
+        # The SET clause can't read the new title and content from the columns
+        values["search_vector"] = note_search_vector(
+            Note.SEARCH_CONFIG, title=changes.get("title"), content=changes.get("content")
+        )
+    return values
+
+
+def _autosave_update(request, pk, notes, values, changes):
+    """
+    Update the note, with a new slug if a concurrent save took the one generated for the new title.
+
+    Returns:
+        int: The number of notes updated (0 if the note doesn't exist or changed)
+    """
+    if "slug" not in values:
+        # Without a new title, there's no slug to clash (and no need for a savepoint)
+        return notes.update(**values)
+
+    for attempt in range(1, Note.SLUG_ATTEMPTS + 1):
+        try:
+            with transaction.atomic():
+                return notes.update(**values)
+        except IntegrityError as e:
+            if attempt == Note.SLUG_ATTEMPTS or "unique_owner_slug" not in str(e):
+                raise
+            values["slug"] = Note(pk=pk, owner=request.user, title=changes["title"])._generate_unique_slug()
+
+
+def _autosave_failure(request, pk):
+    """Explain why a note couldn't be autosaved: it doesn't exist (for this user) or it changed"""
+    revision = Note.objects.filter(pk=pk, owner=request.user).values_list("updated_at", flat=True).first()
+    if revision is None:
+        return JsonResponse({"success": False, "error": "Note not found"}, status=404)
+    return JsonResponse(
+        {
+            "success": False,
+            "error": "This note has been changed elsewhere. Reload it to get the latest version.",
+            "revision": revision.isoformat(),
+        },
+        status=409,
+    )
+
+
 @require_POST
 @login_required
 def note_delete_view(request, pk):
@@ -320,6 +532,7 @@ def note_delete_view(request, pk):
     return redirect(reverse_lazy("notes:note_list"))
 
 
+@transaction.non_atomic_requests
 @login_required
 @require_GET
 def serve_protected_file(request, note_id):
@@ -329,27 +542,79 @@ def serve_protected_file(request, note_id):
     This view checks permissions and returns an appropriate URL:
     - In development: returns the normal file URL
     - In production: returns a signed URL with expiration
+
+    The response can be cached by the browser until the end of the signed URL window.
+    Nothing is written, so the view doesn't run in a transaction.
     """
     try:
+        file_url, max_age = _get_protected_file_url(note_id, request.user)
+
+        # Return JSON response with the URL
+        response = JsonResponse({"url": file_url})
+        patch_cache_control(response, private=True, max_age=max_age)
+        return response
+
+    except (Note.DoesNotExist, PermissionDenied) as e:
+        return JsonResponse({"error": str(e)}, status=403)
+    except Http404 as e:
+        return JsonResponse({"error": str(e)}, status=404)
+    except Exception:
+        logger.exception("Error serving protected file")
+        return JsonResponse({"error": "Server error"}, status=500)
+
+
+@transaction.non_atomic_requests
+@login_required
+@require_GET
+def open_protected_file(request, note_id):
+    """
+    Redirect to a protected file (see serve_protected_file), e.g. for links and images.
+
+    Pages link to this view rather than to the file itself, so they don't have to sign a
+    URL for it when they are rendered.
+    """
+    file_url, max_age = _get_protected_file_url(note_id, request.user)
+    response = HttpResponseRedirect(file_url)
+    patch_cache_control(response, private=True, max_age=max_age)
+    return response
+
+
+def _get_protected_file_url(note_id, user):
+    """
+    Get the URL of a note's file for the given user.
+
+    URLs are cached (with the note's owner) until the end of the signed URL window they were
+    signed in (see `PrivateS3Storage.url`), so repeat requests neither query the note nor sign
+    a URL. The cached URL is forgotten when the note changes.
+
+    Returns:
+        tuple: The URL, and the number of seconds it can be cached for
+
+    Raises:
+        Http404: If the user has no such note, or it has no file
+        PermissionDenied: If the user isn't allowed to access the file
+    """
+    window, remaining = signed_url_window()
+    cache_key = Note.file_url_cache_key(note_id)
+    cached = cache.get(cache_key)
+    record_cache_lookup(cached is not None and cached["window"] == window)
+
+    if cached is None or cached["window"] != window:
         # Get the note and verify ownership
-        note = get_object_or_404(Note, pk=note_id, owner=request.user)
+        note = get_object_or_404(Note.objects.select_related("owner"), pk=note_id, owner=user)
 
         if not note.upload:
             raise Http404("This note has no attached file")
 
         # Get the file URL - will be handled differently based on environment
-        file_url = note.get_secure_file_url(request.user)
+        file_url = note.get_secure_file_url(user)
 
         if not file_url:
             raise PermissionDenied("You don't have permission to access this file")
 
-        # Return JSON response with the URL
-        return JsonResponse({"url": file_url})
+        cached = {"window": window, "owner": note.owner_id, "url": file_url}
+        cache.set(cache_key, cached, remaining)
+    elif cached["owner"] != user.pk:
+        raise Http404("No Note matches the given query.")
 
-    except (Note.DoesNotExist, PermissionDenied) as e:
-        return JsonResponse({"error": str(e)}, status=403)
-    except Http404 as e:
-        return JsonResponse({"error": str(e)}, status=404)
-    except Exception:
-        logger.exception("Error serving protected file")
-        return JsonResponse({"error": "Server error"}, status=500)
+    return cached["url"], remaining
@@ -1,11 +1,9 @@
 import logging
 
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.db.models import Count
 from django.views.generic import ListView
-from taggit.models import Tag
 
-from milk2meat.notes.models import Note
+from milk2meat.notes.models import UserTagStat
 
 logger = logging.getLogger(__name__)
 
@@ -18,20 +16,7 @@ class TagListView(LoginRequiredMixin, ListView):
 
     def get_queryset(self):
         """Get all tags used by the current user's notes with counts"""
-
-        # Get all note IDs for the current user
-        user_note_ids = Note.objects.get_queryset_for_user(self.request.user).values_list("id", flat=True)
-
-        # Get tags with note counts using UUIDTaggedItem
-        return (
-            Tag.objects.filter(
-                core_uuidtaggeditem_items__content_type__app_label="notes",
-                core_uuidtaggeditem_items__content_type__model="note",
-                core_uuidtaggeditem_items__object_id__in=user_note_ids,
-            )
-            .annotate(note_count=Count("core_uuidtaggeditem_items"))
-            .order_by("name")
-        )
+        return UserTagStat.get_tags_for_user(self.request.user)
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -0,0 +1,474 @@
+import json
+import math
+import os
+from functools import wraps
+
+from django.contrib.auth.decorators import login_required
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.http import JsonResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.views.decorators.http import require_GET, require_POST
+
+from milk2meat.core.utils.timing import record_count
+from milk2meat.core.utils.uploads import SNIFF_SIZE
+from milk2meat.notes.forms import DirectUploadForm
+from milk2meat.notes.models import Note, user_note_upload_path
+
+# Upload tokens tie an uploaded file to its note; they're only valid for a limited time
+UPLOAD_TOKEN_SALT = "milk2meat.notes.direct-upload"
+UPLOAD_TOKEN_MAX_AGE = 60 * 60
+
+# Multipart uploads can be resumed for longer (incomplete ones are eventually cleaned up by the bucket)
+MULTIPART_TOKEN_SALT = "milk2meat.notes.multipart-upload"
+MULTIPART_TOKEN_MAX_AGE = 24 * 60 * 60
+
+# Limits of multipart uploads in S3 and R2: the minimum size of the parts (except for the last
+# part), and the maximum number of parts
+MULTIPART_MIN_PART_SIZE = 5 * 1024 * 1024
+MULTIPART_MAX_PARTS = 10000
+
+
+def direct_uploads_available():
+    """Check whether the storage supports uploading files straight to it (i.e. S3 / R2 in production)"""
+    return hasattr(default_storage, "get_upload_url")
+
+
+def _owned_note(view):
+    """
+    Decorate an upload view taking the `pk` of a note, to call it with the user's note instead.
+
+    The decorated view answers with a 404 JSON response if the user has no such note.
+    """
+
+    @wraps(view)
+    def wrapper(request, pk):
+        note = Note.objects.filter(pk=pk, owner=request.user).first()
+        if note is None:
+            return JsonResponse({"success": False, "error": "Note not found"}, status=404)
+        return view(request, note)
+
+    return wrapper
+
+
+@require_POST
+@login_required
+@_owned_note
+def note_upload_start(request, note):
+    """
+    Start uploading a note's file straight to storage, so that it doesn't go through the app server.
+
+    The browser PUTs the file to the returned URL (with the returned headers), then calls
+    note_upload_finalize with the returned token to attach the file to the note.
+
+    Parameters:
+        request: The HTTP request object
+        note (Note): The user's note the file is for (see `_owned_note`)
+
+    Request Data (JSON):
+        - filename: Name of the file
+        - content_type: MIME type of the file
+        - size: Size of the file in bytes
+
+    Returns:
+        JsonResponse with the following structure:
+        - On success:
+            {
+                "success": true,
+                "url": "<signed upload URL>",
+                "method": "PUT",
+                "headers": {"<header>": "<value>", ...},
+                "token": "<upload token>"
+            }
+        - On validation error:
+            {"success": false, "errors": {field_errors}}
+        - On other errors:
+            {"success": false, "error": "error message"}
+
+    Status Codes:
+        - 200: Success
+        - 400: Validation error
+        - 404: Note not found
+        - 501: The storage doesn't support direct uploads (upload through note_save_ajax instead)
+    """
+    upload, error = _prepare_upload(request, note)
+    if error:
+        return error
+
+    url, headers = default_storage.get_upload_url(upload["name"], upload["content_type"], upload["size"])
+    token = signing.dumps({"note": str(note.pk), "name": upload["name"]}, salt=UPLOAD_TOKEN_SALT)
+
+    return JsonResponse({"success": True, "url": url, "method": "PUT", "headers": headers, "token": token})
+
+
+@require_POST
+@login_required
+@_owned_note
+def note_upload_finalize(request, note):
+    """
+    Attach a file uploaded straight to storage (see note_upload_start) to its note.
+
+    The uploaded file is checked like files uploaded through the app server: its size
+    is read from storage, and its type is detected from its first bytes (a ranged GET).
+    Files failing the checks are deleted. A previously attached file is replaced.
+
+    Parameters:
+        request: The HTTP request object
+        note (Note): The user's note the file is for (see `_owned_note`)
+
+    Request Data (JSON):
+        - token: The upload token returned by note_upload_start
+
+    Returns:
+        JsonResponse with the following structure:
+        - On success:
+            {
+                "success": true,
+                "revision": "<revision, see note_autosave>",
+                "file": {"name": "<file name>", "url": "<serve_protected_file URL>"}
+            }
+        - On validation error:
+            {"success": false, "errors": {"upload": [errors]}}
+
+    Status Codes:
+        - 200: Success
+        - 400: Invalid token, missing or invalid file
+        - 404: Note not found
+    """
+    try:
+        upload = signing.loads(_load_json(request).get("token"), salt=UPLOAD_TOKEN_SALT, max_age=UPLOAD_TOKEN_MAX_AGE)
+    except (signing.BadSignature, TypeError):
+        upload = None
+    if upload is None or upload["note"] != str(note.pk):
+        return JsonResponse({"success": False, "errors": {"upload": ["Invalid or expired upload."]}}, status=400)
+
+    return _attach_upload(note, upload["name"])
+
+
+@require_POST
+@login_required
+@_owned_note
+def note_multipart_create(request, note):
+    """
+    Start a resumable multipart upload of a note's file straight to storage, for large files.
+
+    The file is split into parts of `part_size` bytes (the last part holds the rest), which
+    the browser uploads (possibly in parallel) with URLs from note_multipart_sign_parts.
+    An interrupted upload is resumed by listing the parts already uploaded with
+    note_multipart_list_parts. Once all parts are uploaded, note_multipart_complete
+    assembles and attaches the file; note_multipart_abort cancels the upload.
+
+    Parameters:
+        request: The HTTP request object
+        note (Note): The user's note the file is for (see `_owned_note`)
+
+    Request Data (JSON):
+        - filename: Name of the file
+        - content_type: MIME type of the file
+        - size: Size of the file in bytes
+
+    Returns:
+        JsonResponse with the following structure:
+        - On success:
+            {
+                "success": true,
+                "token": "<upload token, identifying the upload in the other requests>",
+                "part_size": <size of the parts in bytes>,
+                "part_count": <number of parts>
+            }
+        - On validation error:
+            {"success": false, "errors": {field_errors}}
+        - On other errors:
+            {"success": false, "error": "error message"}
+
+    Status Codes:
+        - 200: Success
+        - 400: Validation error
+        - 404: Note not found
+        - 501: The storage doesn't support direct uploads (upload through note_save_ajax instead)
+    """
+    upload, error = _prepare_upload(request, note)
+    if error:
+        return error
+
+    name, size = upload["name"], upload["size"]
+    upload_id = default_storage.create_multipart_upload(name, upload["content_type"])
+    token = signing.dumps(
+        {"note": str(note.pk), "name": name, "upload_id": upload_id, "size": size}, salt=MULTIPART_TOKEN_SALT
+    )
+
+    return JsonResponse(
+        {"success": True, "token": token, "part_size": multipart_part_size(), "part_count": len(_part_sizes(size))}
+    )
+
+
+@require_POST
+@login_required
+@_owned_note
+def note_multipart_sign_parts(request, note):
+    """
+    Get signed URLs for uploading parts of a multipart upload (see note_multipart_create).
+
+    Each part must be PUT to its URL with exactly the expected size.
+
+    Request Data (JSON):
+        - token: The upload token returned by note_multipart_create
+        - part_numbers: Numbers of the parts to upload (from 1)
+
+    Returns:
+        JsonResponse with the following structure:
+        - On success:
+            {"success": true, "urls": {"<part number>": "<signed upload URL>", ...}}
+        - On error:
+            {"success": false, "errors": {"upload": [errors]}}
+
+    Status Codes:
+        - 200: Success
+        - 400: Invalid token or part numbers
+        - 404: Note not found
+    """
+    data = _load_json(request)
+    upload = _load_multipart_token(data.get("token"), note)
+    if upload is None:
+        return JsonResponse({"success": False, "errors": {"upload": ["Invalid or expired upload."]}}, status=400)
+
+    part_sizes = _part_sizes(upload["size"])
+    part_numbers = data.get("part_numbers")
+    if not isinstance(part_numbers, list) or not all(
+        isinstance(number, int) and 1 <= number <= len(part_sizes) for number in part_numbers
+    ):
+        return JsonResponse({"success": False, "errors": {"upload": ["Invalid part numbers."]}}, status=400)
+
+    urls = {
+        str(number): default_storage.get_upload_part_url(
+            upload["name"], upload["upload_id"], number, part_sizes[number - 1]
+        )
+        for number in part_numbers
+    }
+    return JsonResponse({"success": True, "urls": urls})
+
+
+@require_GET
+@login_required
+@_owned_note
+def note_multipart_list_parts(request, note):
+    """
+    List the parts uploaded so far in a multipart upload (see note_multipart_create), to resume it.
+
+    Query Parameters:
+        - token: The upload token returned by note_multipart_create
+
+    Returns:
+        JsonResponse with the following structure:
+        - On success:
+            {"success": true, "parts": [{"number": <part number>, "size": <size in bytes>}, ...]}
+        - On error:
+            {"success": false, "errors": {"upload": [errors]}}
+
+    Status Codes:
+        - 200: Success
+        - 400: Invalid token, or the upload no longer exists
+        - 404: Note not found
+    """
+    upload = _load_multipart_token(request.GET.get("token"), note)
+    if upload is None:
+        return JsonResponse({"success": False, "errors": {"upload": ["Invalid or expired upload."]}}, status=400)
+
+    try:
+        parts = default_storage.list_upload_parts(upload["name"], upload["upload_id"])
+    except FileNotFoundError:
+        return JsonResponse({"success": False, "errors": {"upload": ["Invalid or expired upload."]}}, status=400)
+
+    return JsonResponse({"success": True, "parts": [{"number": p["number"], "size": p["size"]} for p in parts]})
+
+
+@require_POST
+@login_required
+@_owned_note
+def note_multipart_complete(request, note):
+    """
+    Assemble the parts of a multipart upload (see note_multipart_create) and attach the file to its note.
+
+    Every part must have been uploaded, with the expected size; the assembled file is then
+    checked like in note_upload_finalize.
+
+    Request Data (JSON):
+        - token: The upload token returned by note_multipart_create
+
+    Returns:
+        JsonResponse with the following structure:
+        - On success: as note_upload_finalize
+        - On missing parts:
+            {"success": false, "errors": {"upload": [errors]}, "missing_parts": [<part number>, ...]}
+        - On other errors:
+            {"success": false, "errors": {"upload": [errors]}}
+
+    Status Codes:
+        - 200: Success
+        - 400: Invalid token, missing parts or invalid file
+        - 404: Note not found
+    """
+    upload = _load_multipart_token(_load_json(request).get("token"), note)
+    if upload is None:
+        return JsonResponse({"success": False, "errors": {"upload": ["Invalid or expired upload."]}}, status=400)
+
+    name, upload_id = upload["name"], upload["upload_id"]
+    try:
+        parts = default_storage.list_upload_parts(name, upload_id)
+    except FileNotFoundError:
+        return JsonResponse({"success": False, "errors": {"upload": ["Invalid or expired upload."]}}, status=400)
+
+    # The part sizes are enforced by the signed URLs, so this is also where the declared
+    # (and validated) size of the file is enforced
+    uploaded = {part["number"]: part["size"] for part in parts}
+    expected = dict(enumerate(_part_sizes(upload["size"]), start=1))
+    missing = [number for number, size in expected.items() if uploaded.get(number) != size]
+    if missing:
+        return JsonResponse(
+            {"success": False, "errors": {"upload": ["Some parts weren't uploaded."]}, "missing_parts": missing},
+            status=400,
+        )
+
+    try:
+        default_storage.complete_multipart_upload(
+            name, upload_id, [part for part in parts if part["number"] in expected]
+        )
+    except FileNotFoundError:
+        # The upload was completed or aborted meanwhile, or a part was uploaded again
+        return JsonResponse({"success": False, "errors": {"upload": ["Invalid or expired upload."]}}, status=400)
+    return _attach_upload(note, name)
+
+
+@require_POST
+@login_required
+@_owned_note
+def note_multipart_abort(request, note):
+    """
+    Abort a multipart upload (see note_multipart_create), deleting the parts uploaded so far.
+
+    Request Data (JSON):
+        - token: The upload token returned by note_multipart_create
+
+    Status Codes:
+        - 200: Success
+        - 400: Invalid token
+        - 404: Note not found
+    """
+    upload = _load_multipart_token(_load_json(request).get("token"), note)
+    if upload is None:
+        return JsonResponse({"success": False, "errors": {"upload": ["Invalid or expired upload."]}}, status=400)
+
+    default_storage.abort_multipart_upload(upload["name"], upload["upload_id"])
+    return JsonResponse({"success": True})
+
+
+def _prepare_upload(request, note):
+    """
+    Validate the file the browser is about to upload straight to storage, and pick its name there.
+
+    Returns:
+        tuple: The file's name, content type and size (as a dict) and None, or None and the error response
+    """
+    if not direct_uploads_available():
+        return None, JsonResponse({"success": False, "error": "Direct uploads aren't available"}, status=501)
+
+    form = DirectUploadForm(_load_json(request))
+    if not form.is_valid():
+        return None, JsonResponse({"success": False, "errors": form.errors}, status=400)
+
+    # The note is the user's, so there's no need to query its owner for the upload path
+    note.owner = request.user
+    name = default_storage.get_available_name(
+        user_note_upload_path(note, form.cleaned_data["filename"]),
+        max_length=Note._meta.get_field("upload").max_length,
+    )
+    return {"name": name, "content_type": form.cleaned_data["content_type"], "size": form.cleaned_data["size"]}, None
+
+
+def _attach_upload(note, name):
+    """Check a file uploaded straight to storage and attach it to the note, deleting it if it's invalid"""
+    try:
+        size = _validate_uploaded_file(name)
+    except FileNotFoundError:
+        return JsonResponse({"success": False, "errors": {"upload": ["The file wasn't uploaded."]}}, status=400)
+    except ValidationError as e:
+        default_storage.delete(name)
+        return JsonResponse({"success": False, "errors": {"upload": e.messages}}, status=400)
+
+    previous_name = note.upload.name
+    updated_at = timezone.now()
+    Note.objects.filter(pk=note.pk).update(upload=name, upload_size=size, updated_at=updated_at)
+    record_count("direct_upload_bytes", size)
+    # The update doesn't send post_save, which would forget the URL of the previous file
+    note.forget_file_url()
+    if previous_name and previous_name != name:
+        default_storage.delete(previous_name)
+
+    return JsonResponse(
+        {
+            "success": True,
+            "revision": updated_at.isoformat(),
+            "file": {
+                "name": os.path.basename(name),
+                "url": reverse("notes:serve_protected_file", kwargs={"note_id": note.pk}),
+            },
+        }
+    )
+
+
+def _validate_uploaded_file(name):
+    """
+    Run the validators of `Note.upload` on a file in storage, without downloading all of it.
+
+    Returns:
+        int: The size of the file in bytes
+
+    Raises:
+        FileNotFoundError: If the file doesn't exist
+        ValidationError: If the file is invalid
+    """
+    size = default_storage.size(name)
+    upload = SimpleUploadedFile(os.path.basename(name), default_storage.read_start(name, SNIFF_SIZE))
+    upload.size = size
+    for validator in Note._meta.get_field("upload").validators:
+        validator(upload)
+    return size
+
+
+def _load_multipart_token(token, note):
+    """Get the multipart upload identified by the given token, or None if the token isn't valid for the note"""
+    try:
+        upload = signing.loads(token, salt=MULTIPART_TOKEN_SALT, max_age=MULTIPART_TOKEN_MAX_AGE)
+    except (signing.BadSignature, TypeError):
+        return None
+    return upload if upload["note"] == str(note.pk) else None
+
+
+def multipart_part_size():
+    """
+    Get the size of the parts of multipart uploads.
+
+    Parts are as small as the storage allows (the smaller the parts, the less is uploaded again
+    when resuming an upload), unless the largest allowed file wouldn't fit in the maximum number
+    of parts.
+    """
+    return max(MULTIPART_MIN_PART_SIZE, math.ceil(Note.upload_size_limit() / MULTIPART_MAX_PARTS))
+
+
+def _part_sizes(size):
+    """Get the sizes of the parts a file of the given size is uploaded in"""
+    part_size = multipart_part_size()
+    full_parts, rest = divmod(size, part_size)
+    return [part_size] * full_parts + ([rest] if rest else [])
+
+
+def _load_json(request):
+    """Get the JSON object sent in the request body (an empty dict if there isn't one)"""
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
@@ -63,6 +63,7 @@ DJANGO_APPS = [
     "django.contrib.sitemaps",
     "django.contrib.sites",
     "django.contrib.humanize",
+    "django.contrib.postgres",
     "django.forms",
     # "django.contrib.gis",
 ]
@@ -94,6 +95,7 @@ LOGOUT_REDIRECT_URL = "/auth/login/"
 # https://docs.djangoproject.com/en/5.1/topics/http/middleware/
 # ------------------------------------------------------------------------------
 MIDDLEWARE = [
+    "milk2meat.core.middleware.ServerTimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -234,8 +236,10 @@ MEDIA_ROOT = str(APPS_DIR("files"))
 # https://docs.djangoproject.com/en/5.1/ref/settings/#media-url
 MEDIA_URL = "/files/"
 
-# # https://docs.djangoproject.com/en/5.1/ref/settings/#std-setting-FILE_UPLOAD_MAX_MEMORY_SIZE
-FILE_UPLOAD_MAX_MEMORY_SIZE = 35000000
+# Uploads are streamed to temporary files (rather than buffered in memory), and rejected
+# as soon as their type or size is known to be invalid
+# https://docs.djangoproject.com/en/5.1/ref/settings/#file-upload-handlers
+FILE_UPLOAD_HANDLERS = ["milk2meat.core.utils.uploads.ValidatingUploadHandler"]
 
 # The Sites framework
 # ------------------------------------------------------------------------------
@@ -277,13 +281,31 @@ WATSON_BACKEND = "watson.backends.PostgresSearchBackend"
 TURNSTILE_SITE_KEY = env("TURNSTILE_SITE_KEY", default=None)
 TURNSTILE_SECRET_KEY = env("TURNSTILE_SECRET_KEY", default=None)
 TURNSTILE_VERIFY_URL = "https://challenges.cloudflare.com/turnstile/v0/siteverify"
+# Seconds to wait for a connection to, and then a response from, the verify endpoint
+TURNSTILE_CONNECT_TIMEOUT = 1
+TURNSTILE_READ_TIMEOUT = 2
+# Fail fast for TURNSTILE_BREAKER_COOLDOWN seconds after TURNSTILE_BREAKER_THRESHOLD consecutive errors
+TURNSTILE_BREAKER_THRESHOLD = 5
+TURNSTILE_BREAKER_COOLDOWN = 30
 
 # Skip Turnstile validation in development
 # We'll check both DEBUG and explicitly look for an env var to allow testing in prod-like environments
 TURNSTILE_SKIP_VALIDATION = DEBUG or env.bool("TURNSTILE_SKIP_VALIDATION", default=False)
 
+# Metrics (see milk2meat.core.metrics)
+# ------------------------------------------------------------------------------
+# Bearer token allowing to read /metrics (e.g. by Prometheus), which staff can also read
+METRICS_TOKEN = env("METRICS_TOKEN", default=None)
+# Seconds between additions of each process's metrics to the shared ones
+METRICS_FLUSH_INTERVAL = 10
+# Whether staff get the Server-Timing header with the timings of their requests (everyone does with DEBUG)
+SERVER_TIMING_FOR_STAFF = env.bool("SERVER_TIMING_FOR_STAFF", default=True)
+
 # ------------------------------------------------------------------------------
 # CUSTOM SETTINGS
 # ------------------------------------------------------------------------------
 ADMIN_URL = "djadmin/"  # Django Admin URL.
 LIST_OF_EMAIL_RECIPIENTS: List[str] = []
+
+# How long (in seconds) rendered markdown is kept in the cache
+MARKDOWN_CACHE_TIMEOUT = 60 * 60 * 24 * 7
@@ -81,7 +81,9 @@ AWS_LOCATION = env("AWS_LOCATION", default="files")  # noqa: F405
 AWS_S3_FILE_OVERWRITE = env("AWS_S3_FILE_OVERWRITE", default=False)  # noqa: F405
 
 # this is a custom setting, not part of django-storages
-AWS_SIGNED_URL_EXPIRE_SECONDS = env("AWS_SIGNED_URL_EXPIRE_SECONDS", default=60 * 5)  # noqa: F405
+AWS_SIGNED_URL_EXPIRE_SECONDS = env.int("AWS_SIGNED_URL_EXPIRE_SECONDS", default=60 * 5)  # noqa: F405
+# Signed URLs are reused for windows of this length, so that browsers can cache the files (also custom)
+AWS_SIGNED_URL_WINDOW_SECONDS = env.int("AWS_SIGNED_URL_WINDOW_SECONDS", default=60 * 60)  # noqa: F405
 
 # STATIC
 # ------------------------
@@ -152,6 +154,14 @@ LOGGING = {
         "verbose": {"format": "%(levelname)s %(asctime)s %(module)s " "%(process)d %(thread)d %(message)s"},
         "simple": {"format": "%(levelname)s %(message)s"},
         "gunicorn": {"format": "%(h)s %(l)s %(u)s %(t)s %(r)s %(s)s %(b)s %(f)s %(a)s"},
+        # Fields of the request metrics logged by ServerTimingMiddleware
+        "performance": {
+            "format": "%(levelname)s %(asctime)s performance method=%(method)s path=%(path)s status=%(status)s "
+            "duration_ms=%(duration_ms)s db_count=%(db_count)s db_ms=%(db_ms)s search_count=%(search_count)s "
+            "search_ms=%(search_ms)s markdown_count=%(markdown_count)s markdown_ms=%(markdown_ms)s "
+            "storage_count=%(storage_count)s storage_ms=%(storage_ms)s cache_hits=%(cache_hits)s "
+            "cache_misses=%(cache_misses)s"
+        },
         # "rq_console": {
         #     "format": "%(asctime)s %(message)s",
         #     "datefmt": "%H:%M:%S",
@@ -167,6 +177,10 @@ LOGGING = {
             "class": "logging.StreamHandler",
             "formatter": "gunicorn",
         },
+        "performance": {
+            "class": "logging.StreamHandler",
+            "formatter": "performance",
+        },
         # "rq_console": {
         #     "level": "DEBUG",
         #     "class": "rq.logutils.ColorizingStreamHandler",
@@ -196,6 +210,11 @@ LOGGING = {
             "level": "INFO",
             "propagate": False,
         },
+        "milk2meat.performance": {
+            "handlers": ["performance"],
+            "level": "INFO",
+            "propagate": False,
+        },
         "django.db.backends": {
             "level": "ERROR",
             "handlers": ["console"],
@@ -43,6 +43,9 @@ CACHES = {
     }
 }
 
+# Add each request's metrics to the shared ones straight away
+METRICS_FLUSH_INTERVAL = 0
+
 # TESTING
 # ------------------------------------------------------------------------------
 TEST_RUNNER = "django.test.runner.DiscoverRunner"
@@ -33,6 +33,16 @@ def test(c):
     c.run("pytest", pty=True)
 
 
+@task
+def query_budgets(c):
+    """run the query budget suite, writing the measurements to query-budgets.json"""
+    c.run(
+        "QUERY_BUDGET_REPORT=query-budgets.json pytest -m query_budget --numprocesses=0 --no-cov "
+        "milk2meat/core/tests/test_query_budgets.py",
+        pty=True,
+    )
+
+
 @task
 def db_snapshot(c, filename_prefix):
     """Create a Database snapshot using DSLR"""